@@ -22,6 +22,26 @@ enum wifi_security {
     WIFI_SEC_WPA3,
 };
 
+/* WMM access categories, highest priority first */
+enum wifi_ac {
+    WIFI_AC_VO = 0,
+    WIFI_AC_VI,
+    WIFI_AC_BE,
+    WIFI_AC_BK,
+    WIFI_NUM_ACS,
+};
+
+/* Why a data frame was dropped (per-cause statistics) */
+enum wifi_drop_reason {
+    WIFI_DROP_DECRYPT = 0,
+    WIFI_DROP_ENCRYPT,
+    WIFI_DROP_NOT_CONNECTED,
+    WIFI_DROP_OOM,
+    WIFI_DROP_FRAG,
+    WIFI_DROP_QUEUE_FULL,
+    WIFI_NUM_DROP_REASONS,
+};
+
 struct wifi_bss_info {
     u8  bssid[6];
     u8  ssid[32];
@@ -31,6 +51,24 @@ struct wifi_bss_info {
     enum wifi_security security;
 };
 
+/* Per-frame 802.11 metadata carried in skb->cb between core, MAC and security.
+ * On RX the MAC fills it in from the received header; on TX the core does. */
+struct wifi_skb_cb {
+    u8   addr[6];       /* RX: transmitter address */
+    u8   a3[6];         /* 802.11 A3: TX destination (DA), RX source (SA) */
+    u16  seq;           /* Sequence number */
+    u8   frag;          /* Fragment number */
+    u8   tid;
+    bool more_frags;
+    bool decrypted;     /* RX: already went through wpa_decrypt_skb() */
+    u32  len;           /* TX: payload length before encryption */
+    u64  tstamp;        /* ktime_get_ns() at wifi_core_tx()/wifi_core_rx() */
+    u64  stage_tstamp;  /* Start of the current crypto stage, 0 if none */
+    u64  pn;            /* RX: PN of the decrypted frame, 0 if unprotected */
+};
+
+#define WIFI_SKB_CB(skb) ((struct wifi_skb_cb *)(skb)->cb)
+
 struct wifi_config {
     u32 tx_power_dbm;
     u32 rts_threshold;
@@ -7,8 +7,6 @@
 #include "../mac/mac_core.h"     // cfg80211 → mac (and mac → cfg = CYCLE)
 #include "../core/wifi_core.h"   // cfg80211 → wifi_core (and wifi_core → cfg = CYCLE)
 
-struct wifi_cfg_ops g_cfg_ops;
-
 void cfg80211_notify_scan_started(void *netdev)
 {
     pr_info("cfg80211: scan started event\n");
@@ -53,3 +51,19 @@ static int cfg_connect(void *dev, void *params)
     // cfg → mac (direct coupling)
     return 0;
 }
+
+// cfg80211 flush_pmksa callback - supplicant calls it when the network's
+// credentials change or the network is removed
+static int cfg_flush_pmksa(void *dev)
+{
+    struct wifi_device *wifi_dev = dev;
+
+    wifi_core_flush_pmksa(wifi_dev);  // cfg → wifi_core
+    return 0;
+}
+
+struct wifi_cfg_ops g_cfg_ops = {
+    .scan        = cfg_scan,
+    .connect     = cfg_connect,
+    .flush_pmksa = cfg_flush_pmksa,
+};
@@ -21,6 +21,7 @@ struct wifi_cfg_ops {
     int (*disconnect)(void *dev, u16 reason);
     int (*get_station)(void *dev, const u8 *mac, void *sinfo);
     int (*set_power_mgmt)(void *dev, bool enabled, int timeout);
+    int (*flush_pmksa)(void *dev);
 };
 
 extern struct wifi_cfg_ops g_cfg_ops;
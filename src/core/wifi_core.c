@@ -8,23 +8,97 @@
 #include <linux/module.h>
 #include <linux/kernel.h>
 #include <linux/skbuff.h>
+#include <linux/netdevice.h>
+#include <linux/etherdevice.h>
 #include <linux/workqueue.h>
 #include <linux/mutex.h>
 #include <linux/rculist.h>
+#include <linux/hashtable.h>
+#include <linux/rhashtable.h>
+#include <linux/idr.h>
+#include <linux/slab.h>
+#include <linux/debugfs.h>
+#include <linux/seq_file.h>
+#include <linux/percpu.h>
+#include <linux/u64_stats_sync.h>
+#include <linux/ethtool.h>
+#include <linux/ktime.h>
+#include <linux/firmware.h>
+#include <linux/completion.h>
+#include <kunit/static_stub.h>
 #include "include/wifi_types.h"
+#include "src/core/wifi_core.h"
 #include "src/mac/mac_core.h"       // mac depends back on wifi_core.h → CIRCULAR!
 #include "src/cfg80211/cfg_ops.h"   // cfg depends on wifi_core.h → CIRCULAR!
 #include "src/security/wpa_handler.h"
 
+#define CREATE_TRACE_POINTS
+#include "src/core/wifi_trace.h"
+
 MODULE_LICENSE("GPL");
 MODULE_AUTHOR("WiFi Team");
 MODULE_DESCRIPTION("WiFi Driver Core - Demo (God Module Example)");
 
+static bool rx_napi = true;
+module_param(rx_napi, bool, 0444);
+MODULE_PARM_DESC(rx_napi, "Use NAPI/GRO RX (0 = legacy per-packet netif_rx path)");
+
+static unsigned int bss_capacity = 1024;
+module_param(bss_capacity, uint, 0444);
+MODULE_PARM_DESC(bss_capacity, "Max cached BSS entries per device before LRU eviction");
+
 // ─────────────────────────────────────────
 // RESPONSIBILITY 1: Device lifecycle
 // ─────────────────────────────────────────
 static struct wifi_device *g_wifi_dev;
 static DEFINE_MUTEX(g_dev_lock);
+static DEFINE_IDA(wifi_dev_ida);       // Names each device's debugfs dir
+
+#define WIFI_BSS_CHAN_BITS      5       // channel → entries (secondary index)
+#define WIFI_DEFRAG_ENTRIES     4       // Concurrent RX reassemblies
+
+// One in-progress RX reassembly, keyed by (transmitter, TID, sequence)
+struct wifi_defrag_entry {
+    struct sk_buff_head frags;
+    unsigned long       first_seen;
+    unsigned int        truesize;
+    u16                 seq;
+    u8                  addr[6];
+    u8                  tid;
+    u8                  last_frag;
+    u64                 last_pn;        // PN of last_frag, 0 if unprotected
+};
+
+// Stages with a latency histogram in debugfs "latency"
+enum wifi_lat_stage {
+    WIFI_LAT_TX_QUEUE = 0,      // wifi_core_tx() -> tx_work dequeue
+    WIFI_LAT_TX_ENCRYPT,        // wpa_encrypt_skb(), incl. async completion
+    WIFI_LAT_TX_TOTAL,          // wifi_core_tx() -> MAC submit
+    WIFI_LAT_RX_QUEUE,          // wifi_core_rx() -> NAPI poll
+    WIFI_LAT_RX_DECRYPT,        // wpa_decrypt_skb*(), incl. async completion
+    WIFI_LAT_RX_TOTAL,          // wifi_core_rx() -> network stack
+    WIFI_LAT_SCAN,              // Scan start -> scan done
+    WIFI_LAT_AUTH,              // wpa_start_auth()
+    WIFI_LAT_ASSOC,             // mac_associate()
+    WIFI_LAT_ROAM,              // Roam trigger -> associated to the new AP
+    WIFI_LAT_NR_STAGES,
+};
+
+#define WIFI_ROAM_MAX_CHANNELS  8
+
+// Roam attempt bookkeeping; phase timestamps of the last roam feed debugfs
+// "roam", the total of every roam the "roam" row of "latency"
+struct wifi_roam {
+    unsigned long       last_attempt;   // jiffies, for rate limiting
+    s32                 trigger_rssi;
+    ktime_t             t_trigger;
+    ktime_t             t_scan_done;
+    ktime_t             t_auth_done;
+    ktime_t             t_assoc_done;
+    u32                 attempts;
+    u32                 roams;
+    u32                 failures;
+};
 
 struct wifi_device {
     struct net_device   *netdev;
@@ -32,32 +106,159 @@ struct wifi_device {
     struct wifi_config   config;
     struct workqueue_struct *tx_wq;
     struct workqueue_struct *rx_wq;
-    struct list_head     bss_list;
-    spinlock_t           bss_lock;
+    struct sk_buff_head  tx_queue[WIFI_NUM_ACS];  // Pending TX skbs per AC
+    struct work_struct   tx_work;
+    struct sk_buff_head  tx_crypto_done;    // Encrypted by an async engine
+    struct sk_buff_head  tx_pending;    // Fragments awaiting a crypto request (tx_work only)
+    int                  tx_deficit[WIFI_NUM_ACS]; // DRR state (tx_work only)
+    u8                   tx_sched_ac;
+    bool                 tx_sched_in_turn;
+    struct sk_buff_head  rx_ring;       // Received skbs awaiting NAPI poll
+    struct work_struct   rx_work;       // Legacy RX: replays parked rx_ring frames
+    struct napi_struct   napi;
+    struct mutex         dp_lock;       // wifi_datapath_stop()/start()
+    unsigned int         dp_stopped;    // Nesting depth, under dp_lock
+    bool                 dp_paused;     // tx_work idles, legacy RX parks
+    u16                  tx_seq;        // Next TX sequence number (tx_work only)
+    struct wifi_defrag_entry defrag[WIFI_DEFRAG_ENTRIES];
+    unsigned int         defrag_next;   // Round-robin slot for new reassemblies
+    unsigned int         defrag_mem;    // truesize held by all entries
+    spinlock_t           defrag_lock;
+    struct list_head     bss_list;      // All BSS entries (RCU readers)
+    struct list_head     bss_lru;       // Most recently seen first (bss_lock)
+    struct rhashtable    bss_hash;      // BSSID → entry, grows with the table
+    DECLARE_HASHTABLE(bss_chan, WIFI_BSS_CHAN_BITS);
+    u32                  bss_count;
+    u32                  bss_capacity;
+    spinlock_t           bss_lock;      // Serializes BSS table writers
+    struct wifi_pcpu_stats __percpu *stats;
+    struct dentry       *debugfs_dir;
+    int                  id;            // wifi_dev_ida
+    struct wifi_bss_info cur_bss;       // AP we're associated with
+    u32                  scan_channels[WIFI_ROAM_MAX_CHANNELS];
+    u8                   n_scan_channels;   // 0: all channels
+    u64                  scan_start_ns;
+    struct wifi_roam     roam;
     void                *fw_ctx;        // Firmware context
+    const struct firmware *fw;          // Cached image, reused by warm resets
+    char                 fw_path[64];
+    struct completion    fw_ready;      // Complete while no load is in flight
+    int                  fw_status;     // Result of the last load
+    struct mutex         fw_lock;       // Serializes loads and resets
+    u32                  fw_resets;
+    u64                  fw_recover_ns_last;
+    u64                  fw_recover_ns_max;
     void                *mac_ctx;       // MAC layer context
     void                *sec_ctx;       // Security context
 };
 
+static void wifi_tx_worker(struct work_struct *work);
+static void wifi_rx_worker(struct work_struct *work);
+static int wifi_napi_poll(struct napi_struct *napi, int budget);
+static int wifi_bss_table_init(struct wifi_device *dev);
+static void wifi_bss_table_free(struct wifi_device *dev);
+static const struct file_operations wifi_bss_fops;
+static int wifi_stats_init(struct wifi_device *dev);
+static const struct net_device_ops wifi_netdev_ops;
+static const struct ethtool_ops wifi_ethtool_ops;
+static void wifi_core_update_tx_stats_batch(struct wifi_device *dev,
+                                            const u32 *ac_packets, u64 bytes);
+static void wifi_core_update_rx_stats(struct wifi_device *dev, u32 bytes,
+                                      enum wifi_ac ac);
+static void wifi_core_update_rx_stats_batch(struct wifi_device *dev,
+                                            const u32 *ac_packets, u64 bytes);
+static void wifi_core_count_drop(struct wifi_device *dev, enum wifi_drop_reason reason,
+                                 bool tx, u32 count);
+static void wifi_defrag_init(struct wifi_device *dev);
+static void wifi_defrag_flush(struct wifi_device *dev);
+static int wifi_tx_fragment(struct wifi_device *dev, struct sk_buff *skb,
+                            struct sk_buff_head *frags);
+static struct sk_buff *wifi_rx_defrag(struct wifi_device *dev, struct sk_buff *skb);
+static void wifi_core_crypto_done(void *priv, struct sk_buff *skb, bool tx, int err);
+static void wifi_core_crypto_resume(void *priv);
+static void wifi_datapath_stop(struct wifi_device *dev);
+static void wifi_datapath_start(struct wifi_device *dev);
+static void wifi_roam_scan_done(struct wifi_device *dev);
+static const struct file_operations wifi_roam_fops;
+static const struct file_operations wifi_fw_fops;
+static const struct file_operations wifi_fw_reset_fops;
+static void wifi_lat_record(struct wifi_device *dev, enum wifi_lat_stage stage, u64 ns);
+static const struct file_operations wifi_lat_fops;
+
 int wifi_core_init(struct wifi_device **dev_out)
 {
     struct wifi_device *dev;
+    char name[16];
+    int i;
+
+    BUILD_BUG_ON(sizeof(struct wifi_skb_cb) > sizeof_field(struct sk_buff, cb));
 
     dev = kzalloc(sizeof(*dev), GFP_KERNEL);
     if (!dev)
         return -ENOMEM;
 
-    spin_lock_init(&dev->bss_lock);
-    INIT_LIST_HEAD(&dev->bss_list);
     dev->state = WIFI_STATE_DISCONNECTED;
 
+    dev->id = ida_alloc(&wifi_dev_ida, GFP_KERNEL);
+    if (dev->id < 0) {
+        kfree(dev);
+        return -ENOMEM;
+    }
+
+    if (wifi_stats_init(dev)) {
+        ida_free(&wifi_dev_ida, dev->id);
+        kfree(dev);
+        return -ENOMEM;
+    }
+
+    if (wifi_bss_table_init(dev)) {
+        free_percpu(dev->stats);
+        ida_free(&wifi_dev_ida, dev->id);
+        kfree(dev);
+        return -ENOMEM;
+    }
+
+    for (i = 0; i < WIFI_NUM_ACS; i++)
+        skb_queue_head_init(&dev->tx_queue[i]);
+    INIT_WORK(&dev->tx_work, wifi_tx_worker);
+    skb_queue_head_init(&dev->tx_crypto_done);
+    __skb_queue_head_init(&dev->tx_pending);
+    skb_queue_head_init(&dev->rx_ring);
+    INIT_WORK(&dev->rx_work, wifi_rx_worker);
+    wifi_defrag_init(dev);
+    mutex_init(&dev->dp_lock);
+    mutex_init(&dev->fw_lock);
+    init_completion(&dev->fw_ready);
+    complete_all(&dev->fw_ready);
+
     dev->tx_wq = create_singlethread_workqueue("wifi_tx");
     dev->rx_wq = create_singlethread_workqueue("wifi_rx");
-    if (!dev->tx_wq || !dev->rx_wq) {
+    dev->sec_ctx = wpa_ctx_alloc();
+    if (!dev->tx_wq || !dev->rx_wq || !dev->sec_ctx) {
+        wpa_ctx_free(dev->sec_ctx);
+        if (dev->tx_wq)
+            destroy_workqueue(dev->tx_wq);
+        if (dev->rx_wq)
+            destroy_workqueue(dev->rx_wq);
+        wifi_bss_table_free(dev);
+        free_percpu(dev->stats);
+        ida_free(&wifi_dev_ida, dev->id);
         kfree(dev);
         return -ENOMEM;
     }
 
+    wpa_set_crypto_done(dev->sec_ctx, wifi_core_crypto_done, dev);
+    wpa_set_crypto_resume(dev->sec_ctx, wifi_core_crypto_resume, dev);
+
+    snprintf(name, sizeof(name), "wifi_core%d", dev->id);
+    dev->debugfs_dir = debugfs_create_dir(name, NULL);
+    debugfs_create_file("bss", 0400, dev->debugfs_dir, dev, &wifi_bss_fops);
+    debugfs_create_file("latency", 0400, dev->debugfs_dir, dev, &wifi_lat_fops);
+    debugfs_create_file("roam", 0400, dev->debugfs_dir, dev, &wifi_roam_fops);
+    debugfs_create_file("fw", 0400, dev->debugfs_dir, dev, &wifi_fw_fops);
+    debugfs_create_file_unsafe("fw_reset", 0200, dev->debugfs_dir, dev,
+                               &wifi_fw_reset_fops);
+
     *dev_out = dev;
     g_wifi_dev = dev;
     pr_info("wifi_core: initialized\n");
@@ -66,297 +267,2022 @@ int wifi_core_init(struct wifi_device **dev_out)
 
 void wifi_core_deinit(struct wifi_device *dev)
 {
+    int i;
+
     if (!dev)
         return;
+    debugfs_remove_recursive(dev->debugfs_dir);
+    // An async load still holds a pointer to dev
+    wait_for_completion(&dev->fw_ready);
+    release_firmware(dev->fw);
+    // Stopped for good: nothing may be inside wpa_* once sec_ctx goes away
+    wifi_datapath_stop(dev);
+    if (dev->netdev)
+        netif_napi_del(&dev->napi);
+    for (i = 0; i < WIFI_NUM_ACS; i++)
+        skb_queue_purge(&dev->tx_queue[i]);
+    wpa_ctx_free(dev->sec_ctx);
+    cancel_work_sync(&dev->tx_work);
+    cancel_work_sync(&dev->rx_work);
+    __skb_queue_purge(&dev->tx_pending);
+    skb_queue_purge(&dev->tx_crypto_done);
+    skb_queue_purge(&dev->rx_ring);
+    wifi_defrag_flush(dev);
     destroy_workqueue(dev->tx_wq);
     destroy_workqueue(dev->rx_wq);
+    wifi_bss_table_free(dev);
+    free_percpu(dev->stats);
+    ida_free(&wifi_dev_ida, dev->id);
     kfree(dev);
     g_wifi_dev = NULL;
 }
 
+// Binds the net_device the data path delivers to and sets up NAPI on it.
+// @netdev must have been allocated with WIFI_NUM_ACS TX queues (one per AC).
+int wifi_core_attach_netdev(struct wifi_device *dev, struct net_device *netdev)
+{
+    int ret;
+
+    if (!dev || !netdev)
+        return -EINVAL;
+
+    ret = netif_set_real_num_tx_queues(netdev, WIFI_NUM_ACS);
+    if (ret) {
+        pr_err("wifi_core: netdev needs %d TX queues\n", WIFI_NUM_ACS);
+        return ret;
+    }
+
+    dev->netdev = netdev;
+    netdev->ml_priv = dev;
+    netdev->netdev_ops = &wifi_netdev_ops;
+    netdev->ethtool_ops = &wifi_ethtool_ops;
+    wpa_set_own_addr(dev->sec_ctx, netdev->dev_addr);
+    netif_napi_add(netdev, &dev->napi, wifi_napi_poll);
+    napi_enable(&dev->napi);
+    return 0;
+}
+
 // ─────────────────────────────────────────
 // RESPONSIBILITY 2: TX path
 // ─────────────────────────────────────────
-struct tx_work {
-    struct work_struct  work;
-    struct sk_buff      *skb;
-    struct wifi_device  *dev;
+// wifi_core_tx() only appends to the frame's per-AC queue in dev->tx_queue
+// (which is also its netdev subqueue); wifi_tx_worker pulls batches of at
+// most WIFI_TX_BATCH across the four queues with a weighted deficit round
+// robin, so nothing is allocated per packet, voice doesn't sit behind bulk
+// traffic, and a whole batch reaches the MAC with a single doorbell.
+#define WIFI_TX_BATCH           64
+#define WIFI_TX_QUEUE_HIWAT     1024    // netif_stop_subqueue() above this
+#define WIFI_TX_QUEUE_LOWAT     256     // netif_wake_subqueue() below this
+#define WIFI_TX_QUANTUM         1536    // Bytes per DRR turn at weight 1
+
+// DRR weights per AC. Cost is frame length, a stand-in for airtime until
+// the MAC reports per-frame TX rates.
+static const int wifi_tx_quantum[WIFI_NUM_ACS] = {
+    [WIFI_AC_VO] = 8 * WIFI_TX_QUANTUM,
+    [WIFI_AC_VI] = 4 * WIFI_TX_QUANTUM,
+    [WIFI_AC_BE] = 2 * WIFI_TX_QUANTUM,
+    [WIFI_AC_BK] = 1 * WIFI_TX_QUANTUM,
 };
 
+// RX frames carry their TID in the cb, from the QoS control field;
+// skb->priority isn't set on receive. Read it before delivery: the stack
+// reuses the cb.
+static enum wifi_ac wifi_rx_ac(const struct sk_buff *skb)
+{
+    return mac_tid_to_ac(WIFI_SKB_CB(skb)->tid);
+}
+
+// Moves up to WIFI_TX_BATCH skbs from the per-AC queues onto @batch in DRR
+// order. A turn cut short by a full batch resumes on the next call.
+static int wifi_tx_schedule(struct wifi_device *dev, struct sk_buff_head *batch)
+{
+    struct sk_buff_head *q;
+    struct sk_buff *skb;
+    unsigned long flags;
+    int n = 0, idle = 0;
+    u8 ac;
+
+    while (n < WIFI_TX_BATCH && idle < WIFI_NUM_ACS) {
+        ac = dev->tx_sched_ac;
+        q = &dev->tx_queue[ac];
+
+        if (!dev->tx_sched_in_turn) {
+            if (skb_queue_empty_lockless(q)) {
+                dev->tx_deficit[ac] = 0;
+                dev->tx_sched_ac = (ac + 1) % WIFI_NUM_ACS;
+                idle++;
+                continue;
+            }
+            dev->tx_deficit[ac] += wifi_tx_quantum[ac];
+            dev->tx_sched_in_turn = true;
+        }
+        idle = 0;
+
+        spin_lock_irqsave(&q->lock, flags);
+        while (n < WIFI_TX_BATCH && (skb = skb_peek(q)) &&
+               skb->len <= dev->tx_deficit[ac]) {
+            __skb_unlink(skb, q);
+            dev->tx_deficit[ac] -= skb->len;
+            __skb_queue_tail(batch, skb);
+            n++;
+        }
+        if (skb_queue_empty(q))
+            dev->tx_deficit[ac] = 0;
+        spin_unlock_irqrestore(&q->lock, flags);
+
+        if (n >= WIFI_TX_BATCH)
+            break;
+
+        dev->tx_sched_in_turn = false;
+        dev->tx_sched_ac = (ac + 1) % WIFI_NUM_ACS;
+    }
+    return n;
+}
+
+// Puts frames wifi_tx_schedule() pulled but tx_work never got to back at
+// the head of their AC queues, in order
+static void wifi_tx_requeue(struct wifi_device *dev, struct sk_buff_head *batch)
+{
+    struct sk_buff *skb;
+
+    while ((skb = __skb_dequeue_tail(batch)))
+        skb_queue_head(&dev->tx_queue[skb_get_queue_mapping(skb)], skb);
+}
+
+// Encryption (should be in security layer!). Once per fragment so each one
+// gets its own PN; async engines finish through wifi_core_crypto_done().
+// Returns -EBUSY, with the rest still on @frags, once the security layer
+// has no free crypto request.
+static int wifi_tx_encrypt(struct wifi_device *dev, struct sk_buff_head *frags,
+                           struct sk_buff_head *out)
+{
+    struct sk_buff *skb;
+    u64 now;
+    int ret;
+
+    while ((skb = __skb_dequeue(frags))) {
+        now = ktime_get_ns();
+        WIFI_SKB_CB(skb)->stage_tstamp = now;
+        ret = wpa_encrypt_skb(dev->sec_ctx, skb);
+        if (ret == -EINPROGRESS)
+            continue;   // The engine owns @skb now
+        if (ret == -EBUSY) {
+            __skb_queue_head(frags, skb);
+            return ret;
+        }
+
+        trace_wifi_tx_encrypt(skb, ret);
+        if (!ret) {
+            wifi_lat_record(dev, WIFI_LAT_TX_ENCRYPT, ktime_get_ns() - now);
+            __skb_queue_tail(out, skb);
+        } else {
+            dev_kfree_skb(skb);
+            wifi_core_count_drop(dev, WIFI_DROP_ENCRYPT, true, 1);
+        }
+    }
+    return 0;
+}
+
 static void wifi_tx_worker(struct work_struct *work)
 {
-    struct tx_work *tw = container_of(work, struct tx_work, work);
-    struct sk_buff *skb = tw->skb;
+    struct wifi_device *dev = container_of(work, struct wifi_device, tx_work);
+    struct sk_buff_head batch, frags, out;
+    struct sk_buff *skb;
+    u32 ac_packets[WIFI_NUM_ACS] = {};
+    unsigned long flags;
+    bool more = false, busy;
+    struct wifi_skb_cb *cb;
+    u64 bytes = 0, now;
+    int i;
 
-    // Fragmentation
-    if (skb->len > tw->dev->config.frag_threshold) {
-        // TODO: fragment skb
-        pr_warn("wifi_core: TX frag not implemented, dropping\n");
-        dev_kfree_skb(skb);
-        kfree(tw);
+    // wifi_datapath_start() requeues us
+    if (READ_ONCE(dev->dp_paused))
+        return;
+
+    __skb_queue_head_init(&batch);
+    __skb_queue_head_init(&frags);
+    __skb_queue_head_init(&out);
+
+    // Frames finished by async crypto since the last run go out first
+    spin_lock_irqsave(&dev->tx_crypto_done.lock, flags);
+    skb_queue_splice_tail_init(&dev->tx_crypto_done, &out);
+    spin_unlock_irqrestore(&dev->tx_crypto_done.lock, flags);
+
+    // Fragments left over when the crypto requests ran out go first, so
+    // the rest of their frame still gets consecutive PNs
+    busy = wifi_tx_encrypt(dev, &dev->tx_pending, &out) == -EBUSY;
+
+    if (!busy && !wifi_tx_schedule(dev, &batch) && skb_queue_empty(&out))
         return;
+
+    // Per-packet work: fragment, encrypt. Everything that survives lands
+    // on @out for one bulk submit.
+    while ((skb = __skb_dequeue(&batch))) {
+        wifi_lat_record(dev, WIFI_LAT_TX_QUEUE,
+                        ktime_get_ns() - WIFI_SKB_CB(skb)->tstamp);
+        trace_wifi_tx_dequeue(skb);
+
+        // Consumes @skb on failure and accounts the drop
+        if (wifi_tx_fragment(dev, skb, &frags))
+            continue;
+
+        if (wifi_tx_encrypt(dev, &frags, &out)) {
+            // Out of crypto requests: nothing is dropped, the rest waits
+            // for the next run
+            skb_queue_splice_tail_init(&frags, &dev->tx_pending);
+            wifi_tx_requeue(dev, &batch);
+            busy = true;
+            break;
+        }
+    }
+
+    // Only what reaches the MAC counts as transmitted: an MSDU once its
+    // last fragment goes out, bytes per fragment payload
+    now = ktime_get_ns();
+    skb_queue_walk(&out, skb) {
+        cb = WIFI_SKB_CB(skb);
+        wifi_lat_record(dev, WIFI_LAT_TX_TOTAL, now - cb->tstamp);
+        trace_wifi_tx_submit(skb);
+        if (!cb->more_frags)
+            ac_packets[skb_get_queue_mapping(skb)]++;
+        bytes += cb->len;
     }
 
-    // QoS tagging (should be in mac layer!)
-    if (tw->dev->config.qos_enabled) {
-        // Direct MAC manipulation - bad coupling!
-        mac_set_qos_tag(tw->dev->mac_ctx, skb);
+    // Hand the whole batch off to HW, one doorbell at the end
+    if (mac_tx_submit_bulk(dev->mac_ctx, &out))
+        wifi_core_update_tx_stats_batch(dev, ac_packets, bytes);
+
+    // Backpressure: wake each AC's subqueue once it drained below the low mark
+    for (i = 0; i < WIFI_NUM_ACS; i++) {
+        u32 qlen = skb_queue_len(&dev->tx_queue[i]);
+
+        if (dev->netdev && __netif_subqueue_stopped(dev->netdev, i) &&
+            qlen < WIFI_TX_QUEUE_LOWAT)
+            netif_wake_subqueue(dev->netdev, i);
+        more |= qlen > 0;
     }
+    more |= !skb_queue_empty(&dev->tx_crypto_done);
 
-    // Encryption (should be in security layer!)
-    wpa_encrypt_skb(tw->dev->sec_ctx, skb);
+    // Bounded batches: requeue instead of looping so RX/other work gets a
+    // turn. Out of crypto requests, retrying now would only spin: the
+    // next request freed requeues us (wifi_core_crypto_resume()).
+    if (more && !busy)
+        queue_work(dev->tx_wq, &dev->tx_work);
+}
 
-    // Hand off to HW
-    mac_tx_submit(tw->dev->mac_ctx, skb);
+// Classifies @skb into its AC: TID/queue mapping from the MAC when QoS is
+// on, best effort otherwise.
+static u16 wifi_core_classify(struct wifi_device *dev, struct sk_buff *skb)
+{
+    if (dev->config.qos_enabled)
+        return mac_set_qos_tag(dev->mac_ctx, skb);   // Direct MAC manipulation - bad coupling!
 
-    kfree(tw);
+    skb->priority = 0;
+    skb_set_queue_mapping(skb, WIFI_AC_BE);
+    return WIFI_AC_BE;
 }
 
-int wifi_core_tx(struct wifi_device *dev, struct sk_buff *skb)
+static int __wifi_core_tx(struct wifi_device *dev, struct sk_buff *skb, u16 ac)
 {
-    struct tx_work *tw;
+    struct sk_buff_head *q = &dev->tx_queue[ac];
 
-    if (dev->state != WIFI_STATE_CONNECTED) {
+    // Data keeps flowing to the current AP during a roam scan
+    if (dev->state != WIFI_STATE_CONNECTED && dev->state != WIFI_STATE_ROAMING) {
         dev_kfree_skb(skb);
+        wifi_core_count_drop(dev, WIFI_DROP_NOT_CONNECTED, true, 1);
         return -ENOTCONN;
     }
 
-    tw = kmalloc(sizeof(*tw), GFP_ATOMIC);
-    if (!tw) {
-        dev_kfree_skb(skb);
-        return -ENOMEM;
-    }
+    WIFI_SKB_CB(skb)->tstamp = ktime_get_ns();
+    trace_wifi_tx_enqueue(skb);
+    skb_queue_tail(q, skb);
+    if (dev->netdev && skb_queue_len(q) >= WIFI_TX_QUEUE_HIWAT)
+        netif_stop_subqueue(dev->netdev, ac);
 
-    INIT_WORK(&tw->work, wifi_tx_worker);
-    tw->skb = skb;
-    tw->dev = dev;
-    queue_work(dev->tx_wq, &tw->work);
+    // No-op if tx_work is already pending
+    queue_work(dev->tx_wq, &dev->tx_work);
     return 0;
 }
 
+int wifi_core_tx(struct wifi_device *dev, struct sk_buff *skb)
+{
+    return __wifi_core_tx(dev, skb, wifi_core_classify(dev, skb));
+}
+
 // ─────────────────────────────────────────
 // RESPONSIBILITY 3: RX path
 // ─────────────────────────────────────────
-void wifi_core_rx(struct wifi_device *dev, struct sk_buff *skb)
+// With rx_napi (default) wifi_core_rx() only queues onto dev->rx_ring and
+// schedules NAPI; wifi_napi_poll decrypts up to @budget frames as one batch
+// and feeds them to GRO. The legacy per-packet path is kept for comparison.
+#define WIFI_RX_RING_SIZE       1024
+
+// The hand-off to the stack: GRO from the NAPI poll, the backlog otherwise
+static void wifi_rx_deliver(struct napi_struct *napi, struct sk_buff *skb)
+{
+    KUNIT_STATIC_STUB_REDIRECT(wifi_rx_deliver, napi, skb);
+
+    if (napi)
+        napi_gro_receive(napi, skb);
+    else
+        netif_rx(skb);
+}
+
+// -EBUSY: out of crypto requests, @skb is parked at the head of rx_ring
+static int wifi_core_rx_legacy(struct wifi_device *dev, struct sk_buff *skb)
 {
-    // Decryption (should be in security layer!)
-    if (wpa_decrypt_skb(dev->sec_ctx, skb) < 0) {
+    struct wifi_skb_cb *cb = WIFI_SKB_CB(skb);
+    enum wifi_ac ac;
+    u32 len;
+    int ret;
+
+    // Decryption (should be in security layer!). -EINPROGRESS: an async
+    // engine owns the skb and re-enters here through wifi_core_crypto_done().
+    if (!cb->decrypted)
+        cb->stage_tstamp = ktime_get_ns();
+    ret = wpa_decrypt_skb(dev->sec_ctx, skb);
+    if (ret == -EINPROGRESS)
+        return 0;
+    if (ret == -EBUSY) {
+        // rx_work retries it, ahead of newer frames, once a request is
+        // freed (wifi_core_crypto_resume())
+        skb_queue_head(&dev->rx_ring, skb);
+        return ret;
+    }
+    if (cb->stage_tstamp) {
+        trace_wifi_rx_decrypt(skb, ret);
+        if (!ret)
+            wifi_lat_record(dev, WIFI_LAT_RX_DECRYPT,
+                            ktime_get_ns() - cb->stage_tstamp);
+        cb->stage_tstamp = 0;
+    }
+    if (ret < 0) {
         pr_warn("wifi_core: RX decrypt failed, dropping\n");
         dev_kfree_skb(skb);
-        return;
+        wifi_core_count_drop(dev, WIFI_DROP_DECRYPT, false, 1);
+        return 0;
     }
 
-    // De-fragment
-    // TODO: reassembly logic here
+    // De-fragment; NULL means held for reassembly or dropped
+    skb = wifi_rx_defrag(dev, skb);
+    if (!skb)
+        return 0;
 
     // Pass to network stack
+    len = skb->len;
+    ac = wifi_rx_ac(skb);
+    wifi_lat_record(dev, WIFI_LAT_RX_TOTAL, ktime_get_ns() - WIFI_SKB_CB(skb)->tstamp);
+    trace_wifi_rx_deliver(skb);
     skb->dev = dev->netdev;
     skb->protocol = eth_type_trans(skb, dev->netdev);
-    netif_rx(skb);
+    wifi_rx_deliver(NULL, skb);
+    wifi_core_update_rx_stats(dev, len, ac);
+    return 0;
 }
 
-// ─────────────────────────────────────────
-// RESPONSIBILITY 4: Scanning
-// ─────────────────────────────────────────
-struct wifi_bss_entry {
-    struct list_head    node;
-    struct wifi_bss_info info;
-    unsigned long       last_seen;
-};
-
-int wifi_core_scan_start(struct wifi_device *dev)
+static int wifi_napi_poll(struct napi_struct *napi, int budget)
 {
-    if (dev->state != WIFI_STATE_DISCONNECTED) {
-        pr_warn("wifi_core: can't scan while connected\n");
-        return -EBUSY;
+    struct wifi_device *dev = container_of(napi, struct wifi_device, napi);
+    struct sk_buff_head batch, failed, deferred;
+    struct sk_buff *skb;
+    u32 ac_packets[WIFI_NUM_ACS] = {};
+    struct wifi_skb_cb *cb;
+    unsigned long flags;
+    u64 bytes = 0, now;
+    int work = 0;
+
+    __skb_queue_head_init(&batch);
+    __skb_queue_head_init(&failed);
+    __skb_queue_head_init(&deferred);
+
+    spin_lock_irqsave(&dev->rx_ring.lock, flags);
+    while (work < budget && (skb = __skb_dequeue(&dev->rx_ring))) {
+        __skb_queue_tail(&batch, skb);
+        work++;
     }
+    spin_unlock_irqrestore(&dev->rx_ring.lock, flags);
 
-    dev->state = WIFI_STATE_SCANNING;
+    // Frames back from async decryption or deferred by the last poll
+    // already had their ring time counted
+    now = ktime_get_ns();
+    skb_queue_walk(&batch, skb) {
+        cb = WIFI_SKB_CB(skb);
+        if (cb->decrypted || cb->stage_tstamp)
+            continue;
+        wifi_lat_record(dev, WIFI_LAT_RX_QUEUE, now - cb->tstamp);
+        cb->stage_tstamp = now;
+    }
 
-    // Direct cfg80211 call (creates coupling to cfg layer!)
-    cfg80211_notify_scan_started(dev->netdev);
+    // One call into the security layer for the whole batch
+    wpa_decrypt_skb_list(dev->sec_ctx, &batch, &failed, &deferred);
+    now = ktime_get_ns();
+    if (!skb_queue_empty(&deferred)) {
+        // Out of crypto requests: retry them first, on the poll the next
+        // freed request schedules (wifi_core_crypto_resume()). They don't
+        // count as work, so we complete instead of polling in a loop.
+        work -= skb_queue_len(&deferred);
+        spin_lock_irqsave(&dev->rx_ring.lock, flags);
+        skb_queue_splice(&deferred, &dev->rx_ring);
+        spin_unlock_irqrestore(&dev->rx_ring.lock, flags);
+    }
+    if (!skb_queue_empty(&failed)) {
+        pr_warn_ratelimited("wifi_core: RX decrypt failed for %u frames, dropping\n",
+                            skb_queue_len(&failed));
+        wifi_core_count_drop(dev, WIFI_DROP_DECRYPT, false, skb_queue_len(&failed));
+        __skb_queue_purge(&failed);
+    }
 
-    pr_info("wifi_core: scan started\n");
-    return 0;
+    while ((skb = __skb_dequeue(&batch))) {
+        cb = WIFI_SKB_CB(skb);
+        if (cb->stage_tstamp) {
+            trace_wifi_rx_decrypt(skb, 0);
+            wifi_lat_record(dev, WIFI_LAT_RX_DECRYPT, now - cb->stage_tstamp);
+            cb->stage_tstamp = 0;
+        }
+
+        // De-fragment; NULL means held for reassembly or dropped
+        skb = wifi_rx_defrag(dev, skb);
+        if (!skb)
+            continue;
+
+        ac_packets[wifi_rx_ac(skb)]++;
+        bytes += skb->len;
+        wifi_lat_record(dev, WIFI_LAT_RX_TOTAL, now - WIFI_SKB_CB(skb)->tstamp);
+        trace_wifi_rx_deliver(skb);
+        skb->dev = dev->netdev;
+        skb->protocol = eth_type_trans(skb, dev->netdev);
+        wifi_rx_deliver(napi, skb);
+    }
+
+    // Stats once per poll instead of once per packet
+    wifi_core_update_rx_stats_batch(dev, ac_packets, bytes);
+
+    if (work < budget)
+        napi_complete_done(napi, work);
+    return work;
 }
 
-void wifi_core_scan_result(struct wifi_device *dev, struct wifi_bss_info *bss)
+static void wifi_core_rx_queue(struct wifi_device *dev, struct sk_buff *skb)
 {
-    struct wifi_bss_entry *entry;
-    unsigned long flags;
+    if (skb_queue_len(&dev->rx_ring) >= WIFI_RX_RING_SIZE) {
+        dev_kfree_skb_any(skb);
+        wifi_core_count_drop(dev, WIFI_DROP_QUEUE_FULL, false, 1);
+        return;
+    }
+    skb_queue_tail(&dev->rx_ring, skb);
+}
+
+// Frames parked on rx_ring, because the data path was stopped or crypto
+// requests ran out, go through the legacy path here. With NAPI this only
+// reschedules the poll, for wifi_core_crypto_resume().
+static void wifi_rx_worker(struct work_struct *work)
+{
+    struct wifi_device *dev = container_of(work, struct wifi_device, rx_work);
+    struct sk_buff *skb;
+    bool busy = false;
+    int n = 0;
 
-    entry = kzalloc(sizeof(*entry), GFP_KERNEL);
-    if (!entry)
+    if (READ_ONCE(dev->dp_paused))
         return;
 
-    memcpy(&entry->info, bss, sizeof(*bss));
-    entry->last_seen = jiffies;
+    local_bh_disable();
+    if (rx_napi && dev->netdev) {
+        napi_schedule(&dev->napi);
+        local_bh_enable();
+        return;
+    }
+    while (n++ < NAPI_POLL_WEIGHT && !READ_ONCE(dev->dp_paused) &&
+           (skb = skb_dequeue(&dev->rx_ring))) {
+        // Out of crypto requests: wait for one to be freed
+        if (wifi_core_rx_legacy(dev, skb) == -EBUSY) {
+            busy = true;
+            break;
+        }
+    }
+    local_bh_enable();
 
-    spin_lock_irqsave(&dev->bss_lock, flags);
-    list_add_rcu(&entry->node, &dev->bss_list);
-    spin_unlock_irqrestore(&dev->bss_lock, flags);
+    if (!busy && !READ_ONCE(dev->dp_paused) &&
+        !skb_queue_empty_lockless(&dev->rx_ring))
+        queue_work(dev->rx_wq, &dev->rx_work);
 }
 
-void wifi_core_scan_done(struct wifi_device *dev)
+void wifi_core_rx(struct wifi_device *dev, struct sk_buff *skb)
 {
-    dev->state = WIFI_STATE_DISCONNECTED;
-    cfg80211_notify_scan_done(dev->netdev);  // coupling again!
-    pr_info("wifi_core: scan done\n");
+    WIFI_SKB_CB(skb)->tstamp = ktime_get_ns();
+    WIFI_SKB_CB(skb)->stage_tstamp = 0;
+    // Only wpa_crypto_finish() may set these: a stale cb would skip
+    // decryption and the replay check
+    WIFI_SKB_CB(skb)->decrypted = false;
+    WIFI_SKB_CB(skb)->pn = 0;
+    trace_wifi_rx_receive(skb);
+
+    if (!rx_napi) {
+        // The RCU read side lets wifi_datapath_stop() wait us out. While
+        // it's stopped, or older frames are parked, frames queue behind
+        // them on rx_ring for rx_work.
+        rcu_read_lock();
+        if (READ_ONCE(dev->dp_paused) || !skb_queue_empty_lockless(&dev->rx_ring)) {
+            wifi_core_rx_queue(dev, skb);
+            queue_work(dev->rx_wq, &dev->rx_work);
+        } else if (wifi_core_rx_legacy(dev, skb) == -EBUSY) {
+            // The request may have been freed before the frame was parked
+            queue_work(dev->rx_wq, &dev->rx_work);
+        }
+        rcu_read_unlock();
+        return;
+    }
+
+    wifi_core_rx_queue(dev, skb);
+    napi_schedule(&dev->napi);
 }
 
-// ─────────────────────────────────────────
-// RESPONSIBILITY 5: Connection management
-// ─────────────────────────────────────────
-int wifi_core_connect(struct wifi_device *dev, struct wifi_bss_info *target)
+// Async crypto completion: put the frame back into the pipeline stage after
+// encrypt/decrypt. Decrypted frames are flagged so they skip decryption.
+static void wifi_core_crypto_done(void *priv, struct sk_buff *skb, bool tx, int err)
 {
-    int ret;
+    struct wifi_device *dev = priv;
+    struct wifi_skb_cb *cb = WIFI_SKB_CB(skb);
 
-    dev->state = WIFI_STATE_AUTHENTICATING;
+    if (tx)
+        trace_wifi_tx_encrypt(skb, err);
+    else
+        trace_wifi_rx_decrypt(skb, err);
 
-    // Direct security call without abstraction
-    ret = wpa_start_auth(dev->sec_ctx, target);
-    if (ret) {
-        pr_err("wifi_core: auth failed %d\n", ret);
-        dev->state = WIFI_STATE_DISCONNECTED;
-        return ret;
+    if (err) {
+        dev_kfree_skb_any(skb);
+        wifi_core_count_drop(dev, tx ? WIFI_DROP_ENCRYPT : WIFI_DROP_DECRYPT, tx, 1);
+        return;
     }
 
-    dev->state = WIFI_STATE_ASSOCIATING;
+    wifi_lat_record(dev, tx ? WIFI_LAT_TX_ENCRYPT : WIFI_LAT_RX_DECRYPT,
+                    ktime_get_ns() - cb->stage_tstamp);
+    cb->stage_tstamp = 0;
 
-    ret = mac_associate(dev->mac_ctx, target);
-    if (ret) {
-        pr_err("wifi_core: assoc failed %d\n", ret);
-        dev->state = WIFI_STATE_DISCONNECTED;
-        return ret;
+    if (tx) {
+        skb_queue_tail(&dev->tx_crypto_done, skb);
+        queue_work(dev->tx_wq, &dev->tx_work);
+    } else if (rx_napi) {
+        skb_queue_tail(&dev->rx_ring, skb);
+        napi_schedule(&dev->napi);
+    } else {
+        wifi_core_rx_legacy(dev, skb);
     }
-
-    dev->state = WIFI_STATE_CONNECTED;
-    pr_info("wifi_core: connected to %pM\n", target->bssid);
-    return 0;
 }
 
-void wifi_core_disconnect(struct wifi_device *dev)
+// A crypto request was freed after TX or RX ran out of them: retry what
+// they held back. Any context. While the data path is stopped,
+// wifi_datapath_start() does this instead.
+static void wifi_core_crypto_resume(void *priv)
 {
-    mac_disassociate(dev->mac_ctx);
-    wpa_reset(dev->sec_ctx);
-    dev->state = WIFI_STATE_DISCONNECTED;
-    cfg80211_notify_disconnected(dev->netdev);  // coupling!
+    struct wifi_device *dev = priv;
+
+    if (READ_ONCE(dev->dp_paused))
+        return;
+    queue_work(dev->tx_wq, &dev->tx_work);
+    queue_work(dev->rx_wq, &dev->rx_work);
 }
 
-// ─────────────────────────────────────────
-// RESPONSIBILITY 6: Power management
-// ─────────────────────────────────────────
-int wifi_core_suspend(struct wifi_device *dev)
+// Key changes and firmware resets must not overlap encrypt/decrypt, so
+// they bracket themselves with these. Stopping disables the TX subqueues
+// and NAPI, idles tx_work, waits out the legacy RX path (RCU) and lets
+// async crypto drain; queued frames are kept. Calls nest, only the
+// outermost pair does the work. Process context only.
+static void wifi_datapath_stop(struct wifi_device *dev)
 {
-    mac_set_power_save(dev->mac_ctx, true);
-    pr_info("wifi_core: suspended\n");
-    return 0;
+    mutex_lock(&dev->dp_lock);
+    if (dev->dp_stopped++)
+        goto out;
+
+    WRITE_ONCE(dev->dp_paused, true);
+    if (dev->netdev) {
+        netif_tx_disable(dev->netdev);
+        napi_disable(&dev->napi);
+    }
+    cancel_work_sync(&dev->tx_work);
+    synchronize_rcu();
+    cancel_work_sync(&dev->rx_work);
+    // Completions only requeue frames; the work they kick sees dp_paused
+    wpa_quiesce(dev->sec_ctx);
+out:
+    mutex_unlock(&dev->dp_lock);
 }
 
-int wifi_core_resume(struct wifi_device *dev)
+static void wifi_datapath_start(struct wifi_device *dev)
 {
-    mac_set_power_save(dev->mac_ctx, false);
-    pr_info("wifi_core: resumed\n");
-    return 0;
+    mutex_lock(&dev->dp_lock);
+    if (WARN_ON(!dev->dp_stopped) || --dev->dp_stopped)
+        goto out;
+
+    WRITE_ONCE(dev->dp_paused, false);
+    if (dev->netdev) {
+        napi_enable(&dev->napi);
+        netif_tx_wake_all_queues(dev->netdev);
+    }
+
+    if (rx_napi) {
+        // napi_schedule() expects BHs off; it runs the poll on bh enable
+        local_bh_disable();
+        if (dev->netdev)
+            napi_schedule(&dev->napi);
+        local_bh_enable();
+    } else {
+        queue_work(dev->rx_wq, &dev->rx_work);
+    }
+    queue_work(dev->tx_wq, &dev->tx_work);
+out:
+    mutex_unlock(&dev->dp_lock);
 }
 
 // ─────────────────────────────────────────
-// RESPONSIBILITY 7: Statistics
+// RESPONSIBILITY 4: Scanning
 // ─────────────────────────────────────────
-struct wifi_stats {
-    u64 tx_packets;
-    u64 rx_packets;
-    u64 tx_bytes;
-    u64 rx_bytes;
-    u32 tx_errors;
-    u32 rx_errors;
-    u32 tx_dropped;
-    u32 rx_dropped;
+// BSS table: entries come from a shared slab cache, are keyed by BSSID in
+// the bss_hash rhashtable (sized from bss_capacity and resized as the table
+// grows, so lookups stay O(1) at any capacity) and by channel in bss_chan,
+// and live on bss_list for RCU walkers.
+// Writers hold bss_lock; readers only need rcu_read_lock(). Once the table
+// reaches bss_capacity the least recently seen entry (tail of bss_lru) is
+// evicted, and entries unseen for WIFI_BSS_MAX_AGE are expired on scan done.
+#define WIFI_BSS_MAX_AGE        (30 * HZ)
+
+struct wifi_bss_entry {
+    struct list_head    node;           // dev->bss_list
+    struct list_head    lru;            // dev->bss_lru
+    struct rhash_head   hnode;          // dev->bss_hash
+    struct hlist_node   chan_node;      // dev->bss_chan
+    struct rcu_head     rcu;
+    struct wifi_bss_info info;
+    unsigned long       last_seen;
 };
 
-static struct wifi_stats g_stats;
+static struct kmem_cache *wifi_bss_cachep;
+static unsigned int wifi_bss_cache_users;   // Protected by g_dev_lock
+
+static const struct rhashtable_params wifi_bss_hash_params = {
+    .head_offset         = offsetof(struct wifi_bss_entry, hnode),
+    .key_offset          = offsetof(struct wifi_bss_entry, info.bssid),
+    .key_len             = ETH_ALEN,
+    .automatic_shrinking = true,
+};
 
-void wifi_core_update_tx_stats(u32 bytes, bool success)
+static int wifi_bss_table_init(struct wifi_device *dev)
 {
-    if (success) {
-        g_stats.tx_packets++;
-        g_stats.tx_bytes += bytes;
-    } else {
-        g_stats.tx_errors++;
-        g_stats.tx_dropped++;
+    struct rhashtable_params params = wifi_bss_hash_params;
+    int ret;
+
+    dev->bss_capacity = max(bss_capacity, 1U);
+    params.nelem_hint = min(dev->bss_capacity, (u32)U16_MAX);
+    ret = rhashtable_init(&dev->bss_hash, &params);
+    if (ret)
+        return ret;
+
+    mutex_lock(&g_dev_lock);
+    if (!wifi_bss_cache_users) {
+        wifi_bss_cachep = KMEM_CACHE(wifi_bss_entry, 0);
+        if (!wifi_bss_cachep) {
+            mutex_unlock(&g_dev_lock);
+            rhashtable_destroy(&dev->bss_hash);
+            return -ENOMEM;
+        }
     }
+    wifi_bss_cache_users++;
+    mutex_unlock(&g_dev_lock);
+
+    spin_lock_init(&dev->bss_lock);
+    INIT_LIST_HEAD(&dev->bss_list);
+    INIT_LIST_HEAD(&dev->bss_lru);
+    hash_init(dev->bss_chan);
+    return 0;
 }
 
-void wifi_core_update_rx_stats(u32 bytes, bool success)
+static void wifi_bss_free_rcu(struct rcu_head *head)
 {
-    if (success) {
-        g_stats.rx_packets++;
-        g_stats.rx_bytes += bytes;
-    } else {
-        g_stats.rx_errors++;
-        g_stats.rx_dropped++;
-    }
+    kmem_cache_free(wifi_bss_cachep, container_of(head, struct wifi_bss_entry, rcu));
 }
 
-void wifi_core_get_stats(struct wifi_stats *out)
+// Caller holds bss_lock or rcu_read_lock()
+static struct wifi_bss_entry *wifi_bss_lookup(struct wifi_device *dev, const u8 *bssid)
 {
-    memcpy(out, &g_stats, sizeof(*out));
+    return rhashtable_lookup_fast(&dev->bss_hash, bssid, wifi_bss_hash_params);
 }
 
-// ─────────────────────────────────────────
-// RESPONSIBILITY 8: Config management
-// (Should be a separate config module)
-// ─────────────────────────────────────────
-int wifi_core_set_tx_power(struct wifi_device *dev, u32 dbm)
+// Caller holds bss_lock
+static void wifi_bss_evict(struct wifi_device *dev, struct wifi_bss_entry *entry)
 {
-    if (dbm > 30) {
-        pr_err("wifi_core: tx power %u dBm exceeds regulatory limit\n", dbm);
-        return -EINVAL;
-    }
-    dev->config.tx_power_dbm = dbm;
-    return mac_set_tx_power(dev->mac_ctx, dbm);  // mac coupling
+    list_del_rcu(&entry->node);
+    rhashtable_remove_fast(&dev->bss_hash, &entry->hnode, wifi_bss_hash_params);
+    hash_del_rcu(&entry->chan_node);
+    list_del(&entry->lru);
+    dev->bss_count--;
+    call_rcu(&entry->rcu, wifi_bss_free_rcu);
 }
 
-int wifi_core_set_rts_threshold(struct wifi_device *dev, u32 thresh)
+// Caller holds bss_lock
+static void wifi_bss_expire(struct wifi_device *dev, u32 keep)
 {
-    dev->config.rts_threshold = thresh;
-    return 0;
+    struct wifi_bss_entry *entry, *tmp;
+
+    list_for_each_entry_safe_reverse(entry, tmp, &dev->bss_lru, lru) {
+        if (dev->bss_count <= keep &&
+            time_before(jiffies, entry->last_seen + WIFI_BSS_MAX_AGE))
+            break;
+        wifi_bss_evict(dev, entry);
+    }
 }
 
-// ─────────────────────────────────────────
-// RESPONSIBILITY 9: Firmware management
-// (Definitely should be its own module!)
-// ─────────────────────────────────────────
-int wifi_core_fw_load(struct wifi_device *dev, const char *fw_path)
+static void wifi_bss_table_free(struct wifi_device *dev)
 {
-    // Firmware loading logic embedded in core - bad!
-    pr_info("wifi_core: loading firmware from %s\n", fw_path);
-    // ... would use request_firmware() here
-    return 0;
+    struct wifi_bss_entry *entry, *tmp;
+    unsigned long flags;
+
+    spin_lock_irqsave(&dev->bss_lock, flags);
+    list_for_each_entry_safe(entry, tmp, &dev->bss_lru, lru)
+        wifi_bss_evict(dev, entry);
+    spin_unlock_irqrestore(&dev->bss_lock, flags);
+
+    rhashtable_destroy(&dev->bss_hash);
+
+    // Wait for pending wifi_bss_free_rcu() callbacks before touching the cache
+    rcu_barrier();
+
+    mutex_lock(&g_dev_lock);
+    if (!--wifi_bss_cache_users) {
+        kmem_cache_destroy(wifi_bss_cachep);
+        wifi_bss_cachep = NULL;
+    }
+    mutex_unlock(&g_dev_lock);
 }
 
-int wifi_core_fw_reset(struct wifi_device *dev)
+int wifi_core_set_bss_capacity(struct wifi_device *dev, u32 capacity)
 {
-    pr_info("wifi_core: resetting firmware\n");
-    wifi_core_deinit(dev);
-    return wifi_core_init(&dev);
-}
+    unsigned long flags;
+
+    if (!capacity)
+        return -EINVAL;
+
+    spin_lock_irqsave(&dev->bss_lock, flags);
+    dev->bss_capacity = capacity;
+    while (dev->bss_count > capacity)
+        wifi_bss_evict(dev, list_last_entry(&dev->bss_lru, struct wifi_bss_entry, lru));
+    spin_unlock_irqrestore(&dev->bss_lock, flags);
+    return 0;
+}
+
+int wifi_core_bss_lookup(struct wifi_device *dev, const u8 *bssid,
+                         struct wifi_bss_info *out)
+{
+    struct wifi_bss_entry *entry;
+    int ret = -ENOENT;
+
+    rcu_read_lock();
+    entry = wifi_bss_lookup(dev, bssid);
+    if (entry) {
+        memcpy(out, &entry->info, sizeof(*out));
+        ret = 0;
+    }
+    rcu_read_unlock();
+    return ret;
+}
+
+// Copies up to @max entries seen on @channel into @out; returns the count.
+int wifi_core_bss_get_channel(struct wifi_device *dev, u32 channel,
+                              struct wifi_bss_info *out, int max)
+{
+    struct wifi_bss_entry *entry;
+    int n = 0;
+
+    rcu_read_lock();
+    hash_for_each_possible_rcu(dev->bss_chan, entry, chan_node, channel) {
+        if (n >= max)
+            break;
+        if (entry->info.channel == channel)
+            memcpy(&out[n++], &entry->info, sizeof(*out));
+    }
+    rcu_read_unlock();
+    return n;
+}
+
+// Higher is better: RSSI in dBm plus a bonus for stronger security
+static int wifi_bss_score(const struct wifi_bss_info *info)
+{
+    static const int sec_bonus[] = {
+        [WIFI_SEC_OPEN] = 0,
+        [WIFI_SEC_WEP]  = -20,
+        [WIFI_SEC_WPA2] = 5,
+        [WIFI_SEC_WPA3] = 10,
+    };
+    int score = READ_ONCE(info->rssi);
+
+    if (info->security < ARRAY_SIZE(sec_bonus))
+        score += sec_bonus[info->security];
+    return score;
+}
+
+int wifi_core_bss_best(struct wifi_device *dev, struct wifi_bss_info *out)
+{
+    struct wifi_bss_entry *entry, *best = NULL;
+    int best_score = INT_MIN;
+    int ret = -ENOENT;
+
+    rcu_read_lock();
+    list_for_each_entry_rcu(entry, &dev->bss_list, node) {
+        int score = wifi_bss_score(&entry->info);
+
+        if (score > best_score) {
+            best = entry;
+            best_score = score;
+        }
+    }
+    if (best) {
+        memcpy(out, &best->info, sizeof(*out));
+        ret = 0;
+    }
+    rcu_read_unlock();
+    return ret;
+}
+
+static int wifi_bss_show(struct seq_file *s, void *unused)
+{
+    struct wifi_device *dev = s->private;
+    struct wifi_bss_entry *entry;
+
+    seq_printf(s, "entries %u capacity %u\n", READ_ONCE(dev->bss_count),
+               READ_ONCE(dev->bss_capacity));
+    rcu_read_lock();
+    list_for_each_entry_rcu(entry, &dev->bss_list, node) {
+        seq_printf(s, "%pM ch %3u rssi %4d sec %d ssid %.*s age %ums\n",
+                   entry->info.bssid, entry->info.channel,
+                   READ_ONCE(entry->info.rssi), entry->info.security,
+                   entry->info.ssid_len, entry->info.ssid,
+                   jiffies_to_msecs(jiffies - READ_ONCE(entry->last_seen)));
+    }
+    rcu_read_unlock();
+    return 0;
+}
+DEFINE_SHOW_ATTRIBUTE(wifi_bss);
+
+// Scan when disconnected; with @roam, the roam scan (limited to @channels
+// if any) that runs without leaving the current AP. Callers outside the
+// roam path get -EBUSY while a roam is in progress like when connected.
+static int __wifi_core_scan(struct wifi_device *dev, const u32 *channels, int n,
+                            bool roam)
+{
+    if (roam ? dev->state != WIFI_STATE_ROAMING
+             : dev->state != WIFI_STATE_DISCONNECTED) {
+        pr_warn("wifi_core: can't scan while connected\n");
+        return -EBUSY;
+    }
+    if (!roam)
+        dev->state = WIFI_STATE_SCANNING;
+
+    n = min(n, WIFI_ROAM_MAX_CHANNELS);
+    if (n)
+        memcpy(dev->scan_channels, channels, n * sizeof(*channels));
+    dev->n_scan_channels = n;
+    dev->scan_start_ns = ktime_get_ns();
+    trace_wifi_scan_start(n);
+
+    // Direct cfg80211 call (creates coupling to cfg layer!)
+    cfg80211_notify_scan_started(dev->netdev);
+
+    // Would program the firmware scan (dev->scan_channels, or all) here
+    if (n)
+        pr_info("wifi_core: partial scan started on %d channels\n", n);
+    else
+        pr_info("wifi_core: scan started\n");
+    return 0;
+}
+
+int wifi_core_scan_start(struct wifi_device *dev)
+{
+    return __wifi_core_scan(dev, NULL, 0, false);
+}
+
+int wifi_core_scan_channels(struct wifi_device *dev, const u32 *channels, int n)
+{
+    if (!channels || n <= 0)
+        return -EINVAL;
+    return __wifi_core_scan(dev, channels, n, false);
+}
+
+void wifi_core_scan_result(struct wifi_device *dev, struct wifi_bss_info *bss)
+{
+    struct wifi_bss_entry *entry, *old;
+    unsigned long flags;
+
+    trace_wifi_scan_result(bss);
+    spin_lock_irqsave(&dev->bss_lock, flags);
+
+    old = wifi_bss_lookup(dev, bss->bssid);
+    if (old && old->info.channel == bss->channel &&
+        old->info.security == bss->security &&
+        old->info.ssid_len == bss->ssid_len &&
+        !memcmp(old->info.ssid, bss->ssid, bss->ssid_len)) {
+        // Only RSSI moved: refresh in place, no allocation
+        WRITE_ONCE(old->info.rssi, bss->rssi);
+        WRITE_ONCE(old->last_seen, jiffies);
+        list_move(&old->lru, &dev->bss_lru);
+        spin_unlock_irqrestore(&dev->bss_lock, flags);
+        return;
+    }
+
+    entry = kmem_cache_alloc(wifi_bss_cachep, GFP_ATOMIC);
+    if (!entry) {
+        spin_unlock_irqrestore(&dev->bss_lock, flags);
+        return;
+    }
+
+    memcpy(&entry->info, bss, sizeof(*bss));
+    entry->last_seen = jiffies;
+
+    if (old) {
+        // Channel, SSID or security changed: publish an updated copy so RCU
+        // readers never see a half-written info or an entry moving between
+        // channel buckets
+        if (rhashtable_replace_fast(&dev->bss_hash, &old->hnode, &entry->hnode,
+                                    wifi_bss_hash_params)) {
+            kmem_cache_free(wifi_bss_cachep, entry);
+            spin_unlock_irqrestore(&dev->bss_lock, flags);
+            return;
+        }
+        list_replace_rcu(&old->node, &entry->node);
+        hash_del_rcu(&old->chan_node);
+        list_del(&old->lru);
+        call_rcu(&old->rcu, wifi_bss_free_rcu);
+    } else {
+        if (rhashtable_insert_fast(&dev->bss_hash, &entry->hnode,
+                                   wifi_bss_hash_params)) {
+            kmem_cache_free(wifi_bss_cachep, entry);
+            spin_unlock_irqrestore(&dev->bss_lock, flags);
+            return;
+        }
+        if (dev->bss_count >= dev->bss_capacity)
+            wifi_bss_evict(dev, list_last_entry(&dev->bss_lru,
+                                                struct wifi_bss_entry, lru));
+        list_add_rcu(&entry->node, &dev->bss_list);
+        dev->bss_count++;
+    }
+    hash_add_rcu(dev->bss_chan, &entry->chan_node, bss->channel);
+    list_add(&entry->lru, &dev->bss_lru);
+
+    spin_unlock_irqrestore(&dev->bss_lock, flags);
+}
+
+void wifi_core_scan_done(struct wifi_device *dev)
+{
+    unsigned long flags;
+
+    spin_lock_irqsave(&dev->bss_lock, flags);
+    wifi_bss_expire(dev, dev->bss_capacity);
+    spin_unlock_irqrestore(&dev->bss_lock, flags);
+
+    wifi_lat_record(dev, WIFI_LAT_SCAN, ktime_get_ns() - dev->scan_start_ns);
+    trace_wifi_scan_done(READ_ONCE(dev->bss_count),
+                         dev->state == WIFI_STATE_ROAMING);
+    cfg80211_notify_scan_done(dev->netdev);  // coupling again!
+    pr_info("wifi_core: scan done\n");
+
+    if (dev->state == WIFI_STATE_ROAMING) {
+        wifi_roam_scan_done(dev);
+        return;
+    }
+    dev->state = WIFI_STATE_DISCONNECTED;
+}
+
+// ─────────────────────────────────────────
+// RESPONSIBILITY 5: Connection management
+// ─────────────────────────────────────────
+int wifi_core_connect(struct wifi_device *dev, struct wifi_bss_info *target)
+{
+    bool roaming = dev->state == WIFI_STATE_ROAMING;
+    u64 start;
+    int ret;
+
+    dev->state = WIFI_STATE_AUTHENTICATING;
+
+    // Direct security call without abstraction. Reuses a cached PMK for
+    // @target if there is one.
+    // Keys are replaced under us otherwise
+    wifi_datapath_stop(dev);
+    start = ktime_get_ns();
+    ret = wpa_start_auth(dev->sec_ctx, target);
+    trace_wifi_connect_auth(target, ret);
+    // Never reassemble fragments received under different keys
+    wifi_defrag_flush(dev);
+    wifi_datapath_start(dev);
+    if (ret) {
+        pr_err("wifi_core: auth failed %d\n", ret);
+        dev->state = WIFI_STATE_DISCONNECTED;
+        return ret;
+    }
+    wifi_lat_record(dev, WIFI_LAT_AUTH, ktime_get_ns() - start);
+    if (roaming)
+        dev->roam.t_auth_done = ktime_get();
+
+    dev->state = WIFI_STATE_ASSOCIATING;
+
+    start = ktime_get_ns();
+    ret = mac_associate(dev->mac_ctx, target);
+    trace_wifi_connect_assoc(target, ret);
+    if (ret) {
+        pr_err("wifi_core: assoc failed %d\n", ret);
+        dev->state = WIFI_STATE_DISCONNECTED;
+        return ret;
+    }
+    wifi_lat_record(dev, WIFI_LAT_ASSOC, ktime_get_ns() - start);
+    if (roaming)
+        dev->roam.t_assoc_done = ktime_get();
+
+    memcpy(&dev->cur_bss, target, sizeof(dev->cur_bss));
+    dev->state = WIFI_STATE_CONNECTED;
+    pr_info("wifi_core: connected to %pM\n", target->bssid);
+    return 0;
+}
+
+void wifi_core_disconnect(struct wifi_device *dev)
+{
+    mac_disassociate(dev->mac_ctx);
+    wifi_datapath_stop(dev);
+    wpa_reset(dev->sec_ctx);
+    wifi_defrag_flush(dev);
+    wifi_datapath_start(dev);
+    memset(&dev->cur_bss, 0, sizeof(dev->cur_bss));
+    dev->state = WIFI_STATE_DISCONNECTED;
+    cfg80211_notify_disconnected(dev->netdev);  // coupling!
+}
+
+// ─────────────────────────────────────────
+// RESPONSIBILITY 6: Power management
+// ─────────────────────────────────────────
+int wifi_core_suspend(struct wifi_device *dev)
+{
+    mac_set_power_save(dev->mac_ctx, true);
+    pr_info("wifi_core: suspended\n");
+    return 0;
+}
+
+int wifi_core_resume(struct wifi_device *dev)
+{
+    mac_set_power_save(dev->mac_ctx, false);
+    pr_info("wifi_core: resumed\n");
+    return 0;
+}
+
+// ─────────────────────────────────────────
+// RESPONSIBILITY 7: Statistics
+// ─────────────────────────────────────────
+// Latency histogram bucket b counts durations in [2^(b-1), 2^b) ns; the
+// last bucket also takes everything slower (about 1s and up).
+#define WIFI_LAT_BUCKETS        32
+
+// Counters are per device and per CPU: writers only touch their own CPU's
+// copy under u64_stats_sync (irqsave: TX, NAPI and IRQ-context drops can
+// nest on one CPU), readers fold all CPUs. Drops also count as errors.
+struct wifi_pcpu_stats {
+    u64_stats_t tx_packets;
+    u64_stats_t rx_packets;
+    u64_stats_t tx_bytes;
+    u64_stats_t rx_bytes;
+    u64_stats_t tx_dropped;
+    u64_stats_t rx_dropped;
+    u64_stats_t tx_ac_packets[WIFI_NUM_ACS];
+    u64_stats_t rx_ac_packets[WIFI_NUM_ACS];
+    u64_stats_t drops[WIFI_NUM_DROP_REASONS];
+    struct u64_stats_sync syncp;
+    // Latency histograms: plain this_cpu_inc() counters outside syncp
+    unsigned long lat[WIFI_LAT_NR_STAGES][WIFI_LAT_BUCKETS];
+};
+
+static int wifi_stats_init(struct wifi_device *dev)
+{
+    int cpu;
+
+    dev->stats = alloc_percpu(struct wifi_pcpu_stats);
+    if (!dev->stats)
+        return -ENOMEM;
+
+    for_each_possible_cpu(cpu)
+        u64_stats_init(&per_cpu_ptr(dev->stats, cpu)->syncp);
+    return 0;
+}
+
+static void wifi_core_update_tx_stats_batch(struct wifi_device *dev,
+                                            const u32 *ac_packets, u64 bytes)
+{
+    struct wifi_pcpu_stats *st = get_cpu_ptr(dev->stats);
+    unsigned long flags;
+    int ac;
+
+    flags = u64_stats_update_begin_irqsave(&st->syncp);
+    for (ac = 0; ac < WIFI_NUM_ACS; ac++) {
+        u64_stats_add(&st->tx_packets, ac_packets[ac]);
+        u64_stats_add(&st->tx_ac_packets[ac], ac_packets[ac]);
+    }
+    u64_stats_add(&st->tx_bytes, bytes);
+    u64_stats_update_end_irqrestore(&st->syncp, flags);
+    put_cpu_ptr(dev->stats);
+}
+
+static void wifi_core_update_rx_stats(struct wifi_device *dev, u32 bytes,
+                                      enum wifi_ac ac)
+{
+    struct wifi_pcpu_stats *st = get_cpu_ptr(dev->stats);
+    unsigned long flags;
+
+    flags = u64_stats_update_begin_irqsave(&st->syncp);
+    u64_stats_inc(&st->rx_packets);
+    u64_stats_add(&st->rx_bytes, bytes);
+    u64_stats_inc(&st->rx_ac_packets[ac]);
+    u64_stats_update_end_irqrestore(&st->syncp, flags);
+    put_cpu_ptr(dev->stats);
+}
+
+static void wifi_core_update_rx_stats_batch(struct wifi_device *dev,
+                                            const u32 *ac_packets, u64 bytes)
+{
+    struct wifi_pcpu_stats *st = get_cpu_ptr(dev->stats);
+    unsigned long flags;
+    int ac;
+
+    flags = u64_stats_update_begin_irqsave(&st->syncp);
+    for (ac = 0; ac < WIFI_NUM_ACS; ac++) {
+        u64_stats_add(&st->rx_packets, ac_packets[ac]);
+        u64_stats_add(&st->rx_ac_packets[ac], ac_packets[ac]);
+    }
+    u64_stats_add(&st->rx_bytes, bytes);
+    u64_stats_update_end_irqrestore(&st->syncp, flags);
+    put_cpu_ptr(dev->stats);
+}
+
+static void wifi_core_count_drop(struct wifi_device *dev, enum wifi_drop_reason reason,
+                                 bool tx, u32 count)
+{
+    struct wifi_pcpu_stats *st = get_cpu_ptr(dev->stats);
+    unsigned long flags;
+
+    flags = u64_stats_update_begin_irqsave(&st->syncp);
+    u64_stats_add(tx ? &st->tx_dropped : &st->rx_dropped, count);
+    u64_stats_add(&st->drops[reason], count);
+    u64_stats_update_end_irqrestore(&st->syncp, flags);
+    put_cpu_ptr(dev->stats);
+}
+
+void wifi_core_get_stats(struct wifi_device *dev, struct wifi_stats *out)
+{
+    int cpu, i;
+
+    memset(out, 0, sizeof(*out));
+
+    for_each_possible_cpu(cpu) {
+        const struct wifi_pcpu_stats *st = per_cpu_ptr(dev->stats, cpu);
+        struct wifi_stats snap;
+        unsigned int start;
+
+        do {
+            start = u64_stats_fetch_begin(&st->syncp);
+            snap.tx_packets = u64_stats_read(&st->tx_packets);
+            snap.rx_packets = u64_stats_read(&st->rx_packets);
+            snap.tx_bytes   = u64_stats_read(&st->tx_bytes);
+            snap.rx_bytes   = u64_stats_read(&st->rx_bytes);
+            snap.tx_dropped = u64_stats_read(&st->tx_dropped);
+            snap.rx_dropped = u64_stats_read(&st->rx_dropped);
+            for (i = 0; i < WIFI_NUM_ACS; i++) {
+                snap.tx_ac_packets[i] = u64_stats_read(&st->tx_ac_packets[i]);
+                snap.rx_ac_packets[i] = u64_stats_read(&st->rx_ac_packets[i]);
+            }
+            for (i = 0; i < WIFI_NUM_DROP_REASONS; i++)
+                snap.drops[i] = u64_stats_read(&st->drops[i]);
+        } while (u64_stats_fetch_retry(&st->syncp, start));
+
+        out->tx_packets += snap.tx_packets;
+        out->rx_packets += snap.rx_packets;
+        out->tx_bytes   += snap.tx_bytes;
+        out->rx_bytes   += snap.rx_bytes;
+        out->tx_dropped += snap.tx_dropped;
+        out->rx_dropped += snap.rx_dropped;
+        for (i = 0; i < WIFI_NUM_ACS; i++) {
+            out->tx_ac_packets[i] += snap.tx_ac_packets[i];
+            out->rx_ac_packets[i] += snap.rx_ac_packets[i];
+        }
+        for (i = 0; i < WIFI_NUM_DROP_REASONS; i++)
+            out->drops[i] += snap.drops[i];
+    }
+
+    out->tx_errors = out->tx_dropped;
+    out->rx_errors = out->rx_dropped;
+}
+
+static void wifi_ndo_get_stats64(struct net_device *netdev,
+                                 struct rtnl_link_stats64 *stats)
+{
+    struct wifi_stats st;
+
+    wifi_core_get_stats(netdev->ml_priv, &st);
+    stats->tx_packets = st.tx_packets;
+    stats->rx_packets = st.rx_packets;
+    stats->tx_bytes   = st.tx_bytes;
+    stats->rx_bytes   = st.rx_bytes;
+    stats->tx_errors  = st.tx_errors;
+    stats->rx_errors  = st.rx_errors;
+    stats->tx_dropped = st.tx_dropped;
+    stats->rx_dropped = st.rx_dropped;
+}
+
+static netdev_tx_t wifi_ndo_start_xmit(struct sk_buff *skb, struct net_device *netdev)
+{
+    // Already classified by ndo_select_queue; consumes the skb on every path
+    __wifi_core_tx(netdev->ml_priv, skb, skb_get_queue_mapping(skb));
+    return NETDEV_TX_OK;
+}
+
+static u16 wifi_ndo_select_queue(struct net_device *netdev, struct sk_buff *skb,
+                                 struct net_device *sb_dev)
+{
+    return wifi_core_classify(netdev->ml_priv, skb);
+}
+
+static const struct net_device_ops wifi_netdev_ops = {
+    .ndo_start_xmit     = wifi_ndo_start_xmit,
+    .ndo_select_queue   = wifi_ndo_select_queue,
+    .ndo_get_stats64    = wifi_ndo_get_stats64,
+};
+
+// ethtool -S: order must match wifi_ethtool_get_stats()
+static const char wifi_ethtool_ac_names[WIFI_NUM_ACS][4] = {
+    "vo", "vi", "be", "bk",
+};
+
+static const char * const wifi_ethtool_drop_names[WIFI_NUM_DROP_REASONS] = {
+    [WIFI_DROP_DECRYPT]         = "drop_decrypt",
+    [WIFI_DROP_ENCRYPT]         = "drop_encrypt",
+    [WIFI_DROP_NOT_CONNECTED]   = "drop_not_connected",
+    [WIFI_DROP_OOM]             = "drop_oom",
+    [WIFI_DROP_FRAG]            = "drop_frag",
+    [WIFI_DROP_QUEUE_FULL]      = "drop_queue_full",
+};
+
+#define WIFI_ETHTOOL_NUM_STATS  (2 * WIFI_NUM_ACS + WIFI_NUM_DROP_REASONS)
+
+static int wifi_ethtool_get_sset_count(struct net_device *netdev, int sset)
+{
+    return sset == ETH_SS_STATS ? WIFI_ETHTOOL_NUM_STATS : -EOPNOTSUPP;
+}
+
+static void wifi_ethtool_get_strings(struct net_device *netdev, u32 sset, u8 *data)
+{
+    int i;
+
+    if (sset != ETH_SS_STATS)
+        return;
+
+    for (i = 0; i < WIFI_NUM_ACS; i++)
+        ethtool_sprintf(&data, "tx_%s_packets", wifi_ethtool_ac_names[i]);
+    for (i = 0; i < WIFI_NUM_ACS; i++)
+        ethtool_sprintf(&data, "rx_%s_packets", wifi_ethtool_ac_names[i]);
+    for (i = 0; i < WIFI_NUM_DROP_REASONS; i++)
+        ethtool_puts(&data, wifi_ethtool_drop_names[i]);
+}
+
+static void wifi_ethtool_get_stats(struct net_device *netdev,
+                                   struct ethtool_stats *estats, u64 *data)
+{
+    struct wifi_stats st;
+    int i;
+
+    wifi_core_get_stats(netdev->ml_priv, &st);
+    for (i = 0; i < WIFI_NUM_ACS; i++)
+        *data++ = st.tx_ac_packets[i];
+    for (i = 0; i < WIFI_NUM_ACS; i++)
+        *data++ = st.rx_ac_packets[i];
+    for (i = 0; i < WIFI_NUM_DROP_REASONS; i++)
+        *data++ = st.drops[i];
+}
+
+static const struct ethtool_ops wifi_ethtool_ops = {
+    .get_sset_count     = wifi_ethtool_get_sset_count,
+    .get_strings        = wifi_ethtool_get_strings,
+    .get_ethtool_stats  = wifi_ethtool_get_stats,
+};
+
+// Always on: one clock read and one per-CPU increment per stage
+static void wifi_lat_record(struct wifi_device *dev, enum wifi_lat_stage stage, u64 ns)
+{
+    this_cpu_inc(dev->stats->lat[stage][min_t(int, fls64(ns), WIFI_LAT_BUCKETS - 1)]);
+}
+
+static const char * const wifi_lat_names[WIFI_LAT_NR_STAGES] = {
+    [WIFI_LAT_TX_QUEUE]     = "tx_queue",
+    [WIFI_LAT_TX_ENCRYPT]   = "tx_encrypt",
+    [WIFI_LAT_TX_TOTAL]     = "tx_total",
+    [WIFI_LAT_RX_QUEUE]     = "rx_queue",
+    [WIFI_LAT_RX_DECRYPT]   = "rx_decrypt",
+    [WIFI_LAT_RX_TOTAL]     = "rx_total",
+    [WIFI_LAT_SCAN]         = "scan",
+    [WIFI_LAT_AUTH]         = "auth",
+    [WIFI_LAT_ASSOC]        = "assoc",
+    [WIFI_LAT_ROAM]         = "roam",
+};
+
+// Upper bound (ns) of the bucket holding the @pct-th percentile
+static u64 wifi_lat_percentile(const unsigned long *hist, unsigned long total, int pct)
+{
+    unsigned long want = DIV_ROUND_UP_ULL((u64)total * pct, 100);
+    unsigned long sum = 0;
+    int b;
+
+    for (b = 0; b < WIFI_LAT_BUCKETS - 1; b++) {
+        sum += hist[b];
+        if (sum >= want)
+            break;
+    }
+    return 1ULL << b;
+}
+
+// Folds @stage's histogram over all CPUs into @hist; returns the sample count
+static unsigned long wifi_lat_fold(struct wifi_device *dev, enum wifi_lat_stage stage,
+                                   unsigned long *hist)
+{
+    unsigned long total = 0;
+    int cpu, b;
+
+    memset(hist, 0, WIFI_LAT_BUCKETS * sizeof(*hist));
+    for_each_possible_cpu(cpu) {
+        const struct wifi_pcpu_stats *st = per_cpu_ptr(dev->stats, cpu);
+
+        for (b = 0; b < WIFI_LAT_BUCKETS; b++)
+            hist[b] += READ_ONCE(st->lat[stage][b]);
+    }
+
+    for (b = 0; b < WIFI_LAT_BUCKETS; b++)
+        total += hist[b];
+    return total;
+}
+
+static int wifi_lat_show(struct seq_file *s, void *unused)
+{
+    struct wifi_device *dev = s->private;
+    unsigned long hist[WIFI_LAT_BUCKETS], total;
+    int stage, b;
+
+    seq_puts(s, "# stage count p50_ns p90_ns p99_ns | log2(ns) buckets\n");
+    for (stage = 0; stage < WIFI_LAT_NR_STAGES; stage++) {
+        total = wifi_lat_fold(dev, stage, hist);
+        seq_printf(s, "%-10s %lu", wifi_lat_names[stage], total);
+        if (total)
+            seq_printf(s, " %llu %llu %llu",
+                       wifi_lat_percentile(hist, total, 50),
+                       wifi_lat_percentile(hist, total, 90),
+                       wifi_lat_percentile(hist, total, 99));
+        seq_puts(s, " |");
+        for (b = 0; b < WIFI_LAT_BUCKETS; b++)
+            seq_printf(s, " %lu", hist[b]);
+        seq_putc(s, '\n');
+    }
+    return 0;
+}
+DEFINE_SHOW_ATTRIBUTE(wifi_lat);
+
+// ─────────────────────────────────────────
+// RESPONSIBILITY 8: Config management
+// (Should be a separate config module)
+// ─────────────────────────────────────────
+int wifi_core_set_tx_power(struct wifi_device *dev, u32 dbm)
+{
+    if (dbm > 30) {
+        pr_err("wifi_core: tx power %u dBm exceeds regulatory limit\n", dbm);
+        return -EINVAL;
+    }
+    dev->config.tx_power_dbm = dbm;
+    return mac_set_tx_power(dev->mac_ctx, dbm);  // mac coupling
+}
+
+int wifi_core_set_rts_threshold(struct wifi_device *dev, u32 thresh)
+{
+    dev->config.rts_threshold = thresh;
+    return 0;
+}
+
+// 0 disables fragmentation; otherwise 256..2346 as in 802.11
+int wifi_core_set_frag_threshold(struct wifi_device *dev, u32 thresh)
+{
+    if (thresh && (thresh < 256 || thresh > 2346)) {
+        pr_err("wifi_core: frag threshold %u out of range\n", thresh);
+        return -EINVAL;
+    }
+    dev->config.frag_threshold = thresh;
+    return 0;
+}
+
+// ─────────────────────────────────────────
+// RESPONSIBILITY 9: Firmware management
+// (Definitely should be its own module!)
+// ─────────────────────────────────────────
+// The image is requested asynchronously and downloaded to the chip from
+// wifi_fw_loaded(). It stays cached in dev->fw, so a warm reset reprograms
+// the chip without going back to the filesystem, and config, keys and the
+// BSS table survive because the device itself is never reallocated.
+static int wifi_fw_download(struct wifi_device *dev)
+{
+    // Would push dev->fw->data to the chip and wait for its ready event
+    pr_info("wifi_core: downloaded firmware %s (%zu bytes)\n",
+            dev->fw_path, dev->fw->size);
+    return 0;
+}
+
+// dev->fw is swapped under fw_lock, which wifi_fw_show() and
+// wifi_core_fw_reset() hold while using it. Nobody may wait for fw_ready
+// with fw_lock held.
+static void wifi_fw_loaded(const struct firmware *fw, void *context)
+{
+    struct wifi_device *dev = context;
+
+    mutex_lock(&dev->fw_lock);
+    if (!fw) {
+        pr_err("wifi_core: firmware %s not available\n", dev->fw_path);
+        dev->fw_status = -ENOENT;
+        goto out;
+    }
+
+    release_firmware(dev->fw);
+    dev->fw = fw;
+    dev->fw_status = wifi_fw_download(dev);
+out:
+    mutex_unlock(&dev->fw_lock);
+    complete_all(&dev->fw_ready);
+}
+
+int wifi_core_fw_load(struct wifi_device *dev, const char *fw_path)
+{
+    int ret;
+
+    if (!dev->netdev)
+        return -ENODEV;
+
+    mutex_lock(&dev->fw_lock);
+    if (!completion_done(&dev->fw_ready)) {
+        ret = -EBUSY;
+        goto out;
+    }
+
+    strscpy(dev->fw_path, fw_path, sizeof(dev->fw_path));
+    reinit_completion(&dev->fw_ready);
+    ret = request_firmware_nowait(THIS_MODULE, FW_ACTION_UEVENT, dev->fw_path,
+                                  &dev->netdev->dev, GFP_KERNEL, dev,
+                                  wifi_fw_loaded);
+    if (ret)
+        complete_all(&dev->fw_ready);
+    else
+        pr_info("wifi_core: loading firmware from %s\n", fw_path);
+out:
+    mutex_unlock(&dev->fw_lock);
+    return ret;
+}
+
+// Waits for an async load started by wifi_core_fw_load() and returns its result
+int wifi_core_fw_wait(struct wifi_device *dev, unsigned long timeout)
+{
+    if (!wait_for_completion_timeout(&dev->fw_ready, timeout))
+        return -ETIMEDOUT;
+    return dev->fw_status;
+}
+
+// Stops everything that talks to the chip. Queued frames are kept. The
+// data path stop nests with the one wifi_core_connect() takes on fallback.
+static void wifi_fw_quiesce(struct wifi_device *dev)
+{
+    wifi_datapath_stop(dev);
+    // Half-reassembled MSDUs can't be completed across a reset
+    wifi_defrag_flush(dev);
+}
+
+static void wifi_fw_resume(struct wifi_device *dev)
+{
+    wifi_datapath_start(dev);
+}
+
+// Reprograms the chip with the state snapshotted before the reset. The
+// pairwise keys still live in sec_ctx, so reassociating to the same AP
+// skips authentication; only if that fails do we fall back to a full
+// connect (which a cached PMKSA still shortens).
+static void wifi_fw_restore(struct wifi_device *dev,
+                            const struct wifi_config *config,
+                            enum wifi_state state)
+{
+    int ret;
+
+    dev->config = *config;
+    mac_set_tx_power(dev->mac_ctx, config->tx_power_dbm);
+
+    switch (state) {
+    case WIFI_STATE_CONNECTED:
+    case WIFI_STATE_ROAMING:
+        // A roam scan in flight died with the firmware: stay where we were
+        ret = mac_associate(dev->mac_ctx, &dev->cur_bss);
+        if (!ret) {
+            dev->state = WIFI_STATE_CONNECTED;
+            break;
+        }
+        pr_warn("wifi_core: reassoc to %pM after reset failed %d\n",
+                dev->cur_bss.bssid, ret);
+        if (!wifi_core_connect(dev, &dev->cur_bss))
+            break;
+        wifi_core_disconnect(dev);
+        break;
+    case WIFI_STATE_SCANNING:
+        cfg80211_notify_scan_done(dev->netdev);
+        fallthrough;
+    default:
+        // Auth/assoc in progress are lost; userspace retries the connect
+        dev->state = WIFI_STATE_DISCONNECTED;
+        break;
+    }
+}
+
+int wifi_core_fw_reset(struct wifi_device *dev)
+{
+    struct wifi_config config;
+    enum wifi_state state;
+    ktime_t start;
+    u64 ns;
+    int ret;
+
+    wait_for_completion(&dev->fw_ready);
+    mutex_lock(&dev->fw_lock);
+    // A new load slipped in between
+    if (!completion_done(&dev->fw_ready)) {
+        ret = -EBUSY;
+        goto out;
+    }
+    if (!dev->fw) {
+        pr_err("wifi_core: no firmware image to reset with\n");
+        ret = -ENOENT;
+        goto out;
+    }
+
+    pr_info("wifi_core: resetting firmware\n");
+    start = ktime_get();
+
+    wifi_fw_quiesce(dev);
+    config = dev->config;
+    state = dev->state;
+
+    ret = wifi_fw_download(dev);
+    if (ret) {
+        pr_err("wifi_core: firmware download failed %d\n", ret);
+        dev->state = WIFI_STATE_DISCONNECTED;
+    } else {
+        wifi_fw_restore(dev, &config, state);
+    }
+    wifi_fw_resume(dev);
+
+    ns = ktime_to_ns(ktime_sub(ktime_get(), start));
+    dev->fw_resets++;
+    dev->fw_recover_ns_last = ns;
+    dev->fw_recover_ns_max = max(dev->fw_recover_ns_max, ns);
+    pr_info("wifi_core: firmware reset done in %llu us\n",
+            div_u64(ns, NSEC_PER_USEC));
+out:
+    mutex_unlock(&dev->fw_lock);
+    return ret;
+}
+
+static int wifi_fw_show(struct seq_file *s, void *unused)
+{
+    struct wifi_device *dev = s->private;
+
+    mutex_lock(&dev->fw_lock);
+    seq_printf(s, "image %s (%zu bytes)\n", dev->fw ? dev->fw_path : "none",
+               dev->fw ? dev->fw->size : 0);
+    seq_printf(s, "resets %u recover_us last %llu max %llu\n", dev->fw_resets,
+               div_u64(dev->fw_recover_ns_last, NSEC_PER_USEC),
+               div_u64(dev->fw_recover_ns_max, NSEC_PER_USEC));
+    mutex_unlock(&dev->fw_lock);
+    return 0;
+}
+DEFINE_SHOW_ATTRIBUTE(wifi_fw);
+
+// Fault injection: "echo N > fw_reset" runs N back-to-back warm resets,
+// e.g. while iperf is running, to exercise recovery under traffic.
+static int wifi_fw_reset_set(void *data, u64 val)
+{
+    struct wifi_device *dev = data;
+    int ret = 0;
+
+    while (val-- && !ret)
+        ret = wifi_core_fw_reset(dev);
+    return ret;
+}
+DEFINE_DEBUGFS_ATTRIBUTE(wifi_fw_reset_fops, NULL, wifi_fw_reset_set, "%llu\n");
 
 // ─────────────────────────────────────────
 // RESPONSIBILITY 10: Roaming
 // (Complex enough to be its own module)
 // ─────────────────────────────────────────
-#define ROAM_RSSI_THRESHOLD  -75  /* dBm */
+// Roams only to APs of the current ESS already in the BSS table: their
+// channels get a partial scan while we stay associated, and the best fresh
+// result that beats us by ROAM_RSSI_HYSTERESIS is joined, reusing its PMKSA
+// if one is cached.
+#define ROAM_RSSI_THRESHOLD     -75         /* dBm */
+#define ROAM_RSSI_HYSTERESIS    8           /* dB a candidate must beat us by */
+#define ROAM_PMKSA_BONUS        5           /* dB credit for skipping SAE/EAP */
+#define ROAM_MIN_INTERVAL       (5 * HZ)    /* Between roam attempts */
+
+static bool wifi_roam_is_candidate(struct wifi_device *dev,
+                                   const struct wifi_bss_info *info)
+{
+    return info->ssid_len == dev->cur_bss.ssid_len &&
+           !memcmp(info->ssid, dev->cur_bss.ssid, info->ssid_len) &&
+           !ether_addr_equal(info->bssid, dev->cur_bss.bssid);
+}
+
+// Channels of known candidates that were stronger than us when last seen
+static int wifi_roam_pick_channels(struct wifi_device *dev, u32 *channels)
+{
+    struct wifi_bss_entry *entry;
+    int n = 0, i;
+
+    rcu_read_lock();
+    list_for_each_entry_rcu(entry, &dev->bss_list, node) {
+        u32 ch = entry->info.channel;
+
+        if (!wifi_roam_is_candidate(dev, &entry->info) ||
+            READ_ONCE(entry->info.rssi) <= dev->roam.trigger_rssi)
+            continue;
+        for (i = 0; i < n && channels[i] != ch; i++)
+            ;
+        if (i == n)
+            channels[n++] = ch;
+        if (n == WIFI_ROAM_MAX_CHANNELS)
+            break;
+    }
+    rcu_read_unlock();
+    return n;
+}
+
+// Best candidate refreshed by this roam's scan that clears the hysteresis
+static int wifi_roam_pick_target(struct wifi_device *dev, struct wifi_bss_info *out)
+{
+    struct wifi_bss_entry *entry, *best = NULL;
+    int best_score = INT_MIN;
+    int ret = -ENOENT;
+
+    rcu_read_lock();
+    list_for_each_entry_rcu(entry, &dev->bss_list, node) {
+        int score;
+
+        if (!wifi_roam_is_candidate(dev, &entry->info) ||
+            time_before(READ_ONCE(entry->last_seen), dev->roam.last_attempt) ||
+            READ_ONCE(entry->info.rssi) < dev->roam.trigger_rssi + ROAM_RSSI_HYSTERESIS)
+            continue;
+
+        score = wifi_bss_score(&entry->info);
+        if (wpa_pmksa_has(dev->sec_ctx, entry->info.bssid))
+            score += ROAM_PMKSA_BONUS;
+        if (score > best_score) {
+            best = entry;
+            best_score = score;
+        }
+    }
+    if (best) {
+        memcpy(out, &best->info, sizeof(*out));
+        ret = 0;
+    }
+    rcu_read_unlock();
+    return ret;
+}
+
+static void wifi_roam_account(struct wifi_device *dev)
+{
+    struct wifi_roam *r = &dev->roam;
+    u64 total = ktime_to_ns(ktime_sub(r->t_assoc_done, r->t_trigger));
+
+    r->roams++;
+    wifi_lat_record(dev, WIFI_LAT_ROAM, total);
+
+    pr_info("wifi_core: roamed to %pM in %llu us (scan %lld, auth %lld, assoc %lld us)\n",
+            dev->cur_bss.bssid, div_u64(total, NSEC_PER_USEC),
+            ktime_us_delta(r->t_scan_done, r->t_trigger),
+            ktime_us_delta(r->t_auth_done, r->t_scan_done),
+            ktime_us_delta(r->t_assoc_done, r->t_auth_done));
+}
+
+static void wifi_roam_scan_done(struct wifi_device *dev)
+{
+    struct wifi_bss_info target, prev;
+    int ret;
+
+    dev->roam.t_scan_done = ktime_get();
+
+    if (wifi_roam_pick_target(dev, &target)) {
+        pr_info("wifi_core: no AP beats %d dBm by %d dB, staying on %pM\n",
+                dev->roam.trigger_rssi, ROAM_RSSI_HYSTERESIS, dev->cur_bss.bssid);
+        dev->state = WIFI_STATE_CONNECTED;
+        return;
+    }
+
+    memcpy(&prev, &dev->cur_bss, sizeof(prev));
+    ret = wifi_core_connect(dev, &target);
+    if (ret) {
+        dev->roam.failures++;
+        pr_warn("wifi_core: roam to %pM failed %d, returning to %pM\n",
+                target.bssid, ret, prev.bssid);
+        // Left DISCONNECTED by the failed connect; tell cfg80211 so
+        if (wifi_core_connect(dev, &prev)) {
+            pr_err("wifi_core: can't rejoin %pM, disconnecting\n", prev.bssid);
+            wifi_core_disconnect(dev);
+        }
+        return;
+    }
+    wifi_roam_account(dev);
+}
 
 void wifi_core_check_roaming(struct wifi_device *dev, s32 current_rssi)
 {
+    u32 channels[WIFI_ROAM_MAX_CHANNELS];
+    int n;
+
     if (dev->state != WIFI_STATE_CONNECTED)
         return;
 
-    if (current_rssi < ROAM_RSSI_THRESHOLD) {
-        pr_info("wifi_core: RSSI %d dBm below threshold, triggering roam scan\n",
-                current_rssi);
-        dev->state = WIFI_STATE_ROAMING;
-        wifi_core_scan_start(dev);  // self-call creating complexity
+    if (current_rssi >= ROAM_RSSI_THRESHOLD)
+        return;
+
+    // Rate limit so a flapping RSSI doesn't keep us scanning
+    if (dev->roam.attempts &&
+        time_before(jiffies, dev->roam.last_attempt + ROAM_MIN_INTERVAL))
+        return;
+
+    dev->roam.attempts++;
+    dev->roam.last_attempt = jiffies;
+    dev->roam.trigger_rssi = current_rssi;
+    dev->roam.t_trigger = ktime_get();
+
+    // No known candidate: fall back to scanning every channel, still connected
+    n = wifi_roam_pick_channels(dev, channels);
+    pr_info("wifi_core: RSSI %d dBm below threshold, roam scan on %s\n",
+            current_rssi, n ? "candidate channels" : "all channels");
+
+    dev->state = WIFI_STATE_ROAMING;
+    if (__wifi_core_scan(dev, channels, n, true))
+        dev->state = WIFI_STATE_CONNECTED;
+}
+
+// Cached PMKs were derived from the old credentials; a roam must not
+// reuse them after the passphrase or certificate changed
+void wifi_core_flush_pmksa(struct wifi_device *dev)
+{
+    wpa_pmksa_flush(dev->sec_ctx);
+    pr_info("wifi_core: PMKSA cache flushed\n");
+}
+
+static int wifi_roam_show(struct seq_file *s, void *unused)
+{
+    struct wifi_device *dev = s->private;
+    struct wifi_roam *r = &dev->roam;
+
+    seq_printf(s, "attempts %u roams %u failures %u\n",
+               r->attempts, r->roams, r->failures);
+    if (!r->roams)
+        return 0;
+    // Distribution of the total is in "latency"
+    seq_printf(s, "last_us total %lld scan %lld auth %lld assoc %lld\n",
+               ktime_us_delta(r->t_assoc_done, r->t_trigger),
+               ktime_us_delta(r->t_scan_done, r->t_trigger),
+               ktime_us_delta(r->t_auth_done, r->t_scan_done),
+               ktime_us_delta(r->t_assoc_done, r->t_auth_done));
+    return 0;
+}
+DEFINE_SHOW_ATTRIBUTE(wifi_roam);
+
+// ─────────────────────────────────────────
+// RESPONSIBILITY 11: Fragmentation / reassembly
+// (Belongs in the MAC layer, not here)
+// ─────────────────────────────────────────
+// TX splits with skb_split(): payload page frags are handed over by
+// reference, only linear bytes past the split point are copied. RX chains
+// fragments onto the first one's frag_list instead of linearizing.
+#define WIFI_MAX_FRAGS          16      // 4-bit fragment number
+#define WIFI_FRAG_HEADROOM      64      // 802.11 + security header room
+#define WIFI_DEFRAG_TIMEOUT     (2 * HZ)
+#define WIFI_DEFRAG_MAX_MEM     (256 * 1024)
+
+static int wifi_tx_fragment(struct wifi_device *dev, struct sk_buff *skb,
+                            struct sk_buff_head *frags)
+{
+    u32 thresh = dev->config.frag_threshold;
+    struct wifi_skb_cb *cb = WIFI_SKB_CB(skb);
+    enum wifi_drop_reason reason = WIFI_DROP_FRAG;
+    struct sk_buff *rest;
+    u16 seq = dev->tx_seq++ & 0xfff;
+    u64 tstamp = cb->tstamp;
+    u8 frag = 0;
+
+    memset(cb, 0, sizeof(*cb));
+    cb->tstamp = tstamp;
+    cb->seq = seq;
+    cb->tid = skb->priority & 7;
+    // A3 of a ToDS frame is the DA, the first field of the Ethernet header
+    memcpy(cb->a3, skb->data, ETH_ALEN);
+
+    if (!thresh || skb->len <= thresh) {
+        cb->len = skb->len;
+        __skb_queue_tail(frags, skb);
+        return 0;
+    }
+
+    if (DIV_ROUND_UP(skb->len, thresh) > WIFI_MAX_FRAGS) {
+        pr_warn_ratelimited("wifi_core: TX frame len=%u needs too many fragments\n",
+                            skb->len);
+        goto drop;
+    }
+
+    // skb_split() rewrites shinfo, which a clone (e.g. TCP's) would share
+    if (skb_unclone(skb, GFP_ATOMIC)) {
+        reason = WIFI_DROP_OOM;
+        goto drop;
+    }
+
+    while (skb->len > thresh) {
+        int copy = max_t(int, skb_headlen(skb) - thresh, 0);
+
+        rest = alloc_skb(WIFI_FRAG_HEADROOM + copy, GFP_ATOMIC);
+        if (!rest) {
+            reason = WIFI_DROP_OOM;
+            goto drop;
+        }
+        skb_reserve(rest, WIFI_FRAG_HEADROOM);
+        skb_split(skb, rest, thresh);
+
+        rest->dev = skb->dev;
+        rest->priority = skb->priority;
+        skb_set_queue_mapping(rest, skb_get_queue_mapping(skb));
+        WIFI_SKB_CB(rest)->seq = seq;
+        memcpy(WIFI_SKB_CB(rest)->a3, WIFI_SKB_CB(skb)->a3, ETH_ALEN);
+        WIFI_SKB_CB(rest)->tid = WIFI_SKB_CB(skb)->tid;
+        WIFI_SKB_CB(rest)->frag = ++frag;
+        WIFI_SKB_CB(rest)->tstamp = tstamp;
+
+        WIFI_SKB_CB(skb)->more_frags = true;
+        WIFI_SKB_CB(skb)->len = skb->len;
+        __skb_queue_tail(frags, skb);
+        skb = rest;
+    }
+    WIFI_SKB_CB(skb)->more_frags = false;
+    WIFI_SKB_CB(skb)->len = skb->len;
+    __skb_queue_tail(frags, skb);
+    return 0;
+
+drop:
+    __skb_queue_purge(frags);
+    dev_kfree_skb(skb);
+    wifi_core_count_drop(dev, reason, true, 1);
+    return -ENOMEM;
+}
+
+static void wifi_defrag_init(struct wifi_device *dev)
+{
+    int i;
+
+    spin_lock_init(&dev->defrag_lock);
+    for (i = 0; i < WIFI_DEFRAG_ENTRIES; i++)
+        __skb_queue_head_init(&dev->defrag[i].frags);
+}
+
+// Caller holds defrag_lock and frees @purge after dropping it
+static void wifi_defrag_reset(struct wifi_device *dev, struct wifi_defrag_entry *entry,
+                              struct sk_buff_head *purge)
+{
+    u32 n = skb_queue_len(&entry->frags);
+
+    if (!n)
+        return;
+    skb_queue_splice_tail_init(&entry->frags, purge);
+    dev->defrag_mem -= entry->truesize;
+    entry->truesize = 0;
+    wifi_core_count_drop(dev, WIFI_DROP_FRAG, false, n);
+}
+
+static void wifi_defrag_flush(struct wifi_device *dev)
+{
+    struct sk_buff_head purge;
+    unsigned long flags;
+    int i;
+
+    __skb_queue_head_init(&purge);
+    spin_lock_irqsave(&dev->defrag_lock, flags);
+    for (i = 0; i < WIFI_DEFRAG_ENTRIES; i++)
+        wifi_defrag_reset(dev, &dev->defrag[i], &purge);
+    spin_unlock_irqrestore(&dev->defrag_lock, flags);
+    __skb_queue_purge(&purge);
+}
+
+// Caller holds defrag_lock
+static struct wifi_defrag_entry *wifi_defrag_find(struct wifi_device *dev,
+                                                  const struct wifi_skb_cb *cb,
+                                                  struct sk_buff_head *purge)
+{
+    struct wifi_defrag_entry *entry;
+    int i;
+
+    for (i = 0; i < WIFI_DEFRAG_ENTRIES; i++) {
+        entry = &dev->defrag[i];
+        if (skb_queue_empty(&entry->frags))
+            continue;
+        if (time_after(jiffies, entry->first_seen + WIFI_DEFRAG_TIMEOUT)) {
+            wifi_defrag_reset(dev, entry, purge);
+            continue;
+        }
+        if (entry->seq == cb->seq && entry->tid == cb->tid &&
+            ether_addr_equal(entry->addr, cb->addr))
+            return entry;
+    }
+    return NULL;
+}
+
+// Hangs every remaining fragment off @head's frag_list (no payload copy)
+static void wifi_defrag_chain(struct sk_buff *head, struct sk_buff_head *frags)
+{
+    struct sk_buff **tail = &skb_shinfo(head)->frag_list;
+    struct sk_buff *skb;
+
+    while (*tail)
+        tail = &(*tail)->next;
+
+    while ((skb = __skb_dequeue(frags))) {
+        *tail = skb;
+        tail = &skb->next;
+        head->len += skb->len;
+        head->data_len += skb->len;
+        head->truesize += skb->truesize;
+    }
+    *tail = NULL;
+    WIFI_SKB_CB(head)->more_frags = false;
+}
+
+// Returns the frame to deliver, or NULL if @skb was held or dropped.
+static struct sk_buff *wifi_rx_defrag(struct wifi_device *dev, struct sk_buff *skb)
+{
+    struct wifi_skb_cb *cb = WIFI_SKB_CB(skb);
+    struct wifi_defrag_entry *entry;
+    struct sk_buff *head = NULL;
+    struct sk_buff_head purge;
+    unsigned long flags;
+
+    if (!cb->frag && !cb->more_frags)
+        return skb;
+
+    __skb_queue_head_init(&purge);
+    spin_lock_irqsave(&dev->defrag_lock, flags);
+
+    entry = wifi_defrag_find(dev, cb, &purge);
+    if (cb->frag == 0) {
+        // First fragment: restart a retransmitted one or take the next slot
+        if (!entry) {
+            entry = &dev->defrag[dev->defrag_next];
+            dev->defrag_next = (dev->defrag_next + 1) % WIFI_DEFRAG_ENTRIES;
+        }
+        wifi_defrag_reset(dev, entry, &purge);
+        memcpy(entry->addr, cb->addr, sizeof(entry->addr));
+        entry->seq = cb->seq;
+        entry->tid = cb->tid;
+        entry->first_seen = jiffies;
+    } else if (!entry || cb->frag != entry->last_frag + 1 ||
+               cb->pn != (entry->last_pn ? entry->last_pn + 1 : 0)) {
+        // Out of order, no matching first fragment, or not the next PN
+        // (fragments from another key or mixed with plaintext ones, see
+        // CVE-2020-24587/26147): drop it and wait for a new first fragment
+        __skb_queue_tail(&purge, skb);
+        wifi_core_count_drop(dev, WIFI_DROP_FRAG, false, 1);
+        goto out;
     }
+
+    if (dev->defrag_mem + skb->truesize > WIFI_DEFRAG_MAX_MEM) {
+        wifi_defrag_reset(dev, entry, &purge);
+        __skb_queue_tail(&purge, skb);
+        wifi_core_count_drop(dev, WIFI_DROP_FRAG, false, 1);
+        goto out;
+    }
+
+    entry->last_frag = cb->frag;
+    entry->last_pn = cb->pn;
+    entry->truesize += skb->truesize;
+    dev->defrag_mem += skb->truesize;
+    __skb_queue_tail(&entry->frags, skb);
+
+    if (!cb->more_frags) {
+        // Last fragment: the frame is complete
+        head = __skb_dequeue(&entry->frags);
+        wifi_defrag_chain(head, &entry->frags);
+        dev->defrag_mem -= entry->truesize;
+        entry->truesize = 0;
+    }
+
+out:
+    spin_unlock_irqrestore(&dev->defrag_lock, flags);
+    __skb_queue_purge(&purge);
+    return head;
 }
+
+#if IS_ENABLED(CONFIG_WIFI_CORE_KUNIT_TEST)
+#include "wifi_core_test.c"
+#endif
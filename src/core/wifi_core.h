@@ -0,0 +1,66 @@
+#ifndef WIFI_CORE_H
+#define WIFI_CORE_H
+
+// wifi_core public interface, used by the cfg80211 glue and the MAC
+#include "../../include/wifi_types.h"
+
+struct wifi_device;
+struct net_device;
+struct sk_buff;
+
+// Snapshot summed over all CPUs by wifi_core_get_stats()
+struct wifi_stats {
+    u64 tx_packets;
+    u64 rx_packets;
+    u64 tx_bytes;
+    u64 rx_bytes;
+    u64 tx_errors;
+    u64 rx_errors;
+    u64 tx_dropped;
+    u64 rx_dropped;
+    u64 tx_ac_packets[WIFI_NUM_ACS];
+    u64 rx_ac_packets[WIFI_NUM_ACS];
+    u64 drops[WIFI_NUM_DROP_REASONS];
+};
+
+// Lifecycle
+int  wifi_core_init(struct wifi_device **dev_out);
+void wifi_core_deinit(struct wifi_device *dev);
+int  wifi_core_attach_netdev(struct wifi_device *dev, struct net_device *netdev);
+
+// Data path
+int  wifi_core_tx(struct wifi_device *dev, struct sk_buff *skb);
+void wifi_core_rx(struct wifi_device *dev, struct sk_buff *skb);
+
+// BSS table and scanning
+int  wifi_core_set_bss_capacity(struct wifi_device *dev, u32 capacity);
+int  wifi_core_bss_lookup(struct wifi_device *dev, const u8 *bssid,
+                          struct wifi_bss_info *out);
+int  wifi_core_bss_get_channel(struct wifi_device *dev, u32 channel,
+                               struct wifi_bss_info *out, int max);
+int  wifi_core_bss_best(struct wifi_device *dev, struct wifi_bss_info *out);
+int  wifi_core_scan_start(struct wifi_device *dev);
+int  wifi_core_scan_channels(struct wifi_device *dev, const u32 *channels, int n);
+void wifi_core_scan_result(struct wifi_device *dev, struct wifi_bss_info *bss);
+void wifi_core_scan_done(struct wifi_device *dev);
+
+// Connection and power
+int  wifi_core_connect(struct wifi_device *dev, struct wifi_bss_info *target);
+void wifi_core_disconnect(struct wifi_device *dev);
+int  wifi_core_suspend(struct wifi_device *dev);
+int  wifi_core_resume(struct wifi_device *dev);
+void wifi_core_check_roaming(struct wifi_device *dev, s32 current_rssi);
+void wifi_core_flush_pmksa(struct wifi_device *dev);
+
+// Statistics and configuration
+void wifi_core_get_stats(struct wifi_device *dev, struct wifi_stats *out);
+int  wifi_core_set_tx_power(struct wifi_device *dev, u32 dbm);
+int  wifi_core_set_rts_threshold(struct wifi_device *dev, u32 thresh);
+int  wifi_core_set_frag_threshold(struct wifi_device *dev, u32 thresh);
+
+// Firmware
+int  wifi_core_fw_load(struct wifi_device *dev, const char *fw_path);
+int  wifi_core_fw_wait(struct wifi_device *dev, unsigned long timeout);
+int  wifi_core_fw_reset(struct wifi_device *dev);
+
+#endif /* WIFI_CORE_H */
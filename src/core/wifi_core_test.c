@@ -0,0 +1,1874 @@
+// wifi_core_test.c
+// KUnit tests for wifi_core: DRR TX scheduling, RX reassembly, the BSS
+// table, a TX benchmark against a stubbed MAC, NAPI/GRO against legacy RX,
+// the stats counters under contention, roaming against simulated APs, mixed
+// per-AC traffic, TX fragmentation and firmware resets under traffic.
+// Built into wifi_core.c (see the end of that file) so the static helpers
+// can be tested directly.
+//
+// Needs a kernel tree to build in, see Kbuild. The benchmarks print their
+// numbers with kunit_info().
+
+#include <kunit/test.h>
+#include <kunit/static_stub.h>
+#include <linux/wait_bit.h>
+#include <linux/kthread.h>
+#include <linux/sort.h>
+#include <linux/delay.h>
+#include <linux/ip.h>
+#include <linux/tcp.h>
+#include <linux/firmware.h>
+#include <net/sch_generic.h>
+
+// wifi_trace.h leaves CREATE_TRACE_POINTS defined; only use the kmem events
+#undef CREATE_TRACE_POINTS
+#include <trace/events/kmem.h>
+
+#define WIFI_TEST_FRAG_LEN      100
+#define WIFI_TEST_BENCH_PKTS    4096
+#define WIFI_TEST_BENCH_LEN     1500    // Ethernet payload
+#define WIFI_TEST_STATS_OPS     200000  // Per thread
+#define WIFI_TEST_DWELL_US      200     // Simulated per-channel scan dwell
+#define WIFI_TEST_ASSOC_US      500     // Simulated association exchange
+#define WIFI_TEST_ROAMS         100     // Per scan mode
+#define WIFI_TEST_MIX_PKTS      1024    // Per AC
+#define WIFI_TEST_FRAG_PKTS     2048    // Per threshold
+#define WIFI_TEST_BSS_ENTRIES   16384
+
+static const u8 wifi_test_own[ETH_ALEN] = { 0x02, 0x00, 0x00, 0x00, 0x00, 0x01 };
+static const u8 wifi_test_peer[ETH_ALEN] = { 0x02, 0x00, 0x00, 0x00, 0x00, 0x02 };
+
+// Every case gets a fresh device: no netdev, DISCONNECTED, empty tables
+static int wifi_test_init(struct kunit *test)
+{
+    struct wifi_device *dev;
+    int ret;
+
+    ret = wifi_core_init(&dev);
+    if (ret)
+        return ret;
+    test->priv = dev;
+    return 0;
+}
+
+static void wifi_test_exit(struct kunit *test)
+{
+    wifi_core_deinit(test->priv);
+}
+
+static u64 wifi_test_drops(struct wifi_device *dev, enum wifi_drop_reason reason)
+{
+    struct wifi_stats st;
+
+    wifi_core_get_stats(dev, &st);
+    return st.drops[reason];
+}
+
+// A WPA2 AP of ESS @ssid, BSSID wifi_test_peer with @id as the last byte
+static void wifi_test_bss(struct wifi_bss_info *bss, u8 id, u32 channel,
+                          const char *ssid)
+{
+    memset(bss, 0, sizeof(*bss));
+    ether_addr_copy(bss->bssid, wifi_test_peer);
+    bss->bssid[5] = id;
+    bss->ssid_len = strlen(ssid);
+    memcpy(bss->ssid, ssid, bss->ssid_len);
+    bss->rssi = -50;
+    bss->channel = channel;
+    bss->security = WIFI_SEC_WPA2;
+}
+
+// ─────────────────────────────────────────
+// DRR TX scheduling
+// ─────────────────────────────────────────
+// Queues @n frames of one quantum each on @ac
+static void wifi_test_fill_ac(struct kunit *test, struct wifi_device *dev,
+                              enum wifi_ac ac, int n)
+{
+    struct sk_buff *skb;
+
+    while (n--) {
+        skb = alloc_skb(WIFI_TX_QUANTUM, GFP_KERNEL);
+        KUNIT_ASSERT_NOT_NULL(test, skb);
+        skb_put(skb, WIFI_TX_QUANTUM);
+        skb_set_queue_mapping(skb, ac);
+        skb_queue_tail(&dev->tx_queue[ac], skb);
+    }
+}
+
+// With every AC backlogged, each round serves VO:VI:BE:BK in an 8:4:2:1
+// ratio, highest priority first, and a turn cut short by a full batch
+// resumes on the next call
+static void wifi_test_drr_weights(struct kunit *test)
+{
+    static const int share[WIFI_NUM_ACS] = { 8, 4, 2, 1 };
+    struct wifi_device *dev = test->priv;
+    u16 order[WIFI_TX_BATCH], expect[WIFI_TX_BATCH];
+    struct sk_buff_head batch;
+    struct sk_buff *skb;
+    int ac, i, n = 0;
+
+    for (ac = 0; ac < WIFI_NUM_ACS; ac++)
+        wifi_test_fill_ac(test, dev, ac, WIFI_TX_BATCH);
+
+    while (n < WIFI_TX_BATCH) {
+        for (ac = 0; ac < WIFI_NUM_ACS; ac++) {
+            for (i = 0; i < share[ac] && n < WIFI_TX_BATCH; i++)
+                expect[n++] = ac;
+        }
+    }
+
+    __skb_queue_head_init(&batch);
+    KUNIT_ASSERT_EQ(test, wifi_tx_schedule(dev, &batch), WIFI_TX_BATCH);
+    i = 0;
+    skb_queue_walk(&batch, skb)
+        order[i++] = skb_get_queue_mapping(skb);
+    KUNIT_EXPECT_MEMEQ(test, order, expect, sizeof(order));
+    __skb_queue_purge(&batch);
+
+    // The batch ended 4 frames into a VO turn: 4 more VO, then VI
+    KUNIT_ASSERT_EQ(test, wifi_tx_schedule(dev, &batch), WIFI_TX_BATCH);
+    i = 0;
+    skb_queue_walk(&batch, skb) {
+        if (i == 5)
+            break;
+        order[i++] = skb_get_queue_mapping(skb);
+    }
+    for (i = 0; i < 4; i++)
+        KUNIT_EXPECT_EQ(test, order[i], WIFI_AC_VO);
+    KUNIT_EXPECT_EQ(test, order[4], WIFI_AC_VI);
+    __skb_queue_purge(&batch);
+}
+
+// A lone backlogged AC gets the whole batch, and idle ACs bank no credit
+static void wifi_test_drr_idle(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    struct sk_buff_head batch;
+    struct sk_buff *skb;
+    int ac;
+
+    wifi_test_fill_ac(test, dev, WIFI_AC_BK, 10);
+
+    __skb_queue_head_init(&batch);
+    KUNIT_EXPECT_EQ(test, wifi_tx_schedule(dev, &batch), 10);
+    skb_queue_walk(&batch, skb)
+        KUNIT_EXPECT_EQ(test, skb_get_queue_mapping(skb), WIFI_AC_BK);
+    for (ac = 0; ac < WIFI_NUM_ACS; ac++)
+        KUNIT_EXPECT_EQ(test, dev->tx_deficit[ac], 0);
+    KUNIT_EXPECT_EQ(test, wifi_tx_schedule(dev, &batch), 0);
+    __skb_queue_purge(&batch);
+}
+
+// ─────────────────────────────────────────
+// RX reassembly
+// ─────────────────────────────────────────
+// A fragment from wifi_test_peer, payload bytes set to the fragment number
+static struct sk_buff *wifi_test_frag(struct kunit *test, u16 seq, u8 frag,
+                                      bool more, u64 pn)
+{
+    struct sk_buff *skb = alloc_skb(WIFI_TEST_FRAG_LEN, GFP_KERNEL);
+    struct wifi_skb_cb *cb;
+
+    KUNIT_ASSERT_NOT_NULL(test, skb);
+    memset(skb_put(skb, WIFI_TEST_FRAG_LEN), frag, WIFI_TEST_FRAG_LEN);
+    cb = WIFI_SKB_CB(skb);
+    memset(cb, 0, sizeof(*cb));
+    ether_addr_copy(cb->addr, wifi_test_peer);
+    cb->seq = seq;
+    cb->frag = frag;
+    cb->more_frags = more;
+    cb->pn = pn;
+    return skb;
+}
+
+static void wifi_test_defrag_in_order(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    struct sk_buff *skb, *head;
+    u8 byte;
+    int i;
+
+    // Unfragmented frames pass straight through
+    skb = wifi_test_frag(test, 0, 0, false, 5);
+    KUNIT_EXPECT_PTR_EQ(test, wifi_rx_defrag(dev, skb), skb);
+    kfree_skb(skb);
+
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 0, true, 10)));
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 1, true, 11)));
+    KUNIT_EXPECT_GT(test, dev->defrag_mem, 0U);
+    head = wifi_rx_defrag(dev, wifi_test_frag(test, 1, 2, false, 12));
+    KUNIT_ASSERT_NOT_NULL(test, head);
+
+    KUNIT_EXPECT_EQ(test, head->len, 3 * WIFI_TEST_FRAG_LEN);
+    KUNIT_EXPECT_TRUE(test, skb_has_frag_list(head));
+    KUNIT_EXPECT_FALSE(test, WIFI_SKB_CB(head)->more_frags);
+    for (i = 0; i < 3; i++) {
+        KUNIT_ASSERT_EQ(test, skb_copy_bits(head, (i + 1) * WIFI_TEST_FRAG_LEN - 1,
+                                            &byte, 1), 0);
+        KUNIT_EXPECT_EQ(test, byte, i);
+    }
+    KUNIT_EXPECT_EQ(test, dev->defrag_mem, 0U);
+    KUNIT_EXPECT_EQ(test, wifi_test_drops(dev, WIFI_DROP_FRAG), 0ULL);
+    kfree_skb(head);
+}
+
+// A skipped PN breaks the MSDU: that fragment and every later one is
+// dropped until a new first fragment
+static void wifi_test_defrag_pn_gap(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 0, true, 10)));
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 1, true, 12)));
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 2, false, 13)));
+    KUNIT_EXPECT_EQ(test, wifi_test_drops(dev, WIFI_DROP_FRAG), 2ULL);
+
+    wifi_defrag_flush(dev);
+    KUNIT_EXPECT_EQ(test, wifi_test_drops(dev, WIFI_DROP_FRAG), 3ULL);
+    KUNIT_EXPECT_EQ(test, dev->defrag_mem, 0U);
+}
+
+// Protected and plaintext fragments never end up in one MSDU; all-plaintext
+// ones (open network) still reassemble
+static void wifi_test_defrag_mixed(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    struct sk_buff *head;
+
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 0, true, 20)));
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 1, false, 0)));
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 2, 0, true, 0)));
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 2, 1, false, 1)));
+    KUNIT_EXPECT_EQ(test, wifi_test_drops(dev, WIFI_DROP_FRAG), 2ULL);
+
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 3, 0, true, 0)));
+    head = wifi_rx_defrag(dev, wifi_test_frag(test, 3, 1, false, 0));
+    KUNIT_ASSERT_NOT_NULL(test, head);
+    KUNIT_EXPECT_EQ(test, head->len, 2 * WIFI_TEST_FRAG_LEN);
+    kfree_skb(head);
+}
+
+// A flush (rekey, disconnect, reset) drops held fragments, and what
+// follows them no longer has a first fragment to join
+static void wifi_test_defrag_flush(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 0, true, 10)));
+    wifi_defrag_flush(dev);
+    KUNIT_EXPECT_EQ(test, dev->defrag_mem, 0U);
+    KUNIT_EXPECT_EQ(test, wifi_test_drops(dev, WIFI_DROP_FRAG), 1ULL);
+
+    KUNIT_EXPECT_NULL(test, wifi_rx_defrag(dev, wifi_test_frag(test, 1, 1, false, 11)));
+    KUNIT_EXPECT_EQ(test, wifi_test_drops(dev, WIFI_DROP_FRAG), 2ULL);
+}
+
+// ─────────────────────────────────────────
+// BSS table
+// ─────────────────────────────────────────
+static struct wifi_bss_entry *wifi_test_bss_entry(struct wifi_device *dev, const u8 *bssid)
+{
+    struct wifi_bss_entry *entry;
+
+    // Only compared, never dereferenced, after the unlock
+    rcu_read_lock();
+    entry = wifi_bss_lookup(dev, bssid);
+    rcu_read_unlock();
+    return entry;
+}
+
+static void wifi_test_bss_lookup(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    struct wifi_bss_info bss, out;
+
+    wifi_test_bss(&bss, 1, 6, "demo");
+    wifi_core_scan_result(dev, &bss);
+    KUNIT_EXPECT_EQ(test, dev->bss_count, 1U);
+
+    KUNIT_ASSERT_EQ(test, wifi_core_bss_lookup(dev, bss.bssid, &out), 0);
+    KUNIT_EXPECT_MEMEQ(test, &out, &bss, sizeof(out));
+    KUNIT_EXPECT_EQ(test, wifi_core_bss_get_channel(dev, 6, &out, 1), 1);
+    KUNIT_EXPECT_EQ(test, wifi_core_bss_get_channel(dev, 11, &out, 1), 0);
+
+    bss.bssid[5] = 2;
+    KUNIT_EXPECT_EQ(test, wifi_core_bss_lookup(dev, bss.bssid, &out), -ENOENT);
+}
+
+// An RSSI-only update refreshes the entry in place; a channel or SSID
+// change publishes a new one, moved to its new channel bucket
+static void wifi_test_bss_refresh(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    struct wifi_bss_entry *prev, *entry;
+    struct wifi_bss_info bss, out;
+
+    wifi_test_bss(&bss, 1, 6, "demo");
+    wifi_core_scan_result(dev, &bss);
+    prev = wifi_test_bss_entry(dev, bss.bssid);
+    KUNIT_ASSERT_NOT_NULL(test, prev);
+
+    bss.rssi = -70;
+    wifi_core_scan_result(dev, &bss);
+    KUNIT_EXPECT_PTR_EQ(test, wifi_test_bss_entry(dev, bss.bssid), prev);
+    KUNIT_ASSERT_EQ(test, wifi_core_bss_lookup(dev, bss.bssid, &out), 0);
+    KUNIT_EXPECT_EQ(test, out.rssi, -70);
+
+    bss.channel = 11;
+    wifi_core_scan_result(dev, &bss);
+    entry = wifi_test_bss_entry(dev, bss.bssid);
+    KUNIT_EXPECT_PTR_NE(test, entry, prev);
+    KUNIT_EXPECT_EQ(test, wifi_core_bss_get_channel(dev, 6, &out, 1), 0);
+    KUNIT_EXPECT_EQ(test, wifi_core_bss_get_channel(dev, 11, &out, 1), 1);
+
+    prev = entry;
+    wifi_test_bss(&bss, 1, 11, "other");
+    wifi_core_scan_result(dev, &bss);
+    KUNIT_EXPECT_PTR_NE(test, wifi_test_bss_entry(dev, bss.bssid), prev);
+    KUNIT_ASSERT_EQ(test, wifi_core_bss_lookup(dev, bss.bssid, &out), 0);
+    KUNIT_EXPECT_EQ(test, out.ssid_len, 5);
+    KUNIT_EXPECT_EQ(test, dev->bss_count, 1U);
+}
+
+// At capacity the least recently seen entry goes; shrinking evicts from
+// the same end
+static void wifi_test_bss_capacity(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    struct wifi_bss_info bss, out;
+    u8 id;
+
+    KUNIT_EXPECT_EQ(test, wifi_core_set_bss_capacity(dev, 0), -EINVAL);
+    KUNIT_ASSERT_EQ(test, wifi_core_set_bss_capacity(dev, 4), 0);
+    for (id = 1; id <= 4; id++) {
+        wifi_test_bss(&bss, id, 6, "demo");
+        wifi_core_scan_result(dev, &bss);
+    }
+
+    // Seeing 1 again makes 2 the oldest
+    wifi_test_bss(&bss, 1, 6, "demo");
+    wifi_core_scan_result(dev, &bss);
+    wifi_test_bss(&bss, 5, 6, "demo");
+    wifi_core_scan_result(dev, &bss);
+    KUNIT_EXPECT_EQ(test, dev->bss_count, 4U);
+    bss.bssid[5] = 2;
+    KUNIT_EXPECT_EQ(test, wifi_core_bss_lookup(dev, bss.bssid, &out), -ENOENT);
+    bss.bssid[5] = 1;
+    KUNIT_EXPECT_EQ(test, wifi_core_bss_lookup(dev, bss.bssid, &out), 0);
+
+    KUNIT_ASSERT_EQ(test, wifi_core_set_bss_capacity(dev, 2), 0);
+    KUNIT_EXPECT_EQ(test, dev->bss_count, 2U);
+    for (id = 1; id <= 5; id++) {
+        bss.bssid[5] = id;
+        KUNIT_EXPECT_EQ(test, wifi_core_bss_lookup(dev, bss.bssid, &out),
+                        id == 1 || id == 5 ? 0 : -ENOENT);
+    }
+}
+
+// Many APs in range (a stadium, a scan log replay): insert, refresh and
+// lookup cost per entry, and how long the rhashtable's bucket chains get
+// once it has grown from the bss_capacity hint to hold them all
+static void wifi_test_bss_chains(struct wifi_device *dev, unsigned int *size,
+                                 unsigned int *used, unsigned int *longest)
+{
+    struct bucket_table *tbl;
+    struct rhash_head *pos;
+    unsigned int i, len;
+
+    *used = 0;
+    *longest = 0;
+    rcu_read_lock();
+    tbl = rht_dereference_rcu(dev->bss_hash.tbl, &dev->bss_hash);
+    *size = tbl->size;
+    for (i = 0; i < tbl->size; i++) {
+        len = 0;
+        rht_for_each_rcu(pos, tbl, i)
+            len++;
+        *used += len > 0;
+        *longest = max(*longest, len);
+    }
+    rcu_read_unlock();
+}
+
+static void wifi_test_bench_bss(struct kunit *test)
+{
+    const u32 n = WIFI_TEST_BSS_ENTRIES;
+    struct wifi_device *dev = test->priv;
+    unsigned int size, used, longest;
+    struct wifi_bss_info bss, out;
+    u64 start, insert_ns, refresh_ns, hit_ns, miss_ns;
+    int misses = 0, hits = 0;
+    u32 i;
+
+    KUNIT_ASSERT_EQ(test, wifi_core_set_bss_capacity(dev, n), 0);
+    wifi_test_bss(&bss, 0, 1, "bench");
+
+    start = ktime_get_ns();
+    for (i = 0; i < n; i++) {
+        bss.bssid[3] = i >> 16;
+        bss.bssid[4] = i >> 8;
+        bss.bssid[5] = i;
+        bss.channel = 1 + i % 165;
+        wifi_core_scan_result(dev, &bss);
+    }
+    insert_ns = ktime_get_ns() - start;
+    KUNIT_EXPECT_EQ(test, dev->bss_count, n);
+
+    // RSSI-only updates, the common case on every scan
+    bss.rssi = -60;
+    start = ktime_get_ns();
+    for (i = 0; i < n; i++) {
+        bss.bssid[3] = i >> 16;
+        bss.bssid[4] = i >> 8;
+        bss.bssid[5] = i;
+        bss.channel = 1 + i % 165;
+        wifi_core_scan_result(dev, &bss);
+    }
+    refresh_ns = ktime_get_ns() - start;
+
+    // Growing runs from the rhashtable worker; measure the grown table
+    while (flush_work(&dev->bss_hash.run_work))
+        ;
+
+    start = ktime_get_ns();
+    for (i = 0; i < n; i++) {
+        bss.bssid[3] = i >> 16;
+        bss.bssid[4] = i >> 8;
+        bss.bssid[5] = i;
+        hits += !wifi_core_bss_lookup(dev, bss.bssid, &out);
+    }
+    hit_ns = ktime_get_ns() - start;
+
+    start = ktime_get_ns();
+    for (i = n; i < 2 * n; i++) {
+        bss.bssid[3] = i >> 16;
+        bss.bssid[4] = i >> 8;
+        bss.bssid[5] = i;
+        misses += wifi_core_bss_lookup(dev, bss.bssid, &out) == -ENOENT;
+    }
+    miss_ns = ktime_get_ns() - start;
+
+    KUNIT_EXPECT_EQ(test, hits, (int)n);
+    KUNIT_EXPECT_EQ(test, misses, (int)n);
+
+    wifi_test_bss_chains(dev, &size, &used, &longest);
+    // rhashtable rehashes long before chains get this long
+    KUNIT_EXPECT_LE(test, longest, 16U);
+    KUNIT_EXPECT_GE(test, size, n);
+
+    kunit_info(test, "%u entries: insert %llu refresh %llu lookup %llu miss %llu ns/op\n",
+               n, div_u64(insert_ns, n), div_u64(refresh_ns, n),
+               div_u64(hit_ns, n), div_u64(miss_ns, n));
+    kunit_info(test, "%u buckets, %u in use, chains: longest %u, mean %u.%02u\n",
+               size, used, longest, used ? n / used : 0,
+               used ? n % used * 100 / used : 0);
+}
+
+// ─────────────────────────────────────────
+// TX benchmark
+// ─────────────────────────────────────────
+// wifi_core_tx() through DRR and CCMP to a MAC stub that just frees the
+// frames. The whole run is queued up front, so the latencies are those of
+// a saturated device.
+static atomic_t wifi_test_tx_done;
+static atomic_long_t wifi_test_allocs;
+
+static int wifi_test_associate(void *mac_ctx, struct wifi_bss_info *bss)
+{
+    return 0;
+}
+
+static int wifi_test_submit_bulk(void *mac_ctx, struct sk_buff_head *list)
+{
+    int n = skb_queue_len(list);
+
+    __skb_queue_purge(list);
+    atomic_add(n, &wifi_test_tx_done);
+    wake_up_var(&wifi_test_tx_done);
+    return n;
+}
+
+static void wifi_test_kmalloc_probe(void *data, unsigned long call_site,
+                                    const void *ptr, size_t bytes_req,
+                                    size_t bytes_alloc, gfp_t gfp_flags, int node)
+{
+    atomic_long_inc(&wifi_test_allocs);
+}
+
+static void wifi_test_cache_alloc_probe(void *data, unsigned long call_site,
+                                        const void *ptr, struct kmem_cache *s,
+                                        gfp_t gfp_flags, int node)
+{
+    atomic_long_inc(&wifi_test_allocs);
+}
+
+// Counts slab allocations on every CPU, so anything else running during
+// the benchmark shows up too. False if the kernel has no kmem tracepoints.
+static bool wifi_test_allocs_start(void)
+{
+    atomic_long_set(&wifi_test_allocs, 0);
+    if (register_trace_kmalloc(wifi_test_kmalloc_probe, NULL))
+        return false;
+    if (register_trace_kmem_cache_alloc(wifi_test_cache_alloc_probe, NULL)) {
+        unregister_trace_kmalloc(wifi_test_kmalloc_probe, NULL);
+        tracepoint_synchronize_unregister();
+        return false;
+    }
+    return true;
+}
+
+static void wifi_test_allocs_stop(void)
+{
+    unregister_trace_kmem_cache_alloc(wifi_test_cache_alloc_probe, NULL);
+    unregister_trace_kmalloc(wifi_test_kmalloc_probe, NULL);
+    tracepoint_synchronize_unregister();
+}
+
+static void wifi_test_bench_tx(struct kunit *test)
+{
+    static const enum wifi_lat_stage stages[] = {
+        WIFI_LAT_TX_QUEUE, WIFI_LAT_TX_ENCRYPT, WIFI_LAT_TX_TOTAL,
+    };
+    const int n = WIFI_TEST_BENCH_PKTS;
+    struct wifi_device *dev = test->priv;
+    unsigned long hist[WIFI_LAT_BUCKETS], total, allocs;
+    struct wifi_bss_info bss;
+    struct sk_buff_head pkts;
+    struct wifi_stats st;
+    struct sk_buff *skb;
+    bool counting;
+    u64 start, ns;
+    int i;
+
+    kunit_activate_static_stub(test, mac_associate, wifi_test_associate);
+    kunit_activate_static_stub(test, mac_tx_submit_bulk, wifi_test_submit_bulk);
+    atomic_set(&wifi_test_tx_done, 0);
+
+    // WPA2, so every frame goes through CCMP-128
+    wpa_set_own_addr(dev->sec_ctx, wifi_test_own);
+    wifi_test_bss(&bss, 1, 36, "bench");
+    if (wifi_core_connect(dev, &bss))
+        kunit_skip(test, "can't connect (no ccm(aes)?)");
+
+    __skb_queue_head_init(&pkts);
+    for (i = 0; i < n; i++) {
+        skb = alloc_skb(WIFI_FRAG_HEADROOM + ETH_HLEN + WIFI_TEST_BENCH_LEN + 16,
+                        GFP_KERNEL);
+        if (!skb) {
+            __skb_queue_purge(&pkts);
+            KUNIT_FAIL(test, "out of memory after %d frames", i);
+            return;
+        }
+        skb_reserve(skb, WIFI_FRAG_HEADROOM);
+        ether_addr_copy(skb_put_zero(skb, ETH_HLEN + WIFI_TEST_BENCH_LEN),
+                        wifi_test_peer);
+        __skb_queue_tail(&pkts, skb);
+    }
+
+    counting = wifi_test_allocs_start();
+    start = ktime_get_ns();
+    while ((skb = __skb_dequeue(&pkts)))
+        wifi_core_tx(dev, skb);
+    wait_var_event_timeout(&wifi_test_tx_done,
+                           atomic_read(&wifi_test_tx_done) >= n, 10 * HZ);
+    ns = ktime_get_ns() - start;
+    if (counting)
+        wifi_test_allocs_stop();
+    allocs = atomic_long_read(&wifi_test_allocs);
+    // tx_work may still be between the submit and the stats update
+    flush_workqueue(dev->tx_wq);
+
+    KUNIT_EXPECT_EQ(test, atomic_read(&wifi_test_tx_done), n);
+    wifi_core_get_stats(dev, &st);
+    KUNIT_EXPECT_EQ(test, st.tx_packets, (u64)n);
+    KUNIT_EXPECT_EQ(test, st.tx_dropped, 0ULL);
+
+    kunit_info(test, "%d x %d byte frames, CCMP-128: %llu pps\n", n,
+               WIFI_TEST_BENCH_LEN, div64_u64((u64)n * NSEC_PER_SEC, max(ns, 1ULL)));
+    for (i = 0; i < ARRAY_SIZE(stages); i++) {
+        total = wifi_lat_fold(dev, stages[i], hist);
+        KUNIT_EXPECT_EQ(test, total, (unsigned long)n);
+        if (!total)
+            continue;
+        kunit_info(test, "%-10s p50 %llu p90 %llu p99 %llu ns\n",
+                   wifi_lat_names[stages[i]],
+                   wifi_lat_percentile(hist, total, 50),
+                   wifi_lat_percentile(hist, total, 90),
+                   wifi_lat_percentile(hist, total, 99));
+    }
+    if (counting)
+        kunit_info(test, "%lu.%02lu slab allocations per frame\n",
+                   allocs / n, allocs % n * 100 / n);
+    else
+        kunit_info(test, "allocations not counted: no kmem tracepoints\n");
+}
+
+// ─────────────────────────────────────────
+// RX benchmark
+// ─────────────────────────────────────────
+// One TCP stream from wifi_test_peer fed through wifi_core_rx() in
+// interrupt-sized bursts, once per rx_napi mode, on a netdev that was never
+// registered. A packet_type bound to that netdev stands in for the stack and
+// counts what reaches it, so GRO shows up as fewer, larger skbs.
+#define WIFI_TEST_RX_MSS        1448
+#define WIFI_TEST_RX_BURST      32      // Frames per simulated interrupt
+
+static atomic_t wifi_test_rx_skbs;
+static atomic_t wifi_test_rx_segs;
+
+static void wifi_test_free_netdev(void *netdev)
+{
+    free_netdev(netdev);
+}
+
+static void wifi_test_noop_qdisc(struct net_device *netdev,
+                                 struct netdev_queue *txq, void *unused)
+{
+    rcu_assign_pointer(txq->qdisc, &noop_qdisc);
+}
+
+static void wifi_test_rx_deliver(struct napi_struct *napi, struct sk_buff *skb)
+{
+    if (napi) {
+        napi_gro_receive(napi, skb);
+        return;
+    }
+    // netif_rx() drops frames for a netdev that isn't up: take them into
+    // the stack one by one from here instead, with BHs off as the backlog
+    // would
+    local_bh_disable();
+    netif_receive_skb(skb);
+    local_bh_enable();
+}
+
+// Freed before it's counted, so a waiter sees the free too
+static int wifi_test_rx_rcv(struct sk_buff *skb, struct net_device *netdev,
+                            struct packet_type *pt, struct net_device *orig)
+{
+    u16 segs = max_t(u16, skb_shinfo(skb)->gso_segs, 1);
+
+    consume_skb(skb);
+    atomic_inc(&wifi_test_rx_skbs);
+    atomic_add(segs, &wifi_test_rx_segs);
+    wake_up_var(&wifi_test_rx_segs);
+    return NET_RX_SUCCESS;
+}
+
+// Gives @dev an unregistered netdev to deliver to, through
+// wifi_test_rx_deliver()
+static struct net_device *wifi_test_rx_netdev(struct kunit *test,
+                                              struct wifi_device *dev)
+{
+    struct net_device *netdev;
+
+    netdev = alloc_etherdev_mqs(0, WIFI_NUM_ACS, 1);
+    KUNIT_ASSERT_NOT_NULL(test, netdev);
+    // Runs after wifi_test_exit(), once the device no longer uses it
+    KUNIT_ASSERT_EQ(test, kunit_add_action_or_reset(test, wifi_test_free_netdev,
+                                                    netdev), 0);
+    eth_hw_addr_set(netdev, wifi_test_own);
+    // register_netdev() would have done these: GRO on, and a qdisc for
+    // the TX queues, which waking them (wifi_datapath_start()) schedules
+    netdev->features |= NETIF_F_GRO;
+    netdev_for_each_tx_queue(netdev, wifi_test_noop_qdisc, NULL);
+    KUNIT_ASSERT_EQ(test, wifi_core_attach_netdev(dev, netdev), 0);
+    kunit_activate_static_stub(test, wifi_rx_deliver, wifi_test_rx_deliver);
+    return netdev;
+}
+
+// Segment @i of the stream: in order, ACK only, DF with incrementing IDs,
+// checksum already verified, i.e. everything TCP GRO needs to merge it
+static struct sk_buff *wifi_test_rx_frame(struct net_device *netdev, u32 i)
+{
+    const unsigned int len = sizeof(struct iphdr) + sizeof(struct tcphdr) +
+                             WIFI_TEST_RX_MSS;
+    struct sk_buff *skb;
+    struct ethhdr *eth;
+    struct iphdr *iph;
+    struct tcphdr *th;
+
+    skb = netdev_alloc_skb(netdev, ETH_HLEN + len);
+    if (!skb)
+        return NULL;
+    eth = skb_put_zero(skb, ETH_HLEN + len);
+    ether_addr_copy(eth->h_dest, wifi_test_own);
+    ether_addr_copy(eth->h_source, wifi_test_peer);
+    eth->h_proto = htons(ETH_P_IP);
+
+    iph = (struct iphdr *)(eth + 1);
+    iph->version = 4;
+    iph->ihl = 5;
+    iph->tot_len = htons(len);
+    iph->id = htons(i);
+    iph->frag_off = htons(IP_DF);
+    iph->ttl = 64;
+    iph->protocol = IPPROTO_TCP;
+    iph->saddr = htonl(0xc0a80002);     // 192.168.0.2
+    iph->daddr = htonl(0xc0a80001);
+    iph->check = ip_fast_csum(iph, iph->ihl);
+
+    th = (struct tcphdr *)(iph + 1);
+    th->source = htons(5001);
+    th->dest = htons(40000);
+    th->seq = htonl(i * WIFI_TEST_RX_MSS);
+    th->ack_seq = htonl(1);
+    th->doff = sizeof(*th) / 4;
+    th->ack = 1;
+    th->window = htons(U16_MAX);
+    skb->ip_summed = CHECKSUM_UNNECESSARY;
+
+    memset(WIFI_SKB_CB(skb), 0, sizeof(struct wifi_skb_cb));
+    ether_addr_copy(WIFI_SKB_CB(skb)->addr, wifi_test_peer);
+    return skb;
+}
+
+// Returns how many skbs reached the stack
+static int wifi_test_rx_mode(struct kunit *test, struct wifi_device *dev, bool napi)
+{
+    const int n = WIFI_TEST_BENCH_PKTS;
+    unsigned long before[WIFI_LAT_BUCKETS], hist[WIFI_LAT_BUCKETS], total;
+    struct sk_buff_head pkts;
+    struct wifi_stats st;
+    struct sk_buff *skb;
+    u64 start, ns, rx_packets;
+    int i;
+
+    __skb_queue_head_init(&pkts);
+    for (i = 0; i < n; i++) {
+        skb = wifi_test_rx_frame(dev->netdev, i);
+        if (!skb) {
+            __skb_queue_purge(&pkts);
+            KUNIT_FAIL(test, "out of memory after %d frames", i);
+            return 0;
+        }
+        __skb_queue_tail(&pkts, skb);
+    }
+
+    atomic_set(&wifi_test_rx_skbs, 0);
+    atomic_set(&wifi_test_rx_segs, 0);
+    wifi_core_get_stats(dev, &st);
+    rx_packets = st.rx_packets;
+    total = wifi_lat_fold(dev, WIFI_LAT_RX_TOTAL, before);
+
+    rx_napi = napi;
+    start = ktime_get_ns();
+    while (!skb_queue_empty(&pkts)) {
+        // NAPI polls when BHs come back on, as after a real interrupt
+        local_bh_disable();
+        for (i = 0; i < WIFI_TEST_RX_BURST && (skb = __skb_dequeue(&pkts)); i++)
+            wifi_core_rx(dev, skb);
+        local_bh_enable();
+    }
+    wait_var_event_timeout(&wifi_test_rx_segs,
+                           atomic_read(&wifi_test_rx_segs) >= n, 10 * HZ);
+    ns = ktime_get_ns() - start;
+
+    KUNIT_EXPECT_EQ(test, atomic_read(&wifi_test_rx_segs), n);
+    wifi_core_get_stats(dev, &st);
+    KUNIT_EXPECT_EQ(test, st.rx_packets - rx_packets, (u64)n);
+
+    // Only this run's samples
+    total = wifi_lat_fold(dev, WIFI_LAT_RX_TOTAL, hist) - total;
+    for (i = 0; i < WIFI_LAT_BUCKETS; i++)
+        hist[i] -= before[i];
+    kunit_info(test, "%-6s %llu pps, %d frames in %d skbs to the stack\n",
+               napi ? "NAPI" : "legacy",
+               div64_u64((u64)n * NSEC_PER_SEC, max(ns, 1ULL)),
+               n, atomic_read(&wifi_test_rx_skbs));
+    if (total)
+        kunit_info(test, "%-6s rx_total p50 %llu p90 %llu p99 %llu ns\n",
+                   napi ? "NAPI" : "legacy",
+                   wifi_lat_percentile(hist, total, 50),
+                   wifi_lat_percentile(hist, total, 90),
+                   wifi_lat_percentile(hist, total, 99));
+    return atomic_read(&wifi_test_rx_skbs);
+}
+
+static void wifi_test_bench_rx(struct kunit *test)
+{
+    struct packet_type pt = {
+        .type   = htons(ETH_P_IP),
+        .func   = wifi_test_rx_rcv,
+    };
+    struct wifi_device *dev = test->priv;
+    struct net_device *netdev;
+    struct wifi_bss_info bss;
+    bool saved = rx_napi;
+    int legacy, gro;
+
+    netdev = wifi_test_rx_netdev(test, dev);
+    kunit_activate_static_stub(test, mac_associate, wifi_test_associate);
+
+    // Open network: decryption is a no-op, so this measures the RX path
+    // around it and the hand-off to the stack
+    wifi_test_bss(&bss, 1, 36, "bench");
+    bss.security = WIFI_SEC_OPEN;
+    KUNIT_ASSERT_EQ(test, wifi_core_connect(dev, &bss), 0);
+
+    pt.dev = netdev;
+    dev_add_pack(&pt);
+    legacy = wifi_test_rx_mode(test, dev, false);
+    gro = wifi_test_rx_mode(test, dev, true);
+    dev_remove_pack(&pt);
+    rx_napi = saved;
+
+    KUNIT_EXPECT_EQ(test, legacy, WIFI_TEST_BENCH_PKTS);
+    // GRO merged the stream into fewer, larger skbs
+    KUNIT_EXPECT_LT(test, gro, legacy);
+}
+
+// ─────────────────────────────────────────
+// Stats contention benchmark
+// ─────────────────────────────────────────
+// One thread per online CPU updates the RX and drop counters of one
+// device at once, as NAPI and the TX/RX workers on several CPUs do. With
+// per-CPU counters the cost per update should not grow with the thread
+// count, and no update may be lost.
+struct wifi_test_stats_worker {
+    struct wifi_device *dev;
+    atomic_t           *waiting;    // Threads not yet at the start line
+    struct completion   done;
+    u64                 ns;
+};
+
+static int wifi_test_stats_thread(void *data)
+{
+    struct wifi_test_stats_worker *w = data;
+    u64 start;
+    int i;
+
+    // Start together, so they actually contend
+    atomic_dec(w->waiting);
+    while (atomic_read(w->waiting))
+        cpu_relax();
+
+    start = ktime_get_ns();
+    for (i = 0; i < WIFI_TEST_STATS_OPS; i++) {
+        wifi_core_update_rx_stats(w->dev, WIFI_TEST_BENCH_LEN, i % WIFI_NUM_ACS);
+        if (!(i % 16))
+            wifi_core_count_drop(w->dev, WIFI_DROP_QUEUE_FULL, false, 1);
+    }
+    w->ns = ktime_get_ns() - start;
+    complete(&w->done);
+    return 0;
+}
+
+// Runs @n threads on the first @n online CPUs; returns the slowest
+// thread's time, 0 if they couldn't all be started
+static u64 wifi_test_stats_run(struct kunit *test, struct wifi_device *dev, int n)
+{
+    struct wifi_test_stats_worker *w;
+    struct wifi_stats before, after;
+    struct task_struct *task;
+    int cpu, i = 0, ac, started;
+    atomic_t waiting;
+    u64 ops, ns = 0;
+
+    w = kunit_kcalloc(test, n, sizeof(*w), GFP_KERNEL);
+    KUNIT_ASSERT_NOT_NULL(test, w);
+    atomic_set(&waiting, n);
+    wifi_core_get_stats(dev, &before);
+
+    for_each_online_cpu(cpu) {
+        if (i == n)
+            break;
+        w[i].dev = dev;
+        w[i].waiting = &waiting;
+        init_completion(&w[i].done);
+        task = kthread_create_on_cpu(wifi_test_stats_thread, &w[i], cpu,
+                                     "wifi_stats/%u");
+        if (IS_ERR(task))
+            break;
+        wake_up_process(task);
+        i++;
+    }
+    // The ones started would wait for the rest forever otherwise
+    started = i;
+    atomic_sub(n - started, &waiting);
+    for (i = 0; i < started; i++) {
+        wait_for_completion(&w[i].done);
+        ns = max(ns, w[i].ns);
+    }
+    if (started < n)
+        return 0;
+
+    ops = (u64)n * WIFI_TEST_STATS_OPS;
+    wifi_core_get_stats(dev, &after);
+    KUNIT_EXPECT_EQ(test, after.rx_packets - before.rx_packets, ops);
+    KUNIT_EXPECT_EQ(test, after.rx_bytes - before.rx_bytes, ops * WIFI_TEST_BENCH_LEN);
+    for (ac = 0; ac < WIFI_NUM_ACS; ac++)
+        KUNIT_EXPECT_EQ(test, after.rx_ac_packets[ac] - before.rx_ac_packets[ac],
+                        ops / WIFI_NUM_ACS);
+    KUNIT_EXPECT_EQ(test, after.drops[WIFI_DROP_QUEUE_FULL] -
+                          before.drops[WIFI_DROP_QUEUE_FULL],
+                    (u64)n * DIV_ROUND_UP(WIFI_TEST_STATS_OPS, 16));
+    return ns;
+}
+
+static void wifi_test_bench_stats(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    int n, max_threads = num_online_cpus();
+    u64 ns;
+
+    // 1, 2, 4, ... threads, up to one per online CPU
+    for (n = 1; ; n = min(n * 2, max_threads)) {
+        ns = wifi_test_stats_run(test, dev, n);
+        if (!ns) {
+            KUNIT_FAIL(test, "couldn't start %d threads", n);
+            return;
+        }
+        kunit_info(test, "%3d threads: %llu ns/update, %llu updates/s total\n", n,
+                   div64_u64(ns, WIFI_TEST_STATS_OPS),
+                   div64_u64((u64)n * WIFI_TEST_STATS_OPS * NSEC_PER_SEC, ns));
+        if (n == max_threads)
+            break;
+    }
+}
+
+// ─────────────────────────────────────────
+// Roaming against simulated APs
+// ─────────────────────────────────────────
+// The APs of one ESS are a table the test edits between steps. Scans
+// answer from it with a fixed dwell per channel visited and associations
+// take a fixed time and fail for APs marked reject, so a roam runs the
+// real trigger, channel choice, target choice and rejoin logic.
+struct wifi_test_ap {
+    u8      id;
+    u32     channel;
+    s32     rssi;
+    bool    reject;     // mac_associate() fails
+};
+
+static struct wifi_test_ap *wifi_test_aps;
+static int wifi_test_n_aps;
+
+static void wifi_test_ap_bss(struct wifi_bss_info *bss, const struct wifi_test_ap *ap)
+{
+    wifi_test_bss(bss, ap->id, ap->channel, "roam");
+    bss->rssi = ap->rssi;
+}
+
+static int wifi_test_ap_associate(void *mac_ctx, struct wifi_bss_info *bss)
+{
+    int i;
+
+    udelay(WIFI_TEST_ASSOC_US);
+    for (i = 0; i < wifi_test_n_aps; i++) {
+        if (wifi_test_aps[i].id == bss->bssid[5])
+            return wifi_test_aps[i].reject ? -ETIMEDOUT : 0;
+    }
+    return -ENOENT;
+}
+
+// Answers the scan in progress: the channels it was limited to, or all
+static void wifi_test_sim_scan(struct wifi_device *dev)
+{
+    static const u32 all[] = { 1, 6, 11, 36, 40, 44, 48, 149, 153, 157, 161 };
+    const u32 *channels = dev->n_scan_channels ? dev->scan_channels : all;
+    int n = dev->n_scan_channels ?: ARRAY_SIZE(all);
+    struct wifi_bss_info bss;
+    int i, j;
+
+    for (i = 0; i < n; i++) {
+        udelay(WIFI_TEST_DWELL_US);
+        for (j = 0; j < wifi_test_n_aps; j++) {
+            if (wifi_test_aps[j].channel != channels[i])
+                continue;
+            wifi_test_ap_bss(&bss, &wifi_test_aps[j]);
+            wifi_core_scan_result(dev, &bss);
+        }
+    }
+    wifi_core_scan_done(dev);
+}
+
+// Scans while disconnected so every AP is known, then joins @aps[0]
+static void wifi_test_roam_setup(struct kunit *test, struct wifi_test_ap *aps, int n)
+{
+    struct wifi_device *dev = test->priv;
+    struct wifi_bss_info bss;
+
+    kunit_activate_static_stub(test, mac_associate, wifi_test_ap_associate);
+    wifi_test_aps = aps;
+    wifi_test_n_aps = n;
+    wpa_set_own_addr(dev->sec_ctx, wifi_test_own);
+
+    KUNIT_ASSERT_EQ(test, wifi_core_scan_start(dev), 0);
+    wifi_test_sim_scan(dev);
+    wifi_test_ap_bss(&bss, &aps[0]);
+    if (wifi_core_connect(dev, &bss))
+        kunit_skip(test, "can't connect (no ccm(aes)?)");
+}
+
+// The current AP reports @rssi; a roam scan that starts is answered
+static void wifi_test_roam_step(struct wifi_device *dev, s32 rssi)
+{
+    wifi_core_check_roaming(dev, rssi);
+    if (dev->state == WIFI_STATE_ROAMING)
+        wifi_test_sim_scan(dev);
+}
+
+// Lets the next trigger through the ROAM_MIN_INTERVAL rate limit
+static void wifi_test_roam_rearm(struct wifi_device *dev)
+{
+    dev->roam.last_attempt = jiffies - ROAM_MIN_INTERVAL;
+}
+
+// A candidate has to beat the trigger RSSI by ROAM_RSSI_HYSTERESIS
+static void wifi_test_roam_hysteresis(struct kunit *test)
+{
+    struct wifi_test_ap aps[] = {
+        { .id = 1, .channel = 36, .rssi = -80 },
+        { .id = 2, .channel = 44, .rssi = -80 + ROAM_RSSI_HYSTERESIS - 1 },
+    };
+    struct wifi_device *dev = test->priv;
+    unsigned long hist[WIFI_LAT_BUCKETS];
+
+    wifi_test_roam_setup(test, aps, ARRAY_SIZE(aps));
+
+    wifi_test_roam_step(dev, -80);
+    KUNIT_EXPECT_EQ(test, dev->roam.attempts, 1U);
+    KUNIT_EXPECT_EQ(test, dev->state, WIFI_STATE_CONNECTED);
+    KUNIT_EXPECT_EQ(test, dev->cur_bss.bssid[5], 1);
+    KUNIT_EXPECT_EQ(test, dev->roam.roams, 0U);
+
+    aps[1].rssi = -80 + ROAM_RSSI_HYSTERESIS;
+    wifi_test_roam_rearm(dev);
+    wifi_test_roam_step(dev, -80);
+    KUNIT_EXPECT_EQ(test, dev->roam.attempts, 2U);
+    KUNIT_EXPECT_EQ(test, dev->state, WIFI_STATE_CONNECTED);
+    KUNIT_EXPECT_EQ(test, dev->cur_bss.bssid[5], 2);
+    KUNIT_EXPECT_EQ(test, dev->roam.roams, 1U);
+    KUNIT_EXPECT_EQ(test, wifi_lat_fold(dev, WIFI_LAT_ROAM, hist), 1UL);
+}
+
+// Above the threshold nothing happens; below it, one attempt per
+// ROAM_MIN_INTERVAL however often the RSSI is reported
+static void wifi_test_roam_rate_limit(struct kunit *test)
+{
+    struct wifi_test_ap aps[] = {
+        { .id = 1, .channel = 36, .rssi = -80 },
+        { .id = 2, .channel = 44, .rssi = -78 },
+    };
+    struct wifi_device *dev = test->priv;
+    int i;
+
+    wifi_test_roam_setup(test, aps, ARRAY_SIZE(aps));
+
+    wifi_test_roam_step(dev, ROAM_RSSI_THRESHOLD);
+    KUNIT_EXPECT_EQ(test, dev->roam.attempts, 0U);
+
+    for (i = 0; i < 10; i++)
+        wifi_test_roam_step(dev, -80);
+    KUNIT_EXPECT_EQ(test, dev->roam.attempts, 1U);
+    KUNIT_EXPECT_EQ(test, dev->state, WIFI_STATE_CONNECTED);
+
+    wifi_test_roam_rearm(dev);
+    wifi_test_roam_step(dev, -80);
+    KUNIT_EXPECT_EQ(test, dev->roam.attempts, 2U);
+}
+
+// A user scan can't start while a roam scan runs
+static void wifi_test_roam_user_scan(struct kunit *test)
+{
+    struct wifi_test_ap aps[] = {
+        { .id = 1, .channel = 36, .rssi = -80 },
+        { .id = 2, .channel = 44, .rssi = -60 },
+    };
+    struct wifi_device *dev = test->priv;
+    u32 channel = 1;
+
+    wifi_test_roam_setup(test, aps, ARRAY_SIZE(aps));
+
+    wifi_core_check_roaming(dev, -80);
+    KUNIT_ASSERT_EQ(test, dev->state, WIFI_STATE_ROAMING);
+    KUNIT_EXPECT_EQ(test, wifi_core_scan_start(dev), -EBUSY);
+    KUNIT_EXPECT_EQ(test, wifi_core_scan_channels(dev, &channel, 1), -EBUSY);
+    KUNIT_EXPECT_EQ(test, dev->state, WIFI_STATE_ROAMING);
+    // The roam scan is the one still answered
+    KUNIT_EXPECT_EQ(test, dev->n_scan_channels, 1U);
+    KUNIT_EXPECT_EQ(test, dev->scan_channels[0], 44U);
+
+    wifi_test_sim_scan(dev);
+    KUNIT_EXPECT_EQ(test, dev->cur_bss.bssid[5], 2);
+}
+
+// A failed roam goes back to the old AP; if that fails too we end up
+// disconnected rather than stuck in ROAMING
+static void wifi_test_roam_fallback(struct kunit *test)
+{
+    struct wifi_test_ap aps[] = {
+        { .id = 1, .channel = 36, .rssi = -80 },
+        { .id = 2, .channel = 44, .rssi = -60, .reject = true },
+    };
+    struct wifi_device *dev = test->priv;
+
+    wifi_test_roam_setup(test, aps, ARRAY_SIZE(aps));
+
+    wifi_test_roam_step(dev, -80);
+    KUNIT_EXPECT_EQ(test, dev->state, WIFI_STATE_CONNECTED);
+    KUNIT_EXPECT_EQ(test, dev->cur_bss.bssid[5], 1);
+    KUNIT_EXPECT_EQ(test, dev->roam.failures, 1U);
+    KUNIT_EXPECT_EQ(test, dev->roam.roams, 0U);
+
+    aps[0].reject = true;
+    wifi_test_roam_rearm(dev);
+    wifi_test_roam_step(dev, -80);
+    KUNIT_EXPECT_EQ(test, dev->state, WIFI_STATE_DISCONNECTED);
+    KUNIT_EXPECT_TRUE(test, is_zero_ether_addr(dev->cur_bss.bssid));
+    KUNIT_EXPECT_EQ(test, dev->roam.failures, 2U);
+
+    // Disconnected, the trigger is ignored
+    wifi_test_roam_rearm(dev);
+    wifi_test_roam_step(dev, -80);
+    KUNIT_EXPECT_EQ(test, dev->roam.attempts, 2U);
+}
+
+static int wifi_test_cmp_u64(const void *a, const void *b)
+{
+    u64 x = *(const u64 *)a, y = *(const u64 *)b;
+
+    return x < y ? -1 : x > y;
+}
+
+static void wifi_test_report_us(struct kunit *test, const char *what, u64 *ns, int n)
+{
+    sort(ns, n, sizeof(*ns), wifi_test_cmp_u64, NULL);
+    kunit_info(test, "  %-6s p50 %llu p90 %llu p99 %llu max %llu us\n", what,
+               div_u64(ns[n / 2], NSEC_PER_USEC),
+               div_u64(ns[n * 90 / 100], NSEC_PER_USEC),
+               div_u64(ns[n * 99 / 100], NSEC_PER_USEC),
+               div_u64(ns[n - 1], NSEC_PER_USEC));
+}
+
+// Two APs trade places WIFI_TEST_ROAMS times: the one we're on fades to
+// -80 dBm and the other comes up at -60. With @full_scan the table says
+// the other is weak before the trigger, so the roam scans every channel
+// instead of just its one.
+static void wifi_test_roam_bench_mode(struct kunit *test, struct wifi_test_ap *aps,
+                                      bool full_scan)
+{
+    struct wifi_device *dev = test->priv;
+    struct wifi_roam *r = &dev->roam;
+    u64 *total, *scan, *auth, *assoc;
+    struct wifi_bss_info bss;
+    int i, cur, other, done = 0;
+    u32 roams;
+
+    total = kunit_kcalloc(test, 4 * WIFI_TEST_ROAMS, sizeof(*total), GFP_KERNEL);
+    KUNIT_ASSERT_NOT_NULL(test, total);
+    scan = total + WIFI_TEST_ROAMS;
+    auth = scan + WIFI_TEST_ROAMS;
+    assoc = auth + WIFI_TEST_ROAMS;
+
+    for (i = 0; i < WIFI_TEST_ROAMS; i++) {
+        cur = dev->cur_bss.bssid[5] == aps[0].id ? 0 : 1;
+        other = !cur;
+        aps[cur].rssi = -80;
+        aps[other].rssi = -60;
+        if (full_scan) {
+            wifi_test_ap_bss(&bss, &aps[other]);
+            bss.rssi = -90;
+            wifi_core_scan_result(dev, &bss);
+        }
+
+        roams = r->roams;
+        wifi_test_roam_rearm(dev);
+        wifi_test_roam_step(dev, -80);
+        if (r->roams == roams)
+            continue;
+        total[done] = ktime_to_ns(ktime_sub(r->t_assoc_done, r->t_trigger));
+        scan[done] = ktime_to_ns(ktime_sub(r->t_scan_done, r->t_trigger));
+        auth[done] = ktime_to_ns(ktime_sub(r->t_auth_done, r->t_scan_done));
+        assoc[done] = ktime_to_ns(ktime_sub(r->t_assoc_done, r->t_auth_done));
+        done++;
+    }
+    KUNIT_EXPECT_EQ(test, done, WIFI_TEST_ROAMS);
+    if (!done)
+        return;
+
+    kunit_info(test, "%d roams, %s scan:\n", done,
+               full_scan ? "full" : "candidate channel");
+    wifi_test_report_us(test, "total", total, done);
+    wifi_test_report_us(test, "scan", scan, done);
+    wifi_test_report_us(test, "auth", auth, done);
+    wifi_test_report_us(test, "assoc", assoc, done);
+}
+
+static void wifi_test_bench_roam(struct kunit *test)
+{
+    struct wifi_test_ap aps[] = {
+        { .id = 1, .channel = 36, .rssi = -60 },
+        { .id = 2, .channel = 149, .rssi = -60 },
+    };
+    struct wifi_device *dev = test->priv;
+    unsigned long hist[WIFI_LAT_BUCKETS];
+
+    wifi_test_roam_setup(test, aps, ARRAY_SIZE(aps));
+    wifi_test_roam_bench_mode(test, aps, false);
+    wifi_test_roam_bench_mode(test, aps, true);
+
+    KUNIT_EXPECT_EQ(test, dev->roam.roams, 2U * WIFI_TEST_ROAMS);
+    KUNIT_EXPECT_EQ(test, dev->roam.failures, 0U);
+    KUNIT_EXPECT_EQ(test, wifi_lat_fold(dev, WIFI_LAT_ROAM, hist),
+                    2UL * WIFI_TEST_ROAMS);
+}
+
+// ─────────────────────────────────────────
+// Mixed traffic benchmark
+// ─────────────────────────────────────────
+// Voice, video, best effort and background IPv4 flows, told apart by DSCP
+// only, are queued interleaved with QoS on, so all four ACs are backlogged
+// at once. The MAC stub timestamps each MSDU as it leaves: per-AC latency
+// percentiles and throughput show what the DRR weights buy.
+static const struct {
+    const char     *name;
+    u8              dscp;
+    unsigned int    len;    // IP packet
+} wifi_test_mix[WIFI_NUM_ACS] = {
+    [WIFI_AC_VO] = { "VO", 46, 200 },     // EF
+    [WIFI_AC_VI] = { "VI", 40, 1200 },    // CS5
+    [WIFI_AC_BE] = { "BE", 0, 1500 },
+    [WIFI_AC_BK] = { "BK", 8, 1500 },     // CS1
+};
+
+static struct {
+    u64    *lat[WIFI_NUM_ACS];
+    u32     n[WIFI_NUM_ACS];
+    u64     bytes[WIFI_NUM_ACS];
+    u64     last[WIFI_NUM_ACS];
+} wifi_test_mixed;
+
+// Runs in tx_work only, so the counters need no lock
+static int wifi_test_mixed_submit(void *mac_ctx, struct sk_buff_head *list)
+{
+    int n = skb_queue_len(list);
+    u64 now = ktime_get_ns();
+    struct wifi_skb_cb *cb;
+    struct sk_buff *skb;
+    u16 ac;
+
+    skb_queue_walk(list, skb) {
+        cb = WIFI_SKB_CB(skb);
+        ac = skb_get_queue_mapping(skb);
+        wifi_test_mixed.bytes[ac] += cb->len;
+        if (cb->more_frags)
+            continue;
+        if (wifi_test_mixed.n[ac] < WIFI_TEST_MIX_PKTS)
+            wifi_test_mixed.lat[ac][wifi_test_mixed.n[ac]] = now - cb->tstamp;
+        wifi_test_mixed.n[ac]++;
+        wifi_test_mixed.last[ac] = now;
+    }
+    __skb_queue_purge(list);
+    atomic_add(n, &wifi_test_tx_done);
+    wake_up_var(&wifi_test_tx_done);
+    return n;
+}
+
+static struct sk_buff *wifi_test_ip_frame(u8 dscp, unsigned int len)
+{
+    struct sk_buff *skb;
+    struct ethhdr *eth;
+    struct iphdr *iph;
+
+    skb = alloc_skb(WIFI_FRAG_HEADROOM + ETH_HLEN + len + 16, GFP_KERNEL);
+    if (!skb)
+        return NULL;
+    skb_reserve(skb, WIFI_FRAG_HEADROOM);
+    eth = skb_put_zero(skb, ETH_HLEN + len);
+    ether_addr_copy(eth->h_dest, wifi_test_peer);
+    ether_addr_copy(eth->h_source, wifi_test_own);
+    eth->h_proto = htons(ETH_P_IP);
+    skb_reset_mac_header(skb);
+    skb_set_network_header(skb, ETH_HLEN);
+    skb->protocol = htons(ETH_P_IP);
+
+    iph = ip_hdr(skb);
+    iph->version = 4;
+    iph->ihl = 5;
+    iph->tos = dscp << 2;
+    iph->tot_len = htons(len);
+    return skb;
+}
+
+static void wifi_test_bench_mixed(struct kunit *test)
+{
+    const int n = WIFI_NUM_ACS * WIFI_TEST_MIX_PKTS;
+    struct wifi_device *dev = test->priv;
+    struct wifi_bss_info bss;
+    struct sk_buff_head pkts;
+    struct sk_buff *skb;
+    u64 start, ns;
+    int ac, i;
+
+    memset(&wifi_test_mixed, 0, sizeof(wifi_test_mixed));
+    for (ac = 0; ac < WIFI_NUM_ACS; ac++) {
+        wifi_test_mixed.lat[ac] = kunit_kcalloc(test, WIFI_TEST_MIX_PKTS,
+                                                sizeof(u64), GFP_KERNEL);
+        KUNIT_ASSERT_NOT_NULL(test, wifi_test_mixed.lat[ac]);
+    }
+    kunit_activate_static_stub(test, mac_associate, wifi_test_associate);
+    kunit_activate_static_stub(test, mac_tx_submit_bulk, wifi_test_mixed_submit);
+    atomic_set(&wifi_test_tx_done, 0);
+
+    dev->config.qos_enabled = true;
+    wpa_set_own_addr(dev->sec_ctx, wifi_test_own);
+    wifi_test_bss(&bss, 1, 36, "bench");
+    if (wifi_core_connect(dev, &bss))
+        kunit_skip(test, "can't connect (no ccm(aes)?)");
+
+    __skb_queue_head_init(&pkts);
+    for (i = 0; i < WIFI_TEST_MIX_PKTS; i++) {
+        for (ac = 0; ac < WIFI_NUM_ACS; ac++) {
+            skb = wifi_test_ip_frame(wifi_test_mix[ac].dscp, wifi_test_mix[ac].len);
+            if (!skb) {
+                KUNIT_FAIL(test, "out of memory after %u frames", skb_queue_len(&pkts));
+                __skb_queue_purge(&pkts);
+                return;
+            }
+            __skb_queue_tail(&pkts, skb);
+        }
+    }
+
+    start = ktime_get_ns();
+    while ((skb = __skb_dequeue(&pkts)))
+        wifi_core_tx(dev, skb);
+    wait_var_event_timeout(&wifi_test_tx_done,
+                           atomic_read(&wifi_test_tx_done) >= n, 10 * HZ);
+    ns = ktime_get_ns() - start;
+    flush_workqueue(dev->tx_wq);
+    KUNIT_EXPECT_EQ(test, atomic_read(&wifi_test_tx_done), n);
+
+    kunit_info(test, "%d frames, %d per AC, CCMP-128, all in %llu us\n", n,
+               WIFI_TEST_MIX_PKTS, div_u64(ns, NSEC_PER_USEC));
+    for (ac = 0; ac < WIFI_NUM_ACS; ac++) {
+        u32 got = wifi_test_mixed.n[ac];
+
+        // Every flow was classified into its own AC
+        KUNIT_EXPECT_EQ(test, got, (u32)WIFI_TEST_MIX_PKTS);
+        if (!got)
+            continue;
+        kunit_info(test, "%s %u frames, %llu Mbit/s until its last frame\n",
+                   wifi_test_mix[ac].name, got,
+                   div64_u64(wifi_test_mixed.bytes[ac] * 8 * NSEC_PER_USEC,
+                             max(wifi_test_mixed.last[ac] - start, 1ULL)));
+        wifi_test_report_us(test, wifi_test_mix[ac].name, wifi_test_mixed.lat[ac],
+                            min_t(u32, got, WIFI_TEST_MIX_PKTS));
+    }
+    // The point of the weights: voice waits less than background
+    if (wifi_test_mixed.n[WIFI_AC_VO] && wifi_test_mixed.n[WIFI_AC_BK])
+        KUNIT_EXPECT_LT(test, wifi_test_mixed.lat[WIFI_AC_VO][WIFI_TEST_MIX_PKTS / 2],
+                        wifi_test_mixed.lat[WIFI_AC_BK][WIFI_TEST_MIX_PKTS / 2]);
+}
+
+// ─────────────────────────────────────────
+// TX fragmentation
+// ─────────────────────────────────────────
+// A @len byte frame to wifi_test_peer with @headlen bytes in the head and
+// the rest in page frags, every byte different from its neighbours
+static struct sk_buff *wifi_test_tx_frame(unsigned int len, unsigned int headlen)
+{
+    unsigned int off, chunk, i;
+    struct sk_buff *skb;
+    struct page *page;
+    u8 *p;
+
+    skb = alloc_skb(WIFI_FRAG_HEADROOM + headlen, GFP_KERNEL);
+    if (!skb)
+        return NULL;
+    skb_reserve(skb, WIFI_FRAG_HEADROOM);
+    p = skb_put(skb, headlen);
+    for (i = 0; i < headlen; i++)
+        p[i] = i;
+    for (off = headlen; off < len; off += chunk) {
+        chunk = min_t(unsigned int, len - off, PAGE_SIZE);
+        page = alloc_page(GFP_KERNEL);
+        if (!page) {
+            kfree_skb(skb);
+            return NULL;
+        }
+        p = page_address(page);
+        for (i = 0; i < chunk; i++)
+            p[i] = off + i;
+        skb_add_rx_frag(skb, skb_shinfo(skb)->nr_frags, page, 0, chunk, PAGE_SIZE);
+    }
+    ether_addr_copy(skb->data, wifi_test_peer);
+    skb->priority = 5;
+    skb_set_queue_mapping(skb, WIFI_AC_VI);
+    return skb;
+}
+
+// @frags must be the bytes of @ref cut every @thresh, in order, with the
+// 802.11 fields of one MSDU
+static void wifi_test_check_frags(struct kunit *test, struct sk_buff_head *frags,
+                                  const u8 *ref, unsigned int len, unsigned int thresh)
+{
+    unsigned int n = DIV_ROUND_UP(len, thresh), off = 0, want;
+    struct wifi_skb_cb *cb;
+    struct sk_buff *skb;
+    u8 frag = 0, *buf;
+    u16 seq;
+
+    KUNIT_ASSERT_EQ(test, skb_queue_len(frags), n);
+    buf = kunit_kmalloc(test, thresh, GFP_KERNEL);
+    KUNIT_ASSERT_NOT_NULL(test, buf);
+    seq = WIFI_SKB_CB(skb_peek(frags))->seq;
+
+    skb_queue_walk(frags, skb) {
+        cb = WIFI_SKB_CB(skb);
+        want = min(len - off, thresh);
+        KUNIT_EXPECT_EQ(test, skb->len, want);
+        KUNIT_EXPECT_EQ(test, cb->len, want);
+        KUNIT_EXPECT_EQ(test, cb->seq, seq);
+        KUNIT_EXPECT_EQ(test, cb->frag, frag);
+        KUNIT_EXPECT_EQ(test, cb->more_frags, frag < n - 1);
+        KUNIT_EXPECT_EQ(test, cb->tid, 5);
+        KUNIT_EXPECT_MEMEQ(test, cb->a3, wifi_test_peer, ETH_ALEN);
+        KUNIT_EXPECT_EQ(test, skb_get_queue_mapping(skb), WIFI_AC_VI);
+        KUNIT_ASSERT_EQ(test, skb_copy_bits(skb, 0, buf, want), 0);
+        KUNIT_EXPECT_MEMEQ(test, buf, ref + off, want);
+        off += want;
+        frag++;
+    }
+}
+
+// Splits land every threshold bytes wherever the head ends: in it, on a
+// fragment boundary, or with the payload all in page frags
+static void wifi_test_tx_frag_split(struct kunit *test)
+{
+    static const struct {
+        unsigned int len, headlen, thresh;
+    } cases[] = {
+        { 256, 256, 256 },      // At the threshold: not fragmented
+        { 257, 257, 256 },      // One byte over: a 1 byte last fragment
+        { 1514, 1514, 256 },    // Linear
+        { 1514, 64, 256 },      // Only the headers in the head
+        { 1514, 300, 256 },     // Head ends inside the second fragment
+        { 1514, 512, 256 },     // Head ends on a fragment boundary
+        { 8000, 100, 512 },     // Fragments spanning page frags
+        { 4096, 4096, 256 },    // WIFI_MAX_FRAGS exactly
+    };
+    struct wifi_device *dev = test->priv;
+    struct sk_buff_head frags;
+    struct sk_buff *skb;
+    u16 seq = dev->tx_seq;
+    u8 *ref;
+    int i;
+
+    __skb_queue_head_init(&frags);
+    for (i = 0; i < ARRAY_SIZE(cases); i++) {
+        kunit_info(test, "len %u head %u threshold %u\n",
+                   cases[i].len, cases[i].headlen, cases[i].thresh);
+        skb = wifi_test_tx_frame(cases[i].len, cases[i].headlen);
+        KUNIT_ASSERT_NOT_NULL(test, skb);
+        ref = kunit_kmalloc(test, cases[i].len, GFP_KERNEL);
+        KUNIT_ASSERT_NOT_NULL(test, ref);
+        KUNIT_ASSERT_EQ(test, skb_copy_bits(skb, 0, ref, cases[i].len), 0);
+
+        KUNIT_ASSERT_EQ(test, wifi_core_set_frag_threshold(dev, cases[i].thresh), 0);
+        KUNIT_ASSERT_EQ(test, wifi_tx_fragment(dev, skb, &frags), 0);
+        wifi_test_check_frags(test, &frags, ref, cases[i].len, cases[i].thresh);
+        // One sequence number per MSDU
+        KUNIT_EXPECT_EQ(test, WIFI_SKB_CB(skb_peek(&frags))->seq, seq++ & 0xfff);
+        __skb_queue_purge(&frags);
+    }
+    KUNIT_EXPECT_EQ(test, wifi_test_drops(dev, WIFI_DROP_FRAG), 0ULL);
+}
+
+// Fragmenting a clone leaves the original, which shares its data, whole
+static void wifi_test_tx_frag_clone(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    struct sk_buff *skb, *clone;
+    struct sk_buff_head frags;
+    u8 *ref, *buf;
+
+    skb = wifi_test_tx_frame(1514, 64);
+    KUNIT_ASSERT_NOT_NULL(test, skb);
+    ref = kunit_kmalloc(test, 1514, GFP_KERNEL);
+    buf = kunit_kmalloc(test, 1514, GFP_KERNEL);
+    KUNIT_ASSERT_NOT_NULL(test, ref);
+    KUNIT_ASSERT_NOT_NULL(test, buf);
+    KUNIT_ASSERT_EQ(test, skb_copy_bits(skb, 0, ref, 1514), 0);
+    clone = skb_clone(skb, GFP_KERNEL);
+    KUNIT_ASSERT_NOT_NULL(test, clone);
+
+    __skb_queue_head_init(&frags);
+    KUNIT_ASSERT_EQ(test, wifi_core_set_frag_threshold(dev, 512), 0);
+    KUNIT_ASSERT_EQ(test, wifi_tx_fragment(dev, clone, &frags), 0);
+    wifi_test_check_frags(test, &frags, ref, 1514, 512);
+    __skb_queue_purge(&frags);
+
+    KUNIT_EXPECT_EQ(test, skb->len, 1514U);
+    KUNIT_ASSERT_EQ(test, skb_copy_bits(skb, 0, buf, 1514), 0);
+    KUNIT_EXPECT_MEMEQ(test, buf, ref, 1514);
+    kfree_skb(skb);
+}
+
+// More than WIFI_MAX_FRAGS fragments can't be numbered: the frame is
+// dropped whole and counted
+static void wifi_test_tx_frag_too_many(struct kunit *test)
+{
+    struct wifi_device *dev = test->priv;
+    struct sk_buff_head frags;
+    struct sk_buff *skb;
+
+    skb = wifi_test_tx_frame(WIFI_MAX_FRAGS * 256 + 1, 64);
+    KUNIT_ASSERT_NOT_NULL(test, skb);
+    __skb_queue_head_init(&frags);
+    KUNIT_ASSERT_EQ(test, wifi_core_set_frag_threshold(dev, 256), 0);
+    KUNIT_EXPECT_EQ(test, wifi_tx_fragment(dev, skb, &frags), -ENOMEM);
+    KUNIT_EXPECT_TRUE(test, skb_queue_empty(&frags));
+    KUNIT_EXPECT_EQ(test, wifi_test_drops(dev, WIFI_DROP_FRAG), 1ULL);
+}
+
+static struct sk_buff_head wifi_test_captured;
+
+// Runs in tx_work only; the test reads the frames once they're all in
+static int wifi_test_capture_bulk(void *mac_ctx, struct sk_buff_head *list)
+{
+    int n = skb_queue_len(list);
+
+    skb_queue_splice_tail_init(list, &wifi_test_captured);
+    atomic_add(n, &wifi_test_tx_done);
+    wake_up_var(&wifi_test_tx_done);
+    return n;
+}
+
+// PN from the CCMP header at the front of an encrypted frame:
+// PN0 PN1 reserved key-ID PN2 PN3 PN4 PN5
+static u64 wifi_test_pn(const struct sk_buff *skb)
+{
+    const u8 *h = skb->data;
+
+    return (u64)h[0] | (u64)h[1] << 8 | (u64)h[4] << 16 |
+           (u64)h[5] << 24 | (u64)h[6] << 32 | (u64)h[7] << 40;
+}
+
+// Through wifi_core_tx() and CCMP, the fragments of each MSDU go out in
+// order with consecutive PNs, as the receiver's reassembly requires
+static void wifi_test_tx_frag_pn(struct kunit *test)
+{
+    const int msdus = 4, per_msdu = DIV_ROUND_UP(1014, 256);
+    struct wifi_device *dev = test->priv;
+    struct wifi_bss_info bss;
+    struct wifi_skb_cb *cb;
+    struct sk_buff *skb;
+    u64 pn = 0;
+    int i;
+
+    kunit_activate_static_stub(test, mac_associate, wifi_test_associate);
+    kunit_activate_static_stub(test, mac_tx_submit_bulk, wifi_test_capture_bulk);
+    __skb_queue_head_init(&wifi_test_captured);
+    atomic_set(&wifi_test_tx_done, 0);
+
+    wpa_set_own_addr(dev->sec_ctx, wifi_test_own);
+    wifi_test_bss(&bss, 1, 36, "frag");
+    if (wifi_core_connect(dev, &bss))
+        kunit_skip(test, "can't connect (no ccm(aes)?)");
+    KUNIT_ASSERT_EQ(test, wifi_core_set_frag_threshold(dev, 256), 0);
+
+    for (i = 0; i < msdus; i++) {
+        skb = wifi_test_tx_frame(1014, i % 2 ? 64 : 1014);
+        KUNIT_ASSERT_NOT_NULL(test, skb);
+        wifi_core_tx(dev, skb);
+    }
+    wait_var_event_timeout(&wifi_test_tx_done,
+                           atomic_read(&wifi_test_tx_done) >= msdus * per_msdu, 10 * HZ);
+    flush_workqueue(dev->tx_wq);
+    KUNIT_ASSERT_EQ(test, skb_queue_len(&wifi_test_captured), (u32)(msdus * per_msdu));
+
+    i = 0;
+    skb_queue_walk(&wifi_test_captured, skb) {
+        cb = WIFI_SKB_CB(skb);
+        KUNIT_EXPECT_EQ(test, cb->frag, i % per_msdu);
+        KUNIT_EXPECT_EQ(test, cb->more_frags, i % per_msdu < per_msdu - 1);
+        KUNIT_EXPECT_EQ(test, wifi_test_pn(skb), ++pn);
+        i++;
+    }
+    __skb_queue_purge(&wifi_test_captured);
+}
+
+// Full-size frames, half of them with the payload in a page frag, through
+// wifi_core_tx() and CCMP at each threshold: MSDUs per second, fragments
+// and slab allocations per MSDU
+static void wifi_test_bench_frag(struct kunit *test)
+{
+    static const u32 thresholds[] = { 0, 256, 512, 1024, 2346 };
+    const unsigned int len = ETH_HLEN + WIFI_TEST_BENCH_LEN;
+    const int n = WIFI_TEST_FRAG_PKTS;
+    struct wifi_device *dev = test->priv;
+    struct wifi_stats before, after;
+    unsigned long allocs;
+    struct wifi_bss_info bss;
+    struct sk_buff_head pkts;
+    struct sk_buff *skb;
+    int i, t, per_msdu;
+    u64 start, ns;
+    bool counting;
+
+    kunit_activate_static_stub(test, mac_associate, wifi_test_associate);
+    kunit_activate_static_stub(test, mac_tx_submit_bulk, wifi_test_submit_bulk);
+    wpa_set_own_addr(dev->sec_ctx, wifi_test_own);
+    wifi_test_bss(&bss, 1, 36, "bench");
+    if (wifi_core_connect(dev, &bss))
+        kunit_skip(test, "can't connect (no ccm(aes)?)");
+
+    __skb_queue_head_init(&pkts);
+    for (t = 0; t < ARRAY_SIZE(thresholds); t++) {
+        KUNIT_ASSERT_EQ(test, wifi_core_set_frag_threshold(dev, thresholds[t]), 0);
+        per_msdu = thresholds[t] ? DIV_ROUND_UP(len, thresholds[t]) : 1;
+
+        for (i = 0; i < n; i++) {
+            skb = wifi_test_tx_frame(len, i % 2 ? ETH_HLEN + 64 : len);
+            if (!skb) {
+                KUNIT_FAIL(test, "out of memory after %d frames", i);
+                __skb_queue_purge(&pkts);
+                return;
+            }
+            __skb_queue_tail(&pkts, skb);
+        }
+
+        atomic_set(&wifi_test_tx_done, 0);
+        wifi_core_get_stats(dev, &before);
+        counting = wifi_test_allocs_start();
+        start = ktime_get_ns();
+        while ((skb = __skb_dequeue(&pkts)))
+            wifi_core_tx(dev, skb);
+        wait_var_event_timeout(&wifi_test_tx_done,
+                               atomic_read(&wifi_test_tx_done) >= n * per_msdu, 10 * HZ);
+        ns = ktime_get_ns() - start;
+        if (counting)
+            wifi_test_allocs_stop();
+        allocs = atomic_long_read(&wifi_test_allocs);
+        flush_workqueue(dev->tx_wq);
+
+        wifi_core_get_stats(dev, &after);
+        KUNIT_EXPECT_EQ(test, atomic_read(&wifi_test_tx_done), n * per_msdu);
+        KUNIT_EXPECT_EQ(test, after.tx_packets - before.tx_packets, (u64)n);
+        KUNIT_EXPECT_EQ(test, after.tx_dropped - before.tx_dropped, 0ULL);
+
+        kunit_info(test, "threshold %4u: %d fragments/MSDU, %llu MSDU/s\n",
+                   thresholds[t], per_msdu,
+                   div64_u64((u64)n * NSEC_PER_SEC, max(ns, 1ULL)));
+        if (counting)
+            kunit_info(test, "                %lu.%02lu slab allocations per MSDU\n",
+                       allocs / n, allocs % n * 100 / n);
+    }
+}
+
+// ─────────────────────────────────────────
+// Firmware reset under traffic
+// ─────────────────────────────────────────
+// Fault injection: warm resets while a thread keeps TX and RX frames coming.
+// Every frame carries a destructor, so each one must be either handed on
+// (MAC stub, stack) or counted as a drop, and freed exactly once, and the
+// connection and config must come back as they were.
+#define WIFI_TEST_RESETS        8
+#define WIFI_TEST_RESET_GAP     256     // Frames each way between resets
+
+struct wifi_test_traffic {
+    struct wifi_device *dev;
+    int                 tx;     // Frames given to wifi_core_tx()
+    int                 rx;     // Frames given to wifi_core_rx()
+};
+
+static const u8 wifi_test_fw_image[64];
+static atomic_t wifi_test_freed;
+
+static void wifi_test_traffic_free(struct sk_buff *skb)
+{
+    atomic_inc(&wifi_test_freed);
+}
+
+static struct sk_buff *wifi_test_traffic_frame(bool tx)
+{
+    struct sk_buff *skb;
+    struct ethhdr *eth;
+
+    skb = alloc_skb(WIFI_FRAG_HEADROOM + ETH_HLEN + WIFI_TEST_FRAG_LEN + 16,
+                    GFP_KERNEL);
+    if (!skb)
+        return NULL;
+    skb_reserve(skb, WIFI_FRAG_HEADROOM);
+    eth = skb_put_zero(skb, ETH_HLEN + WIFI_TEST_FRAG_LEN);
+    ether_addr_copy(eth->h_dest, tx ? wifi_test_peer : wifi_test_own);
+    ether_addr_copy(eth->h_source, tx ? wifi_test_own : wifi_test_peer);
+    // Not IP: nothing but wifi_test_rx_rcv() takes it, and GRO leaves it be
+    eth->h_proto = htons(ETH_P_802_EX1);
+
+    memset(WIFI_SKB_CB(skb), 0, sizeof(struct wifi_skb_cb));
+    ether_addr_copy(WIFI_SKB_CB(skb)->addr, wifi_test_peer);
+    skb->destructor = wifi_test_traffic_free;
+    return skb;
+}
+
+static int wifi_test_traffic_thread(void *data)
+{
+    struct wifi_test_traffic *t = data;
+    struct wifi_device *dev = t->dev;
+    struct sk_buff *skb;
+
+    while (!kthread_should_stop()) {
+        // Back off while the queue is stopped, as the stack would
+        if (!__netif_subqueue_stopped(dev->netdev, WIFI_AC_BE) &&
+            (skb = wifi_test_traffic_frame(true))) {
+            wifi_core_tx(dev, skb);
+            t->tx++;
+        }
+        skb = wifi_test_traffic_frame(false);
+        if (skb) {
+            // As from the RX interrupt
+            local_bh_disable();
+            wifi_core_rx(dev, skb);
+            local_bh_enable();
+            t->rx++;
+        }
+        cond_resched();
+    }
+    return 0;
+}
+
+static void wifi_test_fw_reset_traffic(struct kunit *test)
+{
+    struct packet_type pt = {
+        .type   = htons(ETH_P_802_EX1),
+        .func   = wifi_test_rx_rcv,
+    };
+    struct wifi_device *dev = test->priv;
+    struct wifi_test_traffic t = { .dev = dev };
+    struct wifi_stats before, after;
+    struct wifi_config config;
+    struct wifi_bss_info bss;
+    struct task_struct *task;
+    struct firmware *fw;
+    u64 tx_drops, rx_drops;
+    int i, mark;
+
+    wifi_test_rx_netdev(test, dev);
+    kunit_activate_static_stub(test, mac_associate, wifi_test_associate);
+    kunit_activate_static_stub(test, mac_tx_submit_bulk, wifi_test_submit_bulk);
+    atomic_set(&wifi_test_tx_done, 0);
+    atomic_set(&wifi_test_rx_skbs, 0);
+    atomic_set(&wifi_test_rx_segs, 0);
+    atomic_set(&wifi_test_freed, 0);
+
+    // Open, so RX frames need no encryption to get through
+    wifi_test_bss(&bss, 1, 36, "reset");
+    bss.security = WIFI_SEC_OPEN;
+    KUNIT_ASSERT_EQ(test, wifi_core_connect(dev, &bss), 0);
+    KUNIT_ASSERT_EQ(test, wifi_core_set_tx_power(dev, 17), 0);
+    KUNIT_ASSERT_EQ(test, wifi_core_set_frag_threshold(dev, 1024), 0);
+    config = dev->config;
+
+    // The cached image a warm reset reuses; taken back below, before
+    // wifi_core_deinit() would release_firmware() it
+    fw = kunit_kzalloc(test, sizeof(*fw), GFP_KERNEL);
+    KUNIT_ASSERT_NOT_NULL(test, fw);
+    fw->data = wifi_test_fw_image;
+    fw->size = sizeof(wifi_test_fw_image);
+    strscpy(dev->fw_path, "wifi_test.bin", sizeof(dev->fw_path));
+
+    pt.dev = dev->netdev;
+    dev_add_pack(&pt);
+    wifi_core_get_stats(dev, &before);
+    task = kthread_run(wifi_test_traffic_thread, &t, "wifi_traffic");
+    if (IS_ERR(task)) {
+        dev_remove_pack(&pt);
+        KUNIT_FAIL(test, "can't start the traffic thread: %pe", task);
+        return;
+    }
+    mutex_lock(&dev->fw_lock);
+    dev->fw = fw;
+    mutex_unlock(&dev->fw_lock);
+
+    for (i = 0; i < WIFI_TEST_RESETS; i++) {
+        // Traffic flows both ways before each reset, and again after the last
+        mark = (i + 1) * WIFI_TEST_RESET_GAP;
+        if (!wait_var_event_timeout(&wifi_test_tx_done,
+                                    atomic_read(&wifi_test_tx_done) >= mark, HZ) ||
+            !wait_var_event_timeout(&wifi_test_rx_segs,
+                                    atomic_read(&wifi_test_rx_segs) >= mark, HZ)) {
+            KUNIT_FAIL(test, "traffic stalled before reset %d", i);
+            break;
+        }
+        KUNIT_EXPECT_EQ(test, wifi_core_fw_reset(dev), 0);
+    }
+    mark = (i + 1) * WIFI_TEST_RESET_GAP;
+    if (i == WIFI_TEST_RESETS &&
+        (!wait_var_event_timeout(&wifi_test_tx_done,
+                                 atomic_read(&wifi_test_tx_done) >= mark, HZ) ||
+         !wait_var_event_timeout(&wifi_test_rx_segs,
+                                 atomic_read(&wifi_test_rx_segs) >= mark, HZ)))
+        KUNIT_FAIL(test, "traffic stalled after the last reset");
+    kthread_stop(task);
+
+    // Drops are counted as frames are refused, so all that's left in flight
+    // is on its way to the MAC stub or the stack
+    wifi_core_get_stats(dev, &after);
+    tx_drops = after.tx_dropped - before.tx_dropped;
+    rx_drops = after.rx_dropped - before.rx_dropped;
+    wait_var_event_timeout(&wifi_test_tx_done,
+                           atomic_read(&wifi_test_tx_done) + tx_drops >= t.tx, 10 * HZ);
+    wait_var_event_timeout(&wifi_test_rx_segs,
+                           atomic_read(&wifi_test_rx_segs) + rx_drops >= t.rx, 10 * HZ);
+    dev_remove_pack(&pt);
+
+    KUNIT_EXPECT_EQ(test, atomic_read(&wifi_test_tx_done) + tx_drops, (u64)t.tx);
+    KUNIT_EXPECT_EQ(test, atomic_read(&wifi_test_rx_segs) + rx_drops, (u64)t.rx);
+    KUNIT_EXPECT_EQ(test, atomic_read(&wifi_test_freed), t.tx + t.rx);
+
+    mutex_lock(&dev->fw_lock);
+    KUNIT_EXPECT_EQ(test, dev->fw_resets, (u32)WIFI_TEST_RESETS);
+    KUNIT_EXPECT_PTR_EQ(test, dev->fw, (const struct firmware *)fw);
+    dev->fw = NULL;
+    mutex_unlock(&dev->fw_lock);
+    KUNIT_EXPECT_EQ(test, dev->state, WIFI_STATE_CONNECTED);
+    KUNIT_EXPECT_MEMEQ(test, dev->cur_bss.bssid, bss.bssid, ETH_ALEN);
+    KUNIT_EXPECT_MEMEQ(test, &dev->config, &config, sizeof(config));
+    KUNIT_EXPECT_FALSE(test, READ_ONCE(dev->dp_paused));
+
+    kunit_info(test, "%u resets, %d TX / %d RX frames, %llu / %llu dropped\n",
+               dev->fw_resets, t.tx, t.rx, tx_drops, rx_drops);
+    kunit_info(test, "recovered in %llu us last, %llu us max\n",
+               div_u64(dev->fw_recover_ns_last, NSEC_PER_USEC),
+               div_u64(dev->fw_recover_ns_max, NSEC_PER_USEC));
+}
+
+static struct kunit_case wifi_core_test_cases[] = {
+    KUNIT_CASE(wifi_test_drr_weights),
+    KUNIT_CASE(wifi_test_drr_idle),
+    KUNIT_CASE(wifi_test_defrag_in_order),
+    KUNIT_CASE(wifi_test_defrag_pn_gap),
+    KUNIT_CASE(wifi_test_defrag_mixed),
+    KUNIT_CASE(wifi_test_defrag_flush),
+    KUNIT_CASE(wifi_test_bss_lookup),
+    KUNIT_CASE(wifi_test_bss_refresh),
+    KUNIT_CASE(wifi_test_bss_capacity),
+    KUNIT_CASE_SLOW(wifi_test_bench_bss),
+    KUNIT_CASE_SLOW(wifi_test_bench_tx),
+    KUNIT_CASE_SLOW(wifi_test_bench_rx),
+    KUNIT_CASE_SLOW(wifi_test_bench_stats),
+    KUNIT_CASE(wifi_test_roam_hysteresis),
+    KUNIT_CASE(wifi_test_roam_rate_limit),
+    KUNIT_CASE(wifi_test_roam_user_scan),
+    KUNIT_CASE(wifi_test_roam_fallback),
+    KUNIT_CASE_SLOW(wifi_test_bench_roam),
+    KUNIT_CASE_SLOW(wifi_test_bench_mixed),
+    KUNIT_CASE(wifi_test_tx_frag_split),
+    KUNIT_CASE(wifi_test_tx_frag_clone),
+    KUNIT_CASE(wifi_test_tx_frag_too_many),
+    KUNIT_CASE(wifi_test_tx_frag_pn),
+    KUNIT_CASE_SLOW(wifi_test_bench_frag),
+    KUNIT_CASE_SLOW(wifi_test_fw_reset_traffic),
+    {}
+};
+
+static struct kunit_suite wifi_core_test_suite = {
+    .name = "wifi_core",
+    .init = wifi_test_init,
+    .exit = wifi_test_exit,
+    .test_cases = wifi_core_test_cases,
+};
+kunit_test_suite(wifi_core_test_suite);
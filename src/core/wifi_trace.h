@@ -0,0 +1,137 @@
+// wifi_trace.h
+// Static tracepoints for the wifi_core data path, scan and connect
+//
+// Enable with e.g. "echo 1 > /sys/kernel/tracing/events/wifi_core/enable".
+// TX: wifi_tx_enqueue -> wifi_tx_dequeue -> wifi_tx_encrypt -> wifi_tx_submit
+// RX: wifi_rx_receive -> wifi_rx_decrypt -> wifi_rx_deliver
+
+#undef TRACE_SYSTEM
+#define TRACE_SYSTEM wifi_core
+
+#if !defined(WIFI_TRACE_H) || defined(TRACE_HEADER_MULTI_READ)
+#define WIFI_TRACE_H
+
+#include <linux/tracepoint.h>
+#include <linux/skbuff.h>
+#include "../../include/wifi_types.h"
+
+DECLARE_EVENT_CLASS(wifi_skb_class,
+    TP_PROTO(const struct sk_buff *skb),
+    TP_ARGS(skb),
+    TP_STRUCT__entry(
+        __field(const void *, skbaddr)
+        __field(u32, len)
+        __field(u16, queue)
+    ),
+    TP_fast_assign(
+        __entry->skbaddr = skb;
+        __entry->len = skb->len;
+        __entry->queue = skb_get_queue_mapping(skb);
+    ),
+    TP_printk("skbaddr=%p len=%u queue=%u",
+              __entry->skbaddr, __entry->len, __entry->queue)
+);
+
+DEFINE_EVENT(wifi_skb_class, wifi_tx_enqueue,
+    TP_PROTO(const struct sk_buff *skb), TP_ARGS(skb));
+DEFINE_EVENT(wifi_skb_class, wifi_tx_dequeue,
+    TP_PROTO(const struct sk_buff *skb), TP_ARGS(skb));
+DEFINE_EVENT(wifi_skb_class, wifi_tx_submit,
+    TP_PROTO(const struct sk_buff *skb), TP_ARGS(skb));
+DEFINE_EVENT(wifi_skb_class, wifi_rx_receive,
+    TP_PROTO(const struct sk_buff *skb), TP_ARGS(skb));
+DEFINE_EVENT(wifi_skb_class, wifi_rx_deliver,
+    TP_PROTO(const struct sk_buff *skb), TP_ARGS(skb));
+
+// @ret: 0 done, -EINPROGRESS handed to an async engine, else dropped
+DECLARE_EVENT_CLASS(wifi_crypto_class,
+    TP_PROTO(const struct sk_buff *skb, int ret),
+    TP_ARGS(skb, ret),
+    TP_STRUCT__entry(
+        __field(const void *, skbaddr)
+        __field(u32, len)
+        __field(int, ret)
+    ),
+    TP_fast_assign(
+        __entry->skbaddr = skb;
+        __entry->len = skb->len;
+        __entry->ret = ret;
+    ),
+    TP_printk("skbaddr=%p len=%u ret=%d",
+              __entry->skbaddr, __entry->len, __entry->ret)
+);
+
+DEFINE_EVENT(wifi_crypto_class, wifi_tx_encrypt,
+    TP_PROTO(const struct sk_buff *skb, int ret), TP_ARGS(skb, ret));
+DEFINE_EVENT(wifi_crypto_class, wifi_rx_decrypt,
+    TP_PROTO(const struct sk_buff *skb, int ret), TP_ARGS(skb, ret));
+
+TRACE_EVENT(wifi_scan_start,
+    TP_PROTO(u8 n_channels),
+    TP_ARGS(n_channels),
+    TP_STRUCT__entry(
+        __field(u8, n_channels)
+    ),
+    TP_fast_assign(
+        __entry->n_channels = n_channels;
+    ),
+    TP_printk("n_channels=%u", __entry->n_channels)
+);
+
+TRACE_EVENT(wifi_scan_result,
+    TP_PROTO(const struct wifi_bss_info *info),
+    TP_ARGS(info),
+    TP_STRUCT__entry(
+        __array(u8, bssid, 6)
+        __field(s32, rssi)
+        __field(u32, channel)
+    ),
+    TP_fast_assign(
+        memcpy(__entry->bssid, info->bssid, 6);
+        __entry->rssi = info->rssi;
+        __entry->channel = info->channel;
+    ),
+    TP_printk("bssid=%pM rssi=%d channel=%u",
+              __entry->bssid, __entry->rssi, __entry->channel)
+);
+
+TRACE_EVENT(wifi_scan_done,
+    TP_PROTO(u32 bss_count, bool roaming),
+    TP_ARGS(bss_count, roaming),
+    TP_STRUCT__entry(
+        __field(u32, bss_count)
+        __field(bool, roaming)
+    ),
+    TP_fast_assign(
+        __entry->bss_count = bss_count;
+        __entry->roaming = roaming;
+    ),
+    TP_printk("bss_count=%u roaming=%d", __entry->bss_count, __entry->roaming)
+);
+
+DECLARE_EVENT_CLASS(wifi_connect_class,
+    TP_PROTO(const struct wifi_bss_info *bss, int ret),
+    TP_ARGS(bss, ret),
+    TP_STRUCT__entry(
+        __array(u8, bssid, 6)
+        __field(int, ret)
+    ),
+    TP_fast_assign(
+        memcpy(__entry->bssid, bss->bssid, 6);
+        __entry->ret = ret;
+    ),
+    TP_printk("bssid=%pM ret=%d", __entry->bssid, __entry->ret)
+);
+
+DEFINE_EVENT(wifi_connect_class, wifi_connect_auth,
+    TP_PROTO(const struct wifi_bss_info *bss, int ret), TP_ARGS(bss, ret));
+DEFINE_EVENT(wifi_connect_class, wifi_connect_assoc,
+    TP_PROTO(const struct wifi_bss_info *bss, int ret), TP_ARGS(bss, ret));
+
+#endif /* WIFI_TRACE_H */
+
+#undef TRACE_INCLUDE_PATH
+#define TRACE_INCLUDE_PATH src/core
+#undef TRACE_INCLUDE_FILE
+#define TRACE_INCLUDE_FILE wifi_trace
+#include <trace/define_trace.h>
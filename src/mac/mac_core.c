@@ -4,6 +4,11 @@
 
 #include <linux/kernel.h>
 #include <linux/skbuff.h>
+#include <linux/if_vlan.h>
+#include <linux/ip.h>
+#include <linux/ipv6.h>
+#include <net/dsfield.h>
+#include <kunit/static_stub.h>
 #include "mac_core.h"
 #include "../cfg80211/cfg_ops.h"    // mac → cfg (another dependency)
 
@@ -16,11 +21,16 @@ struct mac_context {
     bool qos_enabled;
     u32  tx_power;
     bool power_save;
+    u32  tx_pending;    // Descriptors posted since the last doorbell
 };
 
 int mac_associate(void *mac_ctx, struct wifi_bss_info *bss)
 {
     struct mac_context *ctx = mac_ctx;
+
+    // No hardware under KUnit: the wifi_core tests stand in for the MAC
+    KUNIT_STATIC_STUB_REDIRECT(mac_associate, mac_ctx, bss);
+
     if (!ctx || !bss)
         return -EINVAL;
 
@@ -46,18 +56,106 @@ int mac_disassociate(void *mac_ctx)
     return 0;
 }
 
-int mac_tx_submit(void *mac_ctx, struct sk_buff *skb)
+// Post one descriptor; only ring the doorbell when no more frames follow
+// (xmit_more-style coalescing).
+static void mac_tx_post(struct mac_context *ctx, struct sk_buff *skb, bool more)
 {
-    // Would submit to HW ring buffer
+    // Would write a descriptor to the HW ring buffer
     pr_debug("mac: TX submit len=%u\n", skb->len);
     dev_kfree_skb(skb);
+
+    if (!ctx)
+        return;
+    ctx->tx_pending++;
+    if (!more) {
+        // Would write the ring's tail pointer register here
+        pr_debug("mac: TX doorbell, %u frames\n", ctx->tx_pending);
+        ctx->tx_pending = 0;
+    }
+}
+
+int mac_tx_submit(void *mac_ctx, struct sk_buff *skb)
+{
+    mac_tx_post(mac_ctx, skb, false);
     return 0;
 }
 
-void mac_set_qos_tag(void *mac_ctx, struct sk_buff *skb)
+// Submits every skb on @list (which is left empty) with a single doorbell.
+int mac_tx_submit_bulk(void *mac_ctx, struct sk_buff_head *list)
 {
-    // Set QoS TID based on DSCP
-    // skb->priority = ...
+    struct sk_buff *skb;
+    int n = 0;
+
+    KUNIT_STATIC_STUB_REDIRECT(mac_tx_submit_bulk, mac_ctx, list);
+
+    while ((skb = __skb_dequeue(list))) {
+        mac_tx_post(mac_ctx, skb, !skb_queue_empty(list));
+        n++;
+    }
+    return n;
+}
+
+// DSCP → 802.1d user priority (= TID), per RFC 8325. Unlisted code points
+// are best effort.
+static const u8 mac_dscp_to_up[64] = {
+    [8]             = 1,    // CS1: background
+    [18] = 3, [20] = 3, [22] = 3,      // AF2x
+    [24 ... 31]     = 4,    // CS3, AF3x
+    [32 ... 39]     = 4,    // CS4, AF4x
+    [40]            = 5,    // CS5
+    [44]            = 6,    // VOICE-ADMIT
+    [46]            = 6,    // EF
+    [48]            = 7,    // CS6
+    [56]            = 7,    // CS7
+};
+
+// 802.1d user priority → WMM access category
+static const u8 mac_up_to_ac[8] = {
+    WIFI_AC_BE, WIFI_AC_BK, WIFI_AC_BK, WIFI_AC_BE,
+    WIFI_AC_VI, WIFI_AC_VI, WIFI_AC_VO, WIFI_AC_VO,
+};
+
+u8 mac_tid_to_ac(u8 tid)
+{
+    return mac_up_to_ac[tid & 7];
+}
+
+static u8 mac_skb_dscp(struct sk_buff *skb)
+{
+    int off = skb_network_offset(skb);
+
+    switch (skb->protocol) {
+    case htons(ETH_P_IP): {
+        struct iphdr _iph, *iph;
+
+        iph = skb_header_pointer(skb, off, sizeof(_iph), &_iph);
+        return iph ? ipv4_get_dsfield(iph) >> 2 : 0;
+    }
+    case htons(ETH_P_IPV6): {
+        struct ipv6hdr _ip6h, *ip6h;
+
+        ip6h = skb_header_pointer(skb, off, sizeof(_ip6h), &_ip6h);
+        return ip6h ? ipv6_get_dsfield(ip6h) >> 2 : 0;
+    }
+    default:
+        return 0;
+    }
+}
+
+// Sets skb->priority to the frame's TID (VLAN PCP if tagged, else DSCP)
+// and its queue mapping to the matching AC, which is returned.
+u8 mac_set_qos_tag(void *mac_ctx, struct sk_buff *skb)
+{
+    u8 up;
+
+    if (skb_vlan_tag_present(skb))
+        up = skb_vlan_tag_get_prio(skb);
+    else
+        up = mac_dscp_to_up[mac_skb_dscp(skb)];
+
+    skb->priority = up;
+    skb_set_queue_mapping(skb, mac_up_to_ac[up]);
+    return mac_up_to_ac[up];
 }
 
 int mac_set_power_save(void *mac_ctx, bool enable)
@@ -6,12 +6,15 @@
 #include "../core/wifi_core.h"   // ← wifi_core.c includes this file... CYCLE!
 
 struct sk_buff;
+struct sk_buff_head;
 
 // MAC layer interface
 int  mac_associate(void *mac_ctx, struct wifi_bss_info *bss);
 int  mac_disassociate(void *mac_ctx);
 int  mac_tx_submit(void *mac_ctx, struct sk_buff *skb);
-void mac_set_qos_tag(void *mac_ctx, struct sk_buff *skb);
+int  mac_tx_submit_bulk(void *mac_ctx, struct sk_buff_head *list);
+u8   mac_set_qos_tag(void *mac_ctx, struct sk_buff *skb);
+u8   mac_tid_to_ac(u8 tid);
 int  mac_set_power_save(void *mac_ctx, bool enable);
 int  mac_set_tx_power(void *mac_ctx, u32 dbm);
 
@@ -8,11 +8,78 @@
 #include <linux/kernel.h>
 #include <linux/skbuff.h>
 #include <linux/random.h>
+#include <linux/slab.h>
+#include <linux/percpu.h>
+#include <linux/scatterlist.h>
+#include <linux/etherdevice.h>
+#include <linux/wait_bit.h>
+#include <crypto/aead.h>
 #include "wpa_handler.h"
 
 // wpa_handler dependencies:
 // wpa_handler → wifi_types (data only, no function deps)
 // No other dependencies! Clean leaf module.
+// (Async crypto completions go back through a callback the caller registers.)
+
+#define WPA_NUM_TIDS        8
+#define WPA_HDR_LEN         8       // CCMP/GCMP header: PN + key ID
+#define WPA_QOS_HDR_LEN     26      // 3-address QoS data frame header
+#define WPA_AAD_LEN         24      // FC + A1..A3 + SC + QC
+#define WPA_TK_OFFSET       32      // TK follows KCK + KEK in the PTK
+#define WPA_REPLAY_WINDOW   64
+#define WPA_REQS_PER_CPU    128     // A full TX batch and NAPI budget in flight
+#define WPA_MAX_SG          (MAX_SKB_FRAGS + 2)
+#define WPA_PMKSA_SIZE      8
+#define WPA_PMKSA_LIFETIME  (43200UL * HZ)  // dot11RSNAConfigPMKLifetime
+
+// wpa_context.flags
+#define WPA_FLAG_STARVED    0       // A caller found the request pool empty
+
+enum wpa_cipher {
+    WPA_CIPHER_NONE = 0,
+    WPA_CIPHER_CCMP_128,
+    WPA_CIPHER_GCMP_256,
+};
+
+struct wpa_context;
+struct wpa_pcpu_crypto;
+
+// One AEAD operation. Preallocated per CPU with the tfm's request size
+// appended, so the data path never allocates.
+struct wpa_crypto_req {
+    struct wpa_context      *ctx;
+    struct wpa_pcpu_crypto  *owner;
+    unsigned int             slot;
+    struct sk_buff          *skb;
+    u64                      pn;
+    u8                       tid;
+    bool                     encrypt;
+    u8                       aad_len;
+    u8                       aad[WPA_AAD_LEN];
+    u8                       iv[16];
+    struct scatterlist       sg[WPA_MAX_SG + 1];    // AAD + skb
+    struct aead_request      req;                   // Must be last
+};
+
+struct wpa_pcpu_crypto {
+    struct crypto_aead      *tfm;
+    struct wpa_crypto_req   *reqs[WPA_REQS_PER_CPU];
+    DECLARE_BITMAP(busy, WPA_REQS_PER_CPU);         // In-flight reqs
+    struct page_frag         pfrag;                 // MIC trailers (TX only)
+};
+
+struct wpa_replay {
+    u64 last_pn;
+    u64 bitmap;     // Bit n set: last_pn - n already received
+};
+
+// Cached PMK per AP, so reconnecting/roaming to it can skip SAE/EAP
+struct wpa_pmksa {
+    u8              bssid[ETH_ALEN];
+    u8              pmk[32];
+    unsigned long   expires;
+    bool            valid;
+};
 
 struct wpa_context {
     enum wifi_security  security_type;
@@ -20,35 +87,312 @@ struct wpa_context {
     u8                  ptk[64];    // Pairwise Transient Key
     u8                  gtk[32];    // Group Temporal Key
     bool                keys_installed;
+
+    u8                  own_addr[ETH_ALEN];
+    u8                  bssid[ETH_ALEN];
+    enum wpa_cipher     cipher;
+    unsigned int        authsize;   // MIC length for the cipher
+    struct wpa_pcpu_crypto __percpu *crypto;
+    enum wpa_cipher     crypto_cipher;  // What ->crypto was allocated for
+    atomic_t            inflight;   // Async operations not yet completed
+    atomic64_t          tx_pn[WPA_NUM_TIDS];
+    struct wpa_replay   rx_replay[WPA_NUM_TIDS];
+    spinlock_t          replay_lock;
+
+    wpa_crypto_done_t   done;
+    void               *done_priv;
+    wpa_crypto_resume_t resume;
+    void               *resume_priv;
+    unsigned long       flags;      // WPA_FLAG_*
+
+    // Only touched from the connect path (process context)
+    struct wpa_pmksa    pmksa[WPA_PMKSA_SIZE];
 };
 
+static void wpa_crypto_free(struct wpa_context *ctx);
+
+void *wpa_ctx_alloc(void)
+{
+    struct wpa_context *ctx = kzalloc(sizeof(*ctx), GFP_KERNEL);
+
+    if (ctx)
+        spin_lock_init(&ctx->replay_lock);
+    return ctx;
+}
+
+void wpa_ctx_free(void *sec_ctx)
+{
+    if (!sec_ctx)
+        return;
+    wpa_reset(sec_ctx);
+    wpa_crypto_free(sec_ctx);
+    kfree_sensitive(sec_ctx);
+}
+
+void wpa_set_own_addr(void *sec_ctx, const u8 *addr)
+{
+    struct wpa_context *ctx = sec_ctx;
+
+    if (ctx)
+        ether_addr_copy(ctx->own_addr, addr);
+}
+
+void wpa_set_crypto_done(void *sec_ctx, wpa_crypto_done_t done, void *priv)
+{
+    struct wpa_context *ctx = sec_ctx;
+
+    if (!ctx)
+        return;
+    ctx->done = done;
+    ctx->done_priv = priv;
+}
+
+void wpa_set_crypto_resume(void *sec_ctx, wpa_crypto_resume_t resume, void *priv)
+{
+    struct wpa_context *ctx = sec_ctx;
+
+    if (!ctx)
+        return;
+    ctx->resume = resume;
+    ctx->resume_priv = priv;
+}
+
+// Waits for in-flight async crypto; keys, PNs and the replay state are kept
+void wpa_quiesce(void *sec_ctx)
+{
+    struct wpa_context *ctx = sec_ctx;
+
+    if (ctx)
+        wait_var_event(&ctx->inflight, !atomic_read(&ctx->inflight));
+}
+
+static void wpa_crypto_free(struct wpa_context *ctx)
+{
+    int cpu, i;
+
+    if (!ctx->crypto)
+        return;
+
+    // Let async operations finish before their requests go away
+    wpa_quiesce(ctx);
+
+    for_each_possible_cpu(cpu) {
+        struct wpa_pcpu_crypto *pc = per_cpu_ptr(ctx->crypto, cpu);
+
+        for (i = 0; i < WPA_REQS_PER_CPU; i++)
+            kfree_sensitive(pc->reqs[i]);
+        crypto_free_aead(pc->tfm);
+        if (pc->pfrag.page)
+            put_page(pc->pfrag.page);
+    }
+    free_percpu(ctx->crypto);
+    ctx->crypto = NULL;
+}
+
+// Allocates a transform and WPA_REQS_PER_CPU requests for @cipher on every
+// CPU. Done once: they are kept across rekeys, disconnects and resets, so
+// connecting and roaming only set a key.
+static int wpa_crypto_alloc(struct wpa_context *ctx, enum wpa_cipher cipher)
+{
+    const char *alg = cipher == WPA_CIPHER_GCMP_256 ? "gcm(aes)" : "ccm(aes)";
+    unsigned int authsize = cipher == WPA_CIPHER_GCMP_256 ? 16 : 8;
+    int cpu, i, ret;
+
+    ctx->crypto = alloc_percpu(struct wpa_pcpu_crypto);
+    if (!ctx->crypto)
+        return -ENOMEM;
+
+    for_each_possible_cpu(cpu) {
+        struct wpa_pcpu_crypto *pc = per_cpu_ptr(ctx->crypto, cpu);
+
+        pc->tfm = crypto_alloc_aead(alg, 0, 0);
+        if (IS_ERR(pc->tfm)) {
+            ret = PTR_ERR(pc->tfm);
+            pc->tfm = NULL;
+            goto err;
+        }
+
+        ret = crypto_aead_setauthsize(pc->tfm, authsize);
+        if (ret)
+            goto err;
+
+        for (i = 0; i < WPA_REQS_PER_CPU; i++) {
+            pc->reqs[i] = kzalloc(sizeof(struct wpa_crypto_req) +
+                                  crypto_aead_reqsize(pc->tfm), GFP_KERNEL);
+            if (!pc->reqs[i]) {
+                ret = -ENOMEM;
+                goto err;
+            }
+            pc->reqs[i]->owner = pc;
+            pc->reqs[i]->slot = i;
+        }
+    }
+    ctx->crypto_cipher = cipher;
+    return 0;
+
+err:
+    pr_err("wpa: %s transform setup failed %d\n", alg, ret);
+    wpa_crypto_free(ctx);
+    return ret;
+}
+
+// Loads the TK from ctx->ptk into every CPU's transform
+static int wpa_crypto_setkey(struct wpa_context *ctx)
+{
+    unsigned int keylen = ctx->crypto_cipher == WPA_CIPHER_GCMP_256 ? 32 : 16;
+    int cpu, ret;
+
+    for_each_possible_cpu(cpu) {
+        ret = crypto_aead_setkey(per_cpu_ptr(ctx->crypto, cpu)->tfm,
+                                 ctx->ptk + WPA_TK_OFFSET, keylen);
+        if (ret)
+            return ret;
+    }
+    return 0;
+}
+
+// Keys @cipher with the TK in ctx->ptk and restarts the PN and replay state.
+// Only a switch between CCMP and GCMP allocates.
+static int wpa_crypto_install(struct wpa_context *ctx, enum wpa_cipher cipher)
+{
+    int tid, ret;
+
+    if (ctx->crypto && ctx->crypto_cipher != cipher)
+        wpa_crypto_free(ctx);
+    if (!ctx->crypto) {
+        ret = wpa_crypto_alloc(ctx, cipher);
+        if (ret)
+            return ret;
+    }
+
+    // No operation may still be running on the old key
+    wpa_quiesce(ctx);
+    ret = wpa_crypto_setkey(ctx);
+    if (ret) {
+        pr_err("wpa: setting the TK failed %d\n", ret);
+        return ret;
+    }
+
+    for (tid = 0; tid < WPA_NUM_TIDS; tid++) {
+        atomic64_set(&ctx->tx_pn[tid], 0);
+        ctx->rx_replay[tid].last_pn = 0;
+        ctx->rx_replay[tid].bitmap = 1;     // PN 0 is never valid
+    }
+    ctx->cipher = cipher;
+    ctx->authsize = cipher == WPA_CIPHER_GCMP_256 ? 16 : 8;
+    return 0;
+}
+
+static struct wpa_pmksa *wpa_pmksa_find(struct wpa_context *ctx, const u8 *bssid)
+{
+    struct wpa_pmksa *p;
+    int i;
+
+    for (i = 0; i < WPA_PMKSA_SIZE; i++) {
+        p = &ctx->pmksa[i];
+        if (!p->valid)
+            continue;
+        if (time_after(jiffies, p->expires)) {
+            memzero_explicit(p, sizeof(*p));
+            continue;
+        }
+        if (ether_addr_equal(p->bssid, bssid))
+            return p;
+    }
+    return NULL;
+}
+
+// Caches ctx->pmk for @bssid, replacing the entry closest to expiry
+static void wpa_pmksa_add(struct wpa_context *ctx, const u8 *bssid)
+{
+    struct wpa_pmksa *p = wpa_pmksa_find(ctx, bssid);
+    int i;
+
+    for (i = 0; !p && i < WPA_PMKSA_SIZE; i++) {
+        if (!ctx->pmksa[i].valid)
+            p = &ctx->pmksa[i];
+    }
+    if (!p) {
+        p = &ctx->pmksa[0];
+        for (i = 1; i < WPA_PMKSA_SIZE; i++) {
+            if (time_before(ctx->pmksa[i].expires, p->expires))
+                p = &ctx->pmksa[i];
+        }
+    }
+
+    ether_addr_copy(p->bssid, bssid);
+    memcpy(p->pmk, ctx->pmk, sizeof(p->pmk));
+    p->expires = jiffies + WPA_PMKSA_LIFETIME;
+    p->valid = true;
+}
+
+bool wpa_pmksa_has(void *sec_ctx, const u8 *bssid)
+{
+    struct wpa_context *ctx = sec_ctx;
+
+    return ctx && wpa_pmksa_find(ctx, bssid);
+}
+
+void wpa_pmksa_flush(void *sec_ctx)
+{
+    struct wpa_context *ctx = sec_ctx;
+
+    if (ctx)
+        memzero_explicit(ctx->pmksa, sizeof(ctx->pmksa));
+}
+
 int wpa_start_auth(void *sec_ctx, struct wifi_bss_info *bss)
 {
     struct wpa_context *ctx = sec_ctx;
+    struct wpa_pmksa *cached;
+
     if (!ctx || !bss)
         return -EINVAL;
 
+    ctx->keys_installed = false;
     ctx->security_type = bss->security;
+    ether_addr_copy(ctx->bssid, bss->bssid);
 
     switch (bss->security) {
     case WIFI_SEC_OPEN:
+        ctx->cipher = WPA_CIPHER_NONE;
         ctx->keys_installed = true;  // No keys needed
         pr_info("wpa: open network, no auth required\n");
         return 0;
 
     case WIFI_SEC_WPA2:
+        cached = wpa_pmksa_find(ctx, bss->bssid);
+        if (cached) {
+            pr_info("wpa: PMKSA cache hit for %pM, skipping 802.1X\n", bss->bssid);
+            memcpy(ctx->pmk, cached->pmk, sizeof(ctx->pmk));
+        } else {
+            // Would run 802.1X/PSK to get the PMK here
+            get_random_bytes(ctx->pmk, sizeof(ctx->pmk));
+        }
         pr_info("wpa: starting WPA2 4-way handshake\n");
         // Would perform EAPOL 4-way handshake here
         // For demo: simulate success
         get_random_bytes(ctx->ptk, sizeof(ctx->ptk));
+        if (wpa_crypto_install(ctx, WPA_CIPHER_CCMP_128))
+            return -ENOKEY;
+        wpa_pmksa_add(ctx, bss->bssid);
         ctx->keys_installed = true;
         return 0;
 
     case WIFI_SEC_WPA3:
-        pr_info("wpa: starting WPA3 SAE handshake\n");
-        // Would perform SAE (Simultaneous Authentication of Equals)
-        get_random_bytes(ctx->pmk, sizeof(ctx->pmk));
+        cached = wpa_pmksa_find(ctx, bss->bssid);
+        if (cached) {
+            pr_info("wpa: PMKSA cache hit for %pM, skipping SAE\n", bss->bssid);
+            memcpy(ctx->pmk, cached->pmk, sizeof(ctx->pmk));
+        } else {
+            pr_info("wpa: starting WPA3 SAE handshake\n");
+            // Would perform SAE (Simultaneous Authentication of Equals)
+            get_random_bytes(ctx->pmk, sizeof(ctx->pmk));
+        }
         get_random_bytes(ctx->ptk, sizeof(ctx->ptk));
+        if (wpa_crypto_install(ctx, WPA_CIPHER_GCMP_256))
+            return -ENOKEY;
+        wpa_pmksa_add(ctx, bss->bssid);
         ctx->keys_installed = true;
         return 0;
 
@@ -58,9 +402,307 @@ int wpa_start_auth(void *sec_ctx, struct wifi_bss_info *bss)
     }
 }
 
+static struct wpa_crypto_req *wpa_crypto_try_get(struct wpa_pcpu_crypto *pc)
+{
+    unsigned int i;
+
+    for (;;) {
+        i = find_first_zero_bit(pc->busy, WPA_REQS_PER_CPU);
+        if (i >= WPA_REQS_PER_CPU)
+            return NULL;
+        // Async completions clear bits from other CPUs meanwhile
+        if (!test_and_set_bit(i, pc->busy))
+            return pc->reqs[i];
+    }
+}
+
+// NULL once every request of this CPU is in flight; callers keep the frame
+// and return -EBUSY, they never drop it for this. The next request freed
+// then calls ctx->resume, which is when a retry can succeed.
+static struct wpa_crypto_req *wpa_crypto_get_req(struct wpa_context *ctx)
+{
+    struct wpa_pcpu_crypto *pc = get_cpu_ptr(ctx->crypto);
+    struct wpa_crypto_req *creq;
+
+    creq = wpa_crypto_try_get(pc);
+    if (!creq) {
+        set_bit(WPA_FLAG_STARVED, &ctx->flags);
+        // Pairs with wpa_crypto_put_req(): either it sees the flag or we
+        // see its free slot
+        smp_mb__after_atomic();
+        creq = wpa_crypto_try_get(pc);
+    }
+    put_cpu_ptr(ctx->crypto);
+    return creq;
+}
+
+static void wpa_crypto_put_req(struct wpa_context *ctx, struct wpa_crypto_req *creq)
+{
+    // May run on another CPU than the one that took it (async completion)
+    clear_bit(creq->slot, creq->owner->busy);
+    smp_mb__after_atomic();
+    if (test_and_clear_bit(WPA_FLAG_STARVED, &ctx->flags) && ctx->resume)
+        ctx->resume(ctx->resume_priv);
+}
+
+static bool wpa_replay_ok(const struct wpa_replay *r, u64 pn)
+{
+    if (pn > r->last_pn)
+        return true;
+    if (r->last_pn - pn >= WPA_REPLAY_WINDOW)
+        return false;
+    return !(r->bitmap & BIT_ULL(r->last_pn - pn));
+}
+
+static void wpa_replay_update(struct wpa_replay *r, u64 pn)
+{
+    if (pn > r->last_pn) {
+        u64 shift = pn - r->last_pn;
+
+        r->bitmap = shift >= WPA_REPLAY_WINDOW ? 0 : r->bitmap << shift;
+        r->bitmap |= 1;
+        r->last_pn = pn;
+    } else {
+        r->bitmap |= BIT_ULL(r->last_pn - pn);
+    }
+}
+
+static bool wpa_hdr_is_qos_data(const u8 *hdr)
+{
+    return (hdr[0] & 0x8c) == 0x88;
+}
+
+// The 802.11 header of @cb's frame as the MAC sends it (TX, ToDS) or
+// received it (RX, FromDS): a 3-address QoS data frame to or from our AP.
+// The MAC builds the real one only after encryption, so AAD and nonce
+// come from this copy.
+static void wpa_build_hdr(const struct wpa_context *ctx, bool tx,
+                          const struct wifi_skb_cb *cb, u8 *hdr)
+{
+    u16 sc = cb->seq << 4 | (cb->frag & 0x0f);
+
+    memset(hdr, 0, WPA_QOS_HDR_LEN);
+    hdr[0] = 0x88;                                  // QoS data
+    hdr[1] = 0x40 | (tx ? 0x01 : 0x02);             // Protected, To/FromDS
+    if (cb->more_frags)
+        hdr[1] |= 0x04;
+    memcpy(&hdr[4], tx ? ctx->bssid : ctx->own_addr, ETH_ALEN);
+    memcpy(&hdr[10], tx ? ctx->own_addr : ctx->bssid, ETH_ALEN);
+    memcpy(&hdr[16], cb->a3, ETH_ALEN);             // DA on TX, SA on RX
+    hdr[22] = sc;
+    hdr[23] = sc >> 8;
+    hdr[24] = cb->tid;
+}
+
+// AAD of a 3-address data frame per 802.11-2020 12.5.3.3.3/12.5.5.3.3:
+// FC with subtype bits 4-6, Retry, PwrMgt, MoreData (and Order for QoS)
+// masked and Protected set, A1-A3, SC with the sequence number masked,
+// and the TID of a QoS Control field. MoreFrag and the fragment number
+// are protected. Returns the AAD length.
+static unsigned int wpa_build_aad(const u8 *hdr, u8 *aad)
+{
+    bool qos = wpa_hdr_is_qos_data(hdr);
+
+    aad[0] = hdr[0] & ~0x70;
+    aad[1] = (hdr[1] & ~0x38) | 0x40;
+    if (qos)
+        aad[1] &= ~0x80;
+    memcpy(&aad[2], &hdr[4], 3 * ETH_ALEN);
+    aad[20] = hdr[22] & 0x0f;
+    aad[21] = 0;
+    if (!qos)
+        return 22;
+    aad[22] = hdr[24] & 0x0f;
+    aad[23] = 0;
+    return 24;
+}
+
+// ccm(aes) IV (flags L' = 1, then nonce = priority | A2 | PN) or GCM
+// nonce (A2 | PN); PN goes most significant byte first
+static void wpa_build_iv(enum wpa_cipher cipher, const u8 *hdr, u64 pn, u8 *iv)
+{
+    u8 *nonce = iv;
+    int i;
+
+    memset(iv, 0, 16);
+    if (cipher != WPA_CIPHER_GCMP_256) {
+        iv[0] = 1;
+        iv[1] = wpa_hdr_is_qos_data(hdr) ? hdr[24] & 0x0f : 0;
+        nonce = &iv[2];
+    }
+    memcpy(nonce, &hdr[10], ETH_ALEN);
+    for (i = 0; i < 6; i++)
+        nonce[ETH_ALEN + i] = pn >> (8 * (5 - i));
+}
+
+static void wpa_crypto_prepare(struct wpa_context *ctx, struct wpa_crypto_req *creq,
+                               const struct wifi_skb_cb *cb)
+{
+    u8 hdr[WPA_QOS_HDR_LEN];
+
+    wpa_build_hdr(ctx, creq->encrypt, cb, hdr);
+    creq->aad_len = wpa_build_aad(hdr, creq->aad);
+    wpa_build_iv(ctx->cipher, hdr, creq->pn, creq->iv);
+}
+
+static void wpa_write_hdr(u8 *hdr, u64 pn)
+{
+    hdr[0] = pn;
+    hdr[1] = pn >> 8;
+    hdr[2] = 0;
+    hdr[3] = 0x20;          // ExtIV, key ID 0
+    hdr[4] = pn >> 16;
+    hdr[5] = pn >> 24;
+    hdr[6] = pn >> 32;
+    hdr[7] = pn >> 40;
+}
+
+static u64 wpa_read_hdr(const u8 *hdr)
+{
+    return (u64)hdr[0] | (u64)hdr[1] << 8 | (u64)hdr[4] << 16 |
+           (u64)hdr[5] << 24 | (u64)hdr[6] << 32 | (u64)hdr[7] << 40;
+}
+
+// Post-processing shared by the sync and async paths
+static int wpa_crypto_finish(struct wpa_crypto_req *creq, int err)
+{
+    struct wpa_context *ctx = creq->ctx;
+    struct sk_buff *skb = creq->skb;
+    unsigned long flags;
+
+    if (err || creq->encrypt)
+        return err;
+
+    // Only authenticated frames may advance the replay window
+    spin_lock_irqsave(&ctx->replay_lock, flags);
+    if (wpa_replay_ok(&ctx->rx_replay[creq->tid], creq->pn))
+        wpa_replay_update(&ctx->rx_replay[creq->tid], creq->pn);
+    else
+        err = -EBADMSG;
+    spin_unlock_irqrestore(&ctx->replay_lock, flags);
+    if (err)
+        return err;
+
+    pskb_trim(skb, skb->len - ctx->authsize);
+    skb_pull(skb, WPA_HDR_LEN);
+    WIFI_SKB_CB(skb)->decrypted = true;
+    WIFI_SKB_CB(skb)->pn = creq->pn;
+    return 0;
+}
+
+static void wpa_crypto_complete(void *data, int err)
+{
+    struct wpa_crypto_req *creq = data;
+    struct wpa_context *ctx = creq->ctx;
+    struct sk_buff *skb = creq->skb;
+    bool tx = creq->encrypt;
+
+    // Backlogged request just started; the real completion follows
+    if (err == -EINPROGRESS)
+        return;
+
+    err = wpa_crypto_finish(creq, err);
+    wpa_crypto_put_req(ctx, creq);
+    if (ctx->done)
+        ctx->done(ctx->done_priv, skb, tx, err);
+    else
+        kfree_skb(skb);
+
+    if (atomic_dec_and_test(&ctx->inflight))
+        wake_up_var(&ctx->inflight);
+}
+
+// Runs the AEAD over [WPA_HDR_LEN, skb->len) in place. @cryptlen excludes
+// the MIC on encrypt and includes it on decrypt, per the AEAD API.
+static int wpa_crypto_run(struct wpa_context *ctx, struct sk_buff *skb,
+                          struct wpa_crypto_req *creq, int nsg)
+{
+    struct crypto_aead *tfm = creq->owner->tfm;
+    unsigned int cryptlen = skb->len - WPA_HDR_LEN;
+    int ret;
+
+    if (creq->encrypt)
+        cryptlen -= ctx->authsize;
+
+    sg_init_table(creq->sg, nsg + 1);
+    sg_set_buf(&creq->sg[0], creq->aad, creq->aad_len);
+    ret = skb_to_sgvec(skb, &creq->sg[1], WPA_HDR_LEN, skb->len - WPA_HDR_LEN);
+    if (ret < 0)
+        return ret;
+
+    aead_request_set_tfm(&creq->req, tfm);
+    aead_request_set_callback(&creq->req, CRYPTO_TFM_REQ_MAY_BACKLOG,
+                              wpa_crypto_complete, creq);
+    aead_request_set_ad(&creq->req, creq->aad_len);
+    aead_request_set_crypt(&creq->req, creq->sg, creq->sg, cryptlen, creq->iv);
+
+    atomic_inc(&ctx->inflight);
+    ret = creq->encrypt ? crypto_aead_encrypt(&creq->req)
+                        : crypto_aead_decrypt(&creq->req);
+    if (ret == -EINPROGRESS || ret == -EBUSY)
+        return -EINPROGRESS;    // wpa_crypto_complete() takes it from here
+
+    atomic_dec(&ctx->inflight);
+    return wpa_crypto_finish(creq, ret);
+}
+
+// Page frags of a private skb are encrypted and decrypted where they are,
+// as esp4/esp6 do. Clones, frag_lists and frags shared with others (e.g.
+// spliced file pages) go through skb_cow_data(), which copies them into a
+// private head.
+static bool wpa_skb_inplace(const struct sk_buff *skb)
+{
+    return !skb_cloned(skb) && !skb_has_frag_list(skb) && !skb_has_shared_frag(skb);
+}
+
+// Appends room for the MIC without touching the payload, like
+// esp_output_head(): the tailroom of a linear skb, else a page frag after
+// the payload frags. Returns the sg entries the frame needs, or -ENOSPC
+// if the frag array is full.
+static int wpa_skb_put_mic(struct wpa_context *ctx, struct sk_buff *skb)
+{
+    unsigned int tailen = ctx->authsize;
+    int nr = skb_shinfo(skb)->nr_frags;
+    struct wpa_pcpu_crypto *pc;
+    struct page_frag *pfrag;
+
+    if (tailen <= skb_tailroom(skb)) {
+        __skb_put(skb, tailen);
+        return 1;
+    }
+    if (nr >= MAX_SKB_FRAGS)
+        return -ENOSPC;
+
+    // Only tx_work encrypts, so with preemption off the CPU's frag is ours
+    pc = get_cpu_ptr(ctx->crypto);
+    pfrag = &pc->pfrag;
+    if (!skb_page_frag_refill(tailen, pfrag, GFP_ATOMIC)) {
+        put_cpu_ptr(ctx->crypto);
+        return -ENOMEM;
+    }
+    get_page(pfrag->page);
+    skb_fill_page_desc(skb, nr, pfrag->page, pfrag->offset, tailen);
+    pfrag->offset += ALIGN(tailen, L1_CACHE_BYTES);
+    put_cpu_ptr(ctx->crypto);
+
+    skb->len += tailen;
+    skb->data_len += tailen;
+    skb->truesize += tailen;
+    return nr + 2;
+}
+
+// Returns 0 when done in place, -EINPROGRESS when the frame was handed to
+// an async engine (it comes back through the done callback), -EBUSY when
+// no crypto request is free (the frame is untouched, retry it later), or
+// an error.
 int wpa_encrypt_skb(void *sec_ctx, struct sk_buff *skb)
 {
     struct wpa_context *ctx = sec_ctx;
+    const struct wifi_skb_cb *cb = WIFI_SKB_CB(skb);
+    struct wpa_crypto_req *creq;
+    struct sk_buff *trailer;
+    bool inplace;
+    int nsg, ret;
 
     if (!ctx || !ctx->keys_installed)
         return -ENOKEY;
@@ -68,24 +710,142 @@ int wpa_encrypt_skb(void *sec_ctx, struct sk_buff *skb)
     if (ctx->security_type == WIFI_SEC_OPEN)
         return 0;  // No encryption for open networks
 
-    // Would perform CCMP/GCMP encryption here
-    // For demo: just log
-    pr_debug("wpa: encrypting skb len=%u\n", skb->len);
-    return 0;
+    // Before anything changes @skb, so -EBUSY leaves it as it was
+    creq = wpa_crypto_get_req(ctx);
+    if (!creq)
+        return -EBUSY;
+
+    // Decided before skb_cow_head(), which unclones the head but leaves
+    // the frags shared
+    inplace = wpa_skb_inplace(skb);
+    ret = -ENOMEM;
+    if (skb_cow_head(skb, WPA_HDR_LEN))
+        goto out;
+    nsg = inplace ? wpa_skb_put_mic(ctx, skb) : -ENOSPC;
+    if (nsg == -ENOSPC) {
+        nsg = skb_cow_data(skb, ctx->authsize, &trailer);
+        if (nsg >= 0)
+            pskb_put(skb, trailer, ctx->authsize);
+    }
+    ret = nsg;
+    if (nsg < 0)
+        goto out;
+    ret = -EMSGSIZE;
+    if (nsg > WPA_MAX_SG)
+        goto out;
+
+    creq->ctx = ctx;
+    creq->skb = skb;
+    creq->tid = cb->tid & (WPA_NUM_TIDS - 1);
+    creq->encrypt = true;
+    // Fragments of one frame are encrypted back to back by the TX worker,
+    // so they get consecutive PNs as 802.11 requires
+    creq->pn = atomic64_inc_return(&ctx->tx_pn[creq->tid]);
+    wpa_crypto_prepare(ctx, creq, cb);
+
+    wpa_write_hdr(skb_push(skb, WPA_HDR_LEN), creq->pn);
+
+    ret = wpa_crypto_run(ctx, skb, creq, nsg);
+out:
+    if (ret != -EINPROGRESS)
+        wpa_crypto_put_req(ctx, creq);
+    return ret;
 }
 
 int wpa_decrypt_skb(void *sec_ctx, struct sk_buff *skb)
 {
     struct wpa_context *ctx = sec_ctx;
+    const struct wifi_skb_cb *cb = WIFI_SKB_CB(skb);
+    struct wpa_crypto_req *creq;
+    struct sk_buff *trailer;
+    unsigned long flags;
+    bool fresh;
+    u64 pn;
+    u8 tid;
+    int nsg, ret;
 
     if (!ctx || !ctx->keys_installed)
         return -ENOKEY;
 
-    if (ctx->security_type == WIFI_SEC_OPEN)
+    if (ctx->security_type == WIFI_SEC_OPEN || cb->decrypted)
         return 0;
 
-    pr_debug("wpa: decrypting skb len=%u\n", skb->len);
-    return 0;
+    if (skb->len < WPA_HDR_LEN + ctx->authsize || !pskb_may_pull(skb, WPA_HDR_LEN))
+        return -EBADMSG;
+
+    // Cheap early replay reject; re-checked after authentication
+    tid = cb->tid & (WPA_NUM_TIDS - 1);
+    pn = wpa_read_hdr(skb->data);
+    spin_lock_irqsave(&ctx->replay_lock, flags);
+    fresh = wpa_replay_ok(&ctx->rx_replay[tid], pn);
+    spin_unlock_irqrestore(&ctx->replay_lock, flags);
+    if (!fresh)
+        return -EBADMSG;
+
+    if (wpa_skb_inplace(skb))
+        nsg = skb_shinfo(skb)->nr_frags + 1;
+    else
+        nsg = skb_cow_data(skb, 0, &trailer);
+    if (nsg < 0)
+        return nsg;
+    if (nsg > WPA_MAX_SG)
+        return -EMSGSIZE;
+
+    creq = wpa_crypto_get_req(ctx);
+    if (!creq)
+        return -EBUSY;
+
+    creq->ctx = ctx;
+    creq->skb = skb;
+    creq->tid = tid;
+    creq->pn = pn;
+    creq->encrypt = false;
+    wpa_crypto_prepare(ctx, creq, cb);
+
+    ret = wpa_crypto_run(ctx, skb, creq, nsg);
+    if (ret != -EINPROGRESS)
+        wpa_crypto_put_req(ctx, creq);
+    return ret;
+}
+
+// Decrypts every skb on @list in one pass. Frames that fail are moved to
+// @failed for the caller to drop; frames taken by an async engine leave
+// the list and come back through the done callback. If the requests run
+// out, that frame and everything after it move to @deferred, in order, for
+// the caller to retry. Returns the number left on @list.
+int wpa_decrypt_skb_list(void *sec_ctx, struct sk_buff_head *list,
+                         struct sk_buff_head *failed,
+                         struct sk_buff_head *deferred)
+{
+    struct wpa_context *ctx = sec_ctx;
+    struct sk_buff *skb, *next;
+    int ret;
+
+    if (!ctx || !ctx->keys_installed) {
+        skb_queue_splice_tail_init(list, failed);
+        return 0;
+    }
+
+    if (ctx->security_type == WIFI_SEC_OPEN)
+        return skb_queue_len(list);
+
+    skb_queue_walk_safe(list, skb, next) {
+        ret = wpa_decrypt_skb(ctx, skb);
+        if (!ret)
+            continue;
+        if (ret == -EBUSY) {
+            // @skb and everything after it, tail first to keep the order
+            do {
+                next = __skb_dequeue_tail(list);
+                __skb_queue_head(deferred, next);
+            } while (next != skb);
+            break;
+        }
+        __skb_unlink(skb, list);
+        if (ret != -EINPROGRESS)
+            __skb_queue_tail(failed, skb);
+    }
+    return skb_queue_len(list);
 }
 
 void wpa_reset(void *sec_ctx)
@@ -94,9 +854,18 @@ void wpa_reset(void *sec_ctx)
     if (!ctx)
         return;
 
+    ctx->keys_installed = false;
+    wpa_quiesce(ctx);
     memzero_explicit(ctx->ptk, sizeof(ctx->ptk));
     memzero_explicit(ctx->pmk, sizeof(ctx->pmk));
     memzero_explicit(ctx->gtk, sizeof(ctx->gtk));
-    ctx->keys_installed = false;
+    // The transforms stay for the next connect; don't leave the old key
+    // schedule in them
+    if (ctx->crypto)
+        wpa_crypto_setkey(ctx);
     pr_info("wpa: security context reset\n");
 }
+
+#if IS_ENABLED(CONFIG_WIFI_CORE_KUNIT_TEST)
+#include "wpa_handler_test.c"
+#endif
@@ -4,11 +4,31 @@
 #include "../../include/wifi_types.h"
 
 struct sk_buff;
+struct sk_buff_head;
+
+// Completion for frames handed to an async crypto engine (@tx: encrypt).
+// On success the skb is ready for the next pipeline stage.
+typedef void (*wpa_crypto_done_t)(void *priv, struct sk_buff *skb, bool tx, int err);
+
+// Called once a request is freed after an encrypt or decrypt returned
+// -EBUSY; the caller can retry the frames it held back
+typedef void (*wpa_crypto_resume_t)(void *priv);
 
 // WPA2/WPA3 security handler interface
+void *wpa_ctx_alloc(void);
+void wpa_ctx_free(void *sec_ctx);
+void wpa_set_own_addr(void *sec_ctx, const u8 *addr);
+void wpa_set_crypto_done(void *sec_ctx, wpa_crypto_done_t done, void *priv);
+void wpa_set_crypto_resume(void *sec_ctx, wpa_crypto_resume_t resume, void *priv);
 int  wpa_start_auth(void *sec_ctx, struct wifi_bss_info *bss);
 int  wpa_encrypt_skb(void *sec_ctx, struct sk_buff *skb);
 int  wpa_decrypt_skb(void *sec_ctx, struct sk_buff *skb);
+int  wpa_decrypt_skb_list(void *sec_ctx, struct sk_buff_head *list,
+                          struct sk_buff_head *failed,
+                          struct sk_buff_head *deferred);
 void wpa_reset(void *sec_ctx);
+void wpa_quiesce(void *sec_ctx);
+bool wpa_pmksa_has(void *sec_ctx, const u8 *bssid);
+void wpa_pmksa_flush(void *sec_ctx);
 
 #endif /* WPA_HANDLER_H */